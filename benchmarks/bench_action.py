@@ -0,0 +1,118 @@
+"""
+Micro-benchmark: cost of turning a stored pending_action back into an Action.
+
+Compares the old runner path (json.dumps the stored payload, then let the
+pydantic validator json.loads it again) with pending_to_action, which parses
+the brain's stored payload_str once (batch sub-actions go through
+Action.from_payload), for single actions and for batches.
+
+Run:
+    python benchmarks/bench_action.py [--n 100000] [--json]
+
+Also part of benchmarks/run.py (suite "action").
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# Ensure src/ is importable when running as a script
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from bulus.core.schemas import Action  # noqa: E402
+from bulus.engine.loop import pending_to_action  # noqa: E402
+
+PAYLOAD = {"state": "ask_occupation", "memory": {"name": "Alice", "age": 30, "city": "Berlin", "tags": ["a", "b"]}}
+BATCH = {
+    "actions": [
+        {"tool_name": "update", "payload": PAYLOAD},
+        {"tool_name": "send_message", "payload": {"text": "Nice to meet you, Alice! What do you do?"}},
+        {"tool_name": "test_ping", "payload": {"payload": "ping"}},
+    ]
+}
+
+
+def legacy_pending_to_action(pending: dict) -> Action:
+    """The runner path before Action.from_payload: encode the stored payload, parse it again."""
+    return Action(
+        tool_name=pending.get("tool_name", "error"),
+        payload_str=json.dumps(pending.get("payload", {}), ensure_ascii=False),
+        thought=pending.get("thought", ""),
+    )
+
+
+def legacy_sub_actions(action: Action) -> list:
+    return [
+        Action(
+            tool_name=item["tool_name"],
+            payload_str=json.dumps(item.get("payload", {}), ensure_ascii=False),
+            thought=item.get("thought") or action.thought,
+        )
+        for item in action.payload.get("actions", [])
+    ]
+
+
+def _payloads(result) -> list:
+    actions = result if isinstance(result, list) else [result]
+    return [(a.tool_name, a.payload, a.payload_str, a.thought) for a in actions]
+
+
+def measure(fn, arg, n: int) -> float:
+    """Microseconds per call."""
+    started = time.perf_counter()
+    for _ in range(n):
+        fn(arg)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def run(n: int) -> list:
+    single = {"tool_name": "update", "payload": PAYLOAD, "thought": "save"}
+    # pending_action keeps only the brain's payload_str
+    stored = {"tool_name": "update", "payload_str": json.dumps(PAYLOAD, ensure_ascii=False), "thought": "save"}
+    batch = {"tool_name": "batch", "payload": BATCH, "thought": "batch"}
+    batch_stored = {"tool_name": "batch", "payload_str": json.dumps(BATCH, ensure_ascii=False), "thought": "batch"}
+
+    cases = [
+        ("single", legacy_pending_to_action, single, pending_to_action, stored),
+        ("single, old record", legacy_pending_to_action, single, pending_to_action, single),
+        (
+            "batch x3",
+            lambda p: legacy_sub_actions(legacy_pending_to_action(p)),
+            batch,
+            lambda p: pending_to_action(p).sub_actions(),
+            batch_stored,
+        ),
+    ]
+    results = []
+    for name, before_fn, before_arg, after_fn, after_arg in cases:
+        # Both paths must produce the same actions
+        assert _payloads(before_fn(before_arg)) == _payloads(after_fn(after_arg)), name
+        before = measure(before_fn, before_arg, n)
+        after = measure(after_fn, after_arg, n)
+        results.append({"case": name, "n": n, "before_us": before, "after_us": after, "speedup": before / after})
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=100_000, help="Actions per case (default: 100000)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.n)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"{'case':20s} {'before, us':>11s} {'after, us':>10s} {'speedup':>8s}")
+    for r in results:
+        print(f"{r['case']:20s} {r['before_us']:11.2f} {r['after_us']:10.2f} {r['speedup']:7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+stateless_brain overhead without the network: prompt building, the offline
+LLM stub (tests.utils.make_fake_client) and the decision cache.
+
+Only the last frame and the PromptBuilder window are rendered, so the cost
+must not depend on how long the conversation is.
+
+Cases:
+    warm   shared PromptBuilder, lines of the window are cached
+    cold   fresh PromptBuilder per call, every window line is rendered
+    cache  BrainCache hit (in-memory): prompt is built and hashed, no LLM call
+
+Run:
+    python benchmarks/bench_brain.py [--quick] [--json]
+"""
+
+import argparse
+import json
+import sys
+
+from harness import make_history, measure, result
+
+from bulus.brain.cache import BrainCache
+from bulus.brain.prompts import PromptBuilder
+from bulus.brain.worker import stateless_brain
+from bulus.core.schemas import Action
+from tests.utils import make_fake_client
+
+SIZES = (10, 1_000, 100_000)
+NUMBER = 2_000
+
+ACTION = Action.from_payload("update", {"state": "ask_age", "memory": {"name": "Alice"}}, "save the name")
+
+
+def bench_size(n: int, number: int, repeat: int) -> list:
+    history = make_history(n)
+    client = {}
+
+    def new_client():
+        client["fake"] = make_fake_client([ACTION] * number)
+
+    builder = PromptBuilder()
+    warm = measure(
+        lambda: stateless_brain(history, client_override=client["fake"], prompt_builder=builder),
+        number,
+        repeat,
+        setup=new_client,
+    )
+    cold = measure(
+        lambda: stateless_brain(history, client_override=client["fake"], prompt_builder=PromptBuilder()),
+        number,
+        repeat,
+        setup=new_client,
+    )
+    cache = BrainCache(directory=None)
+    stateless_brain(history, client_override=make_fake_client([ACTION]), cache=cache, prompt_builder=builder)
+    cached = measure(lambda: stateless_brain(history, cache=cache, prompt_builder=builder), number, repeat)
+    return [
+        result("brain.stateless_brain", warm, case="warm", entries=n),
+        result("brain.stateless_brain", cold, case="cold", entries=n),
+        result("brain.stateless_brain", cached, case="cache", entries=n),
+    ]
+
+
+def run(quick: bool = False) -> list:
+    repeat = 3 if quick else 5
+    number = NUMBER // 4 if quick else NUMBER
+    return [r for n in SIZES for r in bench_size(n, number, repeat)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Fewer calls and repeats")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.quick)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for r in results:
+        print(f"{r['key']:55s} {r['value']:12.2f} {r['unit']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
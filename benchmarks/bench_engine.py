@@ -0,0 +1,170 @@
+"""
+End-to-end turns/sec of the multi-session blackboard.
+
+SessionScheduler drives N sessions over each storage backend with a
+deterministic fake brain; a simulated user answers instantly from
+on_waiting until every session has made TURNS turns. A turn is
+user_said -> brain step -> runner step.
+
+The sharded run drives the same conversation through ShardedEngine with a
+CPU-bound brain (BRAIN_CPU_MS of CPU per call, like prompt rendering and
+response parsing) on 1 and on up to MAX_WORKERS brain processes; the
+speedup shows whether sharding actually uses more cores.
+
+Run:
+    python benchmarks/bench_engine.py [--quick] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from functools import partial
+
+from harness import result, sessions_dir
+
+from bulus.core.schemas import Action
+from bulus.core.states import AgentState
+from bulus.engine.cluster import ShardedEngine
+from bulus.engine.scheduler import SessionScheduler
+from bulus.storage import BACKENDS, open_repo
+
+SESSIONS = 50
+TURNS = 10
+
+# Sharded run: CPU per brain call and the largest number of brain processes
+BRAIN_CPU_MS = 5
+MAX_WORKERS = 4
+
+_ASK = (AgentState.ASK_NAME.value, AgentState.ASK_AGE.value, AgentState.ASK_OCCUPATION.value)
+
+
+def fake_brain(history: list) -> Action:
+    """Moves to the next question and remembers one fact per turn."""
+    storage = history[-1][4] if history else {}
+    turn = storage.get("turn", 0)
+    payload = {"state": _ASK[(turn + 1) % 3], "memory": {"turn": turn + 1, f"fact_{turn}": f"answer {turn}"}}
+    return Action.from_payload("update", payload, f"turn {turn}")
+
+
+def cpu_brain(history: list) -> Action:
+    """fake_brain that first burns BRAIN_CPU_MS of thread CPU time (holds the GIL)."""
+    deadline = time.thread_time() + BRAIN_CPU_MS / 1000
+    while time.thread_time() < deadline:
+        pass
+    return fake_brain(history)
+
+
+def create_sessions(repo_factory, session_ids: list):
+    for sid in session_ids:
+        repo_factory(sid).save({"metadata": {"session_id": sid, "status": "need_brain"}, "history": []})
+
+
+def run_sharded(workers: int, sessions: int, turns: int, backend: str = "log") -> float:
+    """Turns per second of ShardedEngine with `workers` brain processes (process startup excluded)."""
+    with sessions_dir():
+        repo_factory = partial(open_repo, backend=backend)
+        session_ids = [f"bench_{i}" for i in range(sessions)]
+        create_sessions(repo_factory, session_ids)
+        warmup = [f"warmup_{i}" for i in range(workers * 4)]
+        create_sessions(repo_factory, warmup)
+
+        with ShardedEngine(brain=cpu_brain, backend=backend, brain_workers=workers, runner_workers=1) as engine:
+            # One turn per warm-up session: the spawned workers are up before the clock starts
+            engine.submit(warmup)
+            if not engine.wait_idle(timeout=600):
+                raise RuntimeError(f"workers={workers}: warm-up did not settle")
+
+            def user(session_id: str, doc: dict):
+                if doc["history"][-1][4].get("turn", 0) < turns:
+                    engine.post_user_message(session_id, "next answer")
+
+            engine.on_waiting = user
+            started = time.perf_counter()
+            engine.submit(session_ids)
+            if not engine.wait_idle(timeout=600):
+                raise RuntimeError(f"workers={workers}: sharded engine did not settle")
+            elapsed = time.perf_counter() - started
+        if engine.errors:
+            raise RuntimeError(f"workers={workers}: {engine.errors[:3]}")
+        done = sum(repo_factory(sid).load_tail(1)[-1][4]["turn"] for sid in session_ids)
+        if done != sessions * turns:
+            raise RuntimeError(f"workers={workers}: expected {sessions * turns} turns, got {done}")
+        return done / elapsed
+
+
+def run_blackboard(backend: str, sessions: int, turns: int) -> float:
+    """Turns per second over `sessions` sessions of `turns` turns each."""
+    with sessions_dir():
+        repo_factory = partial(open_repo, backend=backend)
+        session_ids = [f"bench_{i}" for i in range(sessions)]
+        create_sessions(repo_factory, session_ids)
+
+        lock = threading.Lock()
+        done = {"turns": 0}
+
+        def brain(history):
+            with lock:
+                done["turns"] += 1
+            return fake_brain(history)
+
+        with SessionScheduler(brain=brain, repo_factory=repo_factory, max_brain_concurrency=8) as scheduler:
+
+            def user(session_id: str, doc: dict):
+                if doc["history"][-1][4].get("turn", 0) < turns:
+                    scheduler.post_user_message(session_id, "next answer")
+
+            scheduler.on_waiting = user
+            started = time.perf_counter()
+            scheduler.submit(session_ids)
+            if not scheduler.wait_idle(timeout=600):
+                raise RuntimeError(f"{backend}: blackboard did not settle")
+            elapsed = time.perf_counter() - started
+        if scheduler.errors:
+            raise RuntimeError(f"{backend}: {scheduler.errors[:3]}")
+        if done["turns"] != sessions * turns:
+            raise RuntimeError(f"{backend}: expected {sessions * turns} turns, got {done['turns']}")
+        return done["turns"] / elapsed
+
+
+def run_scaling(quick: bool = False) -> list:
+    """Sharded turns/sec on 1 and on min(CPU count, MAX_WORKERS) brain processes; speedup only with 2+ cores."""
+    sessions, turns = (8, 3) if quick else (32, 5)
+    single = run_sharded(1, sessions, turns)
+    results = [result("engine.sharded_turns_per_sec", single, "turns/s", workers=1)]
+    workers = min(os.cpu_count() or 1, MAX_WORKERS)
+    if workers > 1:
+        scaled = run_sharded(workers, sessions, turns)
+        results.append(result("engine.sharded_turns_per_sec", scaled, "turns/s", workers=workers))
+        results.append(result("engine.sharded_speedup", scaled / single, "x"))
+    return results
+
+
+def run(quick: bool = False) -> list:
+    sessions, turns = (10, 4) if quick else (SESSIONS, TURNS)
+    results = [
+        result("engine.turns_per_sec", run_blackboard(backend, sessions, turns), "turns/s", backend=backend)
+        for backend in BACKENDS
+    ]
+    return results + run_scaling(quick)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="10 sessions x 4 turns")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.quick)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for r in results:
+        print(f"{r['key']:55s} {r['value']:12.1f} {r['unit']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Storage benchmarks: append / load / load_tail / load_metadata per backend
+for sessions of 10, 1k and 100k entries.
+
+append, load_tail and load_metadata are the engine's hot path and should
+not grow with the session (except for the single-file json backend, which
+rewrites the whole file); full load() is linear by nature.
+
+Run:
+    python benchmarks/bench_storage.py [--quick] [--json]
+"""
+
+import argparse
+import json
+import sys
+
+from harness import make_history, measure, result, sessions_dir
+
+from bulus.storage import BACKENDS, open_repo
+
+SIZES = (10, 1_000, 100_000)
+QUICK_SIZES = (10, 1_000)
+
+
+def _number(n: int, linear: bool, budget: int = 200) -> int:
+    """Calls per round: fewer for operations that are linear in the session size."""
+    return max(1, budget * 10 // max(n, 10)) if linear else budget
+
+
+def bench_backend(backend: str, n: int, quick: bool) -> list:
+    repeat = 3 if quick or n >= 100_000 else 5
+    history = make_history(n)
+    entry = history[-1]
+    with sessions_dir():
+        repo = open_repo("bench", backend=backend)
+        repo.save({"metadata": {"session_id": "bench", "status": "still"}, "history": history})
+        return [
+            result(
+                "storage.append",
+                measure(lambda: repo.append(entry), _number(n, backend == "json", 50), repeat),
+                backend=backend,
+                entries=n,
+            ),
+            result("storage.load", measure(repo.load, _number(n, True, 20), repeat), backend=backend, entries=n),
+            result(
+                "storage.load_tail",
+                measure(lambda: repo.load_tail(32), _number(n, backend == "json"), repeat),
+                backend=backend,
+                entries=n,
+            ),
+            result(
+                "storage.load_metadata",
+                measure(repo.load_metadata, _number(n, backend == "json"), repeat),
+                backend=backend,
+                entries=n,
+            ),
+        ]
+
+
+def run(quick: bool = False) -> list:
+    results = []
+    for backend in BACKENDS:
+        for n in QUICK_SIZES if quick else SIZES:
+            results.extend(bench_backend(backend, n, quick))
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Skip the 100k-entry sessions")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.quick)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for r in results:
+        print(f"{r['key']:55s} {r['value']:12.1f} {r['unit']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+apply_update with large storage dicts.
+
+A memory patch copies the storage dict (linear in its size); a state-only
+update reuses the snapshot as is (structural sharing) and must stay flat.
+
+Run:
+    python benchmarks/bench_update.py [--quick] [--json]
+"""
+
+import argparse
+import json
+import sys
+
+from harness import measure, result
+
+from bulus.runner.tools import apply_update
+
+SIZES = (10, 1_000, 100_000)
+
+
+CASES = {
+    "patch": {"state": "ask_age", "memory": {"name": "Alice"}},
+    "delete": {"memory": {"key_0": None}},
+    "state_only": {"state": "ask_age"},
+}
+
+
+def bench_size(n: int, repeat: int) -> list:
+    storage = {f"key_{i}": {"value": i, "note": f"fact number {i}"} for i in range(n)}
+    results = []
+    for case, payload in CASES.items():
+        # A memory patch copies the storage dict: fewer calls for big dicts
+        number = 20_000 if case == "state_only" else max(1, 20_000 // n)
+        value = measure(lambda p=payload: apply_update("ask_name", storage, p), number, repeat)
+        results.append(result("runner.apply_update", value, case=case, keys=n))
+    return results
+
+
+def run(quick: bool = False) -> list:
+    return [r for n in SIZES for r in bench_size(n, 3 if quick else 5)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Fewer repeats")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.quick)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for r in results:
+        print(f"{r['key']:55s} {r['value']:12.2f} {r['unit']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Shared helpers for the benchmark suites (see benchmarks/run.py).
+
+Every suite exposes `run(quick: bool) -> list` of result dicts:
+
+    {"key": "storage.append[backend=log,entries=1000]", "bench": "storage.append",
+     "params": {"backend": "log", "entries": 1000}, "value": 41.2, "unit": "us"}
+
+Timings are per operation, median over repeats, so a single slow run
+(GC pause, page cache miss) does not move the number.
+"""
+
+import contextlib
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+# Ensure src/ (and tests/ helpers) are importable when running as a script
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / "src"
+for path in (SRC_DIR, ROOT_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from bulus.core.states import AgentState  # noqa: E402
+from bulus.storage import repository  # noqa: E402
+
+
+def slug(text: str) -> str:
+    """Human-readable case name -> key-safe parameter value: "single, old record" -> "single_old_record"."""
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def result_key(bench: str, params: Dict[str, Any]) -> str:
+    inner = ",".join(f"{k}={v}" for k, v in params.items())
+    return f"{bench}[{inner}]" if inner else bench
+
+
+def result(bench: str, value: float, unit: str = "us", **params) -> dict:
+    return {"key": result_key(bench, params), "bench": bench, "params": params, "value": value, "unit": unit}
+
+
+def measure(fn: Callable[[], Any], number: int, repeat: int = 5, setup: Callable[[], Any] | None = None) -> float:
+    """Microseconds per call of fn(): median of `repeat` rounds of `number` calls."""
+    rounds = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - started) / number * 1e6)
+    return statistics.median(rounds)
+
+
+@contextlib.contextmanager
+def sessions_dir() -> Iterator[Path]:
+    """Temporary SESSIONS_DIR for the duration of a benchmark."""
+    previous = repository.SESSIONS_DIR
+    with tempfile.TemporaryDirectory(prefix="bulus_bench_") as tmp:
+        repository.SESSIONS_DIR = tmp
+        try:
+            yield Path(tmp)
+        finally:
+            repository.SESSIONS_DIR = previous
+
+
+_ASK = (AgentState.ASK_NAME.value, AgentState.ASK_AGE.value, AgentState.ASK_OCCUPATION.value)
+
+
+def make_history(n: int, start: float = 1_700_000_000.0) -> List[tuple]:
+    """
+    Deterministic ledger of n entries shaped like a real conversation:
+    user_said -> update (one new memory key) -> send_message, repeated.
+    Consecutive entries share the storage dict when it does not change.
+    """
+    history = []
+    storage: dict = {}
+    for i in range(n):
+        turn, kind = divmod(i, 3)
+        state = _ASK[turn % 3]
+        ts = start + i * 0.5
+        if kind == 0:
+            history.append((ts, "user_said", f"Answer number {turn}: some free-form user text", state, storage, None))
+        elif kind == 1:
+            storage = {**storage, f"fact_{turn % 50}": f"value {turn}"}
+            payload = {"state": _ASK[(turn + 1) % 3], "memory": {f"fact_{turn % 50}": f"value {turn}"}}
+            history.append((ts, "update", payload, payload["state"], storage, f"Remember fact {turn}"))
+        else:
+            payload = {"text": f"Thanks! Question number {turn + 1}?"}
+            history.append((ts, "send_message", payload, _ASK[(turn + 1) % 3], storage, "Ask the next question"))
+    return history
@@ -0,0 +1,156 @@
+"""
+Runs the benchmark suites, writes machine-readable results and checks them
+against regression thresholds.
+
+Thresholds (benchmarks/thresholds.json) are mostly scaling ratios — e.g.
+append at 100k entries vs at 10 entries — so they hold on any machine;
+absolute ceilings/floors are deliberately generous. With --baseline, every
+result is also compared to a previous results file within --tolerance.
+
+Run:
+    python benchmarks/run.py [--quick] [--suite storage --suite brain ...]
+                             [--output results.json] [--baseline old.json --tolerance 0.5]
+
+Exit status is 1 if any check fails.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+import bench_action
+import bench_brain
+import bench_engine
+import bench_storage
+import bench_update
+from harness import result, slug
+
+THRESHOLDS = Path(__file__).resolve().parent / "thresholds.json"
+
+# Units where a bigger number is a regression; for the rest (turns/s, x) a smaller one is
+LOWER_IS_BETTER = {"us"}
+
+
+def _action_suite(quick: bool) -> list:
+    results = []
+    for r in bench_action.run(20_000 if quick else 100_000):
+        # Case names carry commas and spaces ("single, old record"); keys must stay parseable
+        case = slug(r["case"])
+        results.append(result("action.pending_to_action", r["after_us"], case=case))
+        results.append(result("action.speedup", r["speedup"], "x", case=case))
+    return results
+
+
+SUITES = {
+    "storage": bench_storage.run,
+    "update": bench_update.run,
+    "brain": bench_brain.run,
+    "engine": bench_engine.run,
+    "action": _action_suite,
+}
+
+
+def check_thresholds(results: list, thresholds: dict) -> list:
+    """Checks results against {"max": {key: limit}, "min": {key: limit}, "ratio": [{num, den, max}]}."""
+    values = {r["key"]: r["value"] for r in results}
+    checks = []
+
+    def add(name: str, value, limit: float, ok):
+        status = "skipped" if value is None else ("ok" if ok else "fail")
+        checks.append({"check": name, "value": value, "limit": limit, "status": status})
+
+    for key, limit in thresholds.get("max", {}).items():
+        value = values.get(key)
+        add(f"{key} <= {limit}", value, limit, value is not None and value <= limit)
+    for key, limit in thresholds.get("min", {}).items():
+        value = values.get(key)
+        add(f"{key} >= {limit}", value, limit, value is not None and value >= limit)
+    for rule in thresholds.get("ratio", []):
+        num, den = values.get(rule["num"]), values.get(rule["den"])
+        value = num / den if num is not None and den else None
+        add(
+            f"{rule['num']} / {rule['den']} <= {rule['max']}",
+            value,
+            rule["max"],
+            value is not None and value <= rule["max"],
+        )
+    return checks
+
+
+def compare_baseline(results: list, baseline: list, tolerance: float) -> list:
+    """Every result present in the baseline must be within `tolerance` (0.5 = 50%) of it."""
+    previous = {r["key"]: r for r in baseline}
+    checks = []
+    for r in results:
+        base = previous.get(r["key"])
+        if base is None or not base["value"]:
+            continue
+        if r["unit"] in LOWER_IS_BETTER:
+            limit = base["value"] * (1 + tolerance)
+            ok, op = r["value"] <= limit, "<="
+        else:
+            limit = base["value"] / (1 + tolerance)
+            ok, op = r["value"] >= limit, ">="
+        checks.append(
+            {
+                "check": f"{r['key']} {op} baseline {base['value']:.4g} ±{tolerance:.0%}",
+                "value": r["value"],
+                "limit": limit,
+                "status": "ok" if ok else "fail",
+            }
+        )
+    return checks
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes and fewer repeats (CI smoke run)")
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES), help="Run only these suites")
+    parser.add_argument("--output", help="Write results and checks as JSON to this path")
+    parser.add_argument("--thresholds", default=str(THRESHOLDS), help="Thresholds file (default: %(default)s)")
+    parser.add_argument("--baseline", help="Previous --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown vs baseline (default: 0.5)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.suite or SUITES:
+        started = time.perf_counter()
+        suite_results = SUITES[name](args.quick)
+        print(f"== {name} ({time.perf_counter() - started:.1f}s)")
+        for r in suite_results:
+            print(f"   {r['key']:60s} {r['value']:14.2f} {r['unit']}")
+        results.extend(suite_results)
+
+    with open(args.thresholds, encoding="utf-8") as f:
+        checks = check_thresholds(results, json.load(f))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            checks += compare_baseline(results, json.load(f)["results"], args.tolerance)
+
+    failed = [c for c in checks if c["status"] == "fail"]
+    skipped = sum(c["status"] == "skipped" for c in checks)
+    print(f"\n{len(checks) - len(failed) - skipped} checks passed, {len(failed)} failed, {skipped} skipped")
+    for c in failed:
+        print(f"   FAIL {c['check']} (got {c['value']:.4g})")
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": time.time(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "quick": args.quick,
+            },
+            "results": results,
+            "checks": checks,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+"""
+Headless load generator for the Bulus engine.
+
+Grown out of scripts/simulate_bulus.py: instead of two canned sessions
+and sequential passes, N simulated users arrive at a Poisson rate, talk to
+a SessionScheduler through a fake brain with configurable latency, think
+between replies and leave after a number of turns.
+
+Distributions are given as specs:
+    const:X               always X seconds
+    uniform:A,B           uniform in [A, B]
+    exp:MEAN              exponential with the given mean
+    lognormal:MEDIAN,S    log-normal with the given median and sigma
+    normal:MU,SIGMA       normal, clamped at 0
+
+Run:
+    python scripts/load_test.py --sessions 2000 --rate 100 --turns 5 \\
+        --think exp:2 --brain-latency lognormal:0.8,0.4 --brain-workers 256 --backend log
+
+Report: p50/p95/p99 turn latency (user message -> agent waits for the user
+again), sessions/sec, turns/sec, storage bytes written per turn and on-disk
+bytes per turn, plus storage span percentiles from bulus.telemetry.
+No real OpenAI calls are made.
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+# Ensure src/ is importable when running as a script
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from bulus import telemetry  # noqa: E402
+from bulus.core.schemas import Action  # noqa: E402
+from bulus.core.states import AgentState  # noqa: E402
+from bulus.engine.scheduler import SessionScheduler  # noqa: E402
+from bulus.storage import BACKENDS, open_repo, repository  # noqa: E402
+
+_ASK = (AgentState.ASK_NAME.value, AgentState.ASK_AGE.value, AgentState.ASK_OCCUPATION.value)
+
+USER_REPLIES = (
+    "Я тестовый пользователь",
+    "Мне 25",
+    "Я инженер, работаю с распределёнными системами",
+)
+
+
+class Distribution:
+    """Random duration in seconds parsed from a spec like 'exp:2' (see module docstring)."""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        try:
+            params = [float(x) for x in args.split(",")] if args else []
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Bad distribution parameters in '{spec}'") from None
+        arity = {"const": 1, "uniform": 2, "exp": 1, "lognormal": 2, "normal": 2}
+        if kind not in arity or len(params) != arity[kind]:
+            raise argparse.ArgumentTypeError(f"Expected one of {sorted(arity)} with parameters, got '{spec}'")
+        self.kind = kind
+        self.params = params
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "const":
+            return p[0]
+        if self.kind == "uniform":
+            return rng.uniform(p[0], p[1])
+        if self.kind == "exp":
+            return rng.expovariate(1 / p[0]) if p[0] > 0 else 0.0
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(p[0]), p[1]) if p[0] > 0 else 0.0
+        return max(0.0, rng.normalvariate(p[0], p[1]))
+
+    def __repr__(self) -> str:
+        return self.spec
+
+
+def fake_brain(history: list) -> Action:
+    """Deterministic brain: asks the next question and remembers the answer (one fact per turn)."""
+    storage = history[-1][4] if history else {}
+    turn = storage.get("turn", 0)
+    answer = history[-1][2] if history and history[-1][1] == "user_said" else None
+    payload = {"state": _ASK[(turn + 1) % 3], "memory": {"turn": turn + 1, f"answer_{turn}": answer}}
+    return Action.from_payload("update", payload, f"Save answer {turn} and ask the next question")
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def disk_bytes(directory: str) -> int:
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except FileNotFoundError:
+                continue  # tmp files of an atomic write in flight
+    return total
+
+
+class Users:
+    """
+    Simulated users: a timer heap of (due time, session_id) events served by
+    one thread. Due messages are posted from a small pool, so a slow storage
+    backend delays users instead of the timer.
+    """
+
+    def __init__(self, post, workers: int):
+        self._post = post
+        self._heap: list = []
+        self._cond = threading.Condition()
+        self._running = True
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulus-user")
+        self._thread = threading.Thread(target=self._loop, name="bulus-users", daemon=True)
+        self._thread.start()
+
+    def schedule(self, at: float, session_id: str):
+        with self._cond:
+            heapq.heappush(self._heap, (at, session_id))
+            self._cond.notify()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._running and (not self._heap or self._heap[0][0] > time.perf_counter()):
+                    timeout = self._heap[0][0] - time.perf_counter() if self._heap else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                _, session_id = heapq.heappop(self._heap)
+            self._pool.submit(self._post, session_id)
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._posted: dict = {}  # session_id -> perf_counter() of the pending user message
+        self._turns_of: dict = {}  # session_id -> turns made so far
+        self.latencies: list = []
+        self.turns = 0
+        self.completed = 0
+        self.finished_at = None
+
+    def brain(self, history: list) -> Action:
+        delay = self.args.brain_latency.sample(self.rng)
+        if delay > 0:
+            time.sleep(delay)
+        return fake_brain(history)
+
+    def post(self, session_id: str):
+        with self._lock:
+            turn = self._turns_of.get(session_id, 0)
+            self._posted[session_id] = time.perf_counter()
+        try:
+            self.scheduler.post_user_message(session_id, USER_REPLIES[turn % len(USER_REPLIES)])
+        except Exception as e:
+            self.scheduler.errors.append((session_id, e))
+
+    def on_waiting(self, session_id: str, doc: dict):
+        now = time.perf_counter()
+        turn = doc["history"][-1][4].get("turn", 0)
+        with self._lock:
+            self._turns_of[session_id] = turn
+            posted = self._posted.pop(session_id, None)
+            if posted is None:
+                return
+            self.latencies.append(now - posted)
+            self.turns += 1
+            if turn >= self.args.turns:
+                self.completed += 1
+                self.finished_at = now
+                self._done.notify_all()
+                return
+        self.users.schedule(now + self.args.think.sample(self.rng), session_id)
+
+    def run(self) -> dict:
+        args = self.args
+        hist = telemetry.HistogramSink()
+        telemetry.enable(hist)
+        self.scheduler = SessionScheduler(
+            brain=self.brain,
+            repo_factory=partial(open_repo, backend=args.backend),
+            max_brain_concurrency=args.brain_workers,
+            runner_workers=args.runner_workers,
+            on_waiting=self.on_waiting,
+        )
+        self.users = Users(self.post, args.user_workers)
+        self.scheduler.start()
+        t0 = time.perf_counter()
+        try:
+            # Poisson arrivals: the first message of every session goes through the same timer
+            at = t0
+            for i in range(args.sessions):
+                at += self.rng.expovariate(args.rate)
+                self.users.schedule(at, f"load_{i:06d}")
+            with self._done:
+                self._done.wait_for(lambda: self.completed >= args.sessions, timeout=args.timeout)
+        finally:
+            self.users.close()
+            self.scheduler.stop()
+            telemetry.disable()
+        return self.report(t0, hist)
+
+    def report(self, t0: float, hist: telemetry.HistogramSink) -> dict:
+        args = self.args
+        elapsed = (self.finished_at or time.perf_counter()) - t0
+        latencies = sorted(self.latencies)
+        snap = hist.snapshot()
+        written = snap["counters"].get("storage.bytes_written", 0)
+        on_disk = disk_bytes(str(repository.SESSIONS_DIR))
+        return {
+            "config": {k: (repr(v) if isinstance(v, Distribution) else v) for k, v in vars(args).items()},
+            "sessions": {"total": args.sessions, "completed": self.completed},
+            "turns": self.turns,
+            "elapsed_s": elapsed,
+            "sessions_per_sec": self.completed / elapsed if elapsed else 0.0,
+            "turns_per_sec": self.turns / elapsed if elapsed else 0.0,
+            "turn_latency_ms": {
+                "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+                "p50": percentile(latencies, 0.50) * 1000,
+                "p95": percentile(latencies, 0.95) * 1000,
+                "p99": percentile(latencies, 0.99) * 1000,
+                "max": latencies[-1] * 1000 if latencies else 0.0,
+            },
+            "storage": {
+                "bytes_written": written,
+                "bytes_written_per_turn": written / self.turns if self.turns else 0.0,
+                "disk_bytes": on_disk,
+                "disk_bytes_per_turn": on_disk / self.turns if self.turns else 0.0,
+            },
+            "spans_ms": {
+                name: {key: stats[key] for key in ("count", "p50_ms", "p95_ms", "p99_ms")}
+                for name, stats in snap["spans"].items()
+                if name.startswith(("storage.", "engine."))
+            },
+            "errors": [f"{sid}: {e!r}" for sid, e in self.scheduler.errors[:20]],
+        }
+
+
+def format_report(r: dict) -> str:
+    lat = r["turn_latency_ms"]
+    st = r["storage"]
+    lines = [
+        f"sessions     {r['sessions']['completed']}/{r['sessions']['total']} completed in {r['elapsed_s']:.1f}s",
+        f"throughput   {r['sessions_per_sec']:.2f} sessions/s, {r['turns_per_sec']:.1f} turns/s ({r['turns']} turns)",
+        f"turn latency p50 {lat['p50']:.1f} ms, p95 {lat['p95']:.1f} ms, "
+        f"p99 {lat['p99']:.1f} ms, max {lat['max']:.1f} ms",
+        f"storage      {st['bytes_written_per_turn']:.0f} B written/turn, "
+        f"{st['disk_bytes_per_turn']:.0f} B on disk/turn",
+    ]
+    for name, s in r["spans_ms"].items():
+        lines.append(
+            f"  {name:22s} n={s['count']:<7d} p50 {s['p50_ms']:8.3f} p95 {s['p95_ms']:8.3f} p99 {s['p99_ms']:8.3f} ms"
+        )
+    if r["errors"]:
+        lines.append(f"errors       {len(r['errors'])} (first: {r['errors'][0]})")
+    return "\n".join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200, help="Simulated users / sessions (default: 200)")
+    parser.add_argument("--rate", type=float, default=50.0, help="Session arrivals per second (default: 50)")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per session before the user leaves (default: 5)")
+    parser.add_argument("--think", type=Distribution, default=Distribution("exp:0.5"), help="User think time")
+    parser.add_argument(
+        "--brain-latency", type=Distribution, default=Distribution("lognormal:0.05,0.5"), help="Fake LLM latency"
+    )
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="json", help="Storage backend")
+    parser.add_argument("--brain-workers", type=int, default=64, help="Concurrent brain calls (default: 64)")
+    parser.add_argument("--runner-workers", type=int, default=4, help="Runner threads (default: 4)")
+    parser.add_argument("--user-workers", type=int, default=8, help="Threads posting user messages (default: 8)")
+    parser.add_argument("--sessions-dir", help="Keep sessions here (default: a temporary directory)")
+    parser.add_argument("--timeout", type=float, default=3600.0, help="Give up after this many seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--output", help="Also write the JSON report to this path")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="bulus_load_") as tmp:
+        repository.SESSIONS_DIR = args.sessions_dir or tmp
+        os.makedirs(repository.SESSIONS_DIR, exist_ok=True)
+        report = LoadTest(args).run()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
+    return 0 if report["sessions"]["completed"] == args.sessions and not report["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
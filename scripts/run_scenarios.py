@@ -7,6 +7,9 @@ Usage:
 Requires:
   - OPENAI_API_KEY in .env or environment
   - Optional: OPENAI_MODEL_NAME (defaults to gpt-5-mini)
+
+Brain decisions are cached under .bulus/cache (keyed on the rendered prompt and model),
+so re-running unchanged scenarios makes no API calls.
 """
 
 import sys
@@ -19,10 +22,13 @@ SRC_DIR = ROOT_DIR / "src"
 if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
+from bulus.brain.cache import BrainCache  # type: ignore  # noqa: E402
 from bulus.brain.worker import client, stateless_brain  # type: ignore  # noqa: E402
 from bulus.config import API_KEY, MODEL_NAME  # type: ignore  # noqa: E402
 from bulus.core.states import AgentState  # type: ignore  # noqa: E402
-from bulus.runner.worker import imperative_runner  # type: ignore  # noqa: E402
+from bulus.runner.worker import run_actions  # type: ignore  # noqa: E402
+
+CACHE = BrainCache()
 
 
 def _check_client():
@@ -48,15 +54,15 @@ def run_multi_turn():
         (t0 + 2, "user_said", "Меня зовут Семен", AgentState.ASK_NAME.value, {}, None),
     ]
 
-    act1 = stateless_brain(ice_turn_1)
+    act1 = stateless_brain(ice_turn_1, cache=CACHE)
     _print_action("RESULT 1", act1)
     assert act1.tool_name == "update", "Expected update after receiving name"
     assert act1.payload.get("state") == AgentState.ASK_AGE.value
     assert act1.payload.get("memory", {}).get("name")
 
-    entry1 = imperative_runner(ice_turn_1, act1)
-    ice_turn_2 = ice_turn_1 + [entry1]
-    state1, storage1 = entry1[3], entry1[4]
+    entries1 = run_actions(ice_turn_1, act1)
+    ice_turn_2 = ice_turn_1 + entries1
+    state1, storage1 = entries1[-1][3], entries1[-1][4]
 
     ice_turn_2.extend(
         [
@@ -72,15 +78,15 @@ def run_multi_turn():
         ]
     )
 
-    act2 = stateless_brain(ice_turn_2)
+    act2 = stateless_brain(ice_turn_2, cache=CACHE)
     _print_action("RESULT 2", act2)
     assert act2.tool_name == "update", "Expected update after receiving age"
     assert act2.payload.get("state") == AgentState.ASK_OCCUPATION.value
     assert act2.payload.get("memory", {}).get("age")
 
-    entry2 = imperative_runner(ice_turn_2, act2)
-    ice_turn_3 = ice_turn_2 + [entry2]
-    state2, storage2 = entry2[3], entry2[4]
+    entries2 = run_actions(ice_turn_2, act2)
+    ice_turn_3 = ice_turn_2 + entries2
+    state2, storage2 = entries2[-1][3], entries2[-1][4]
 
     ice_turn_3.extend(
         [
@@ -96,7 +102,7 @@ def run_multi_turn():
         ]
     )
 
-    act3 = stateless_brain(ice_turn_3)
+    act3 = stateless_brain(ice_turn_3, cache=CACHE)
     _print_action("RESULT 3", act3)
     assert act3.tool_name == "update", "Expected update after receiving occupation"
     assert act3.payload.get("state") == AgentState.CALL_PING.value
@@ -121,7 +127,7 @@ def run_one_shot():
         ),
     ]
 
-    act = stateless_brain(ice)
+    act = stateless_brain(ice, cache=CACHE)
     _print_action("RESULT (ONE-SHOT)", act)
     assert act.tool_name == "update", "Expected update after receiving full profile"
     assert act.payload.get("state") == AgentState.CALL_PING.value
@@ -130,10 +136,9 @@ def run_one_shot():
     assert memory.get("age")
     assert memory.get("occupation")
 
-    entry = imperative_runner(ice, act)
-    ice_next = ice + [entry]
+    ice_next = ice + run_actions(ice, act)
 
-    act_next = stateless_brain(ice_next)
+    act_next = stateless_brain(ice_next, cache=CACHE)
     _print_action("RESULT (CALL PING)", act_next)
     assert act_next.tool_name == "test_ping", "Expected test_ping after reaching call_ping"
 
@@ -145,6 +150,7 @@ def main():
     run_multi_turn()
     run_one_shot()
     print("🎉 All scenario checks passed.")
+    print(f"Brain cache: {CACHE.stats()}")
     return 0
 
 
@@ -2,7 +2,7 @@
 Lightweight simulation of the Bulus blackboard:
 - Sessions live in .bulus/sessions as JSON with {"metadata": {"status": ...}, "history": [...]}
 - Brain workers handle status=need_brain and stash pending_action -> need_runner
-- Runner workers apply pending_action (imperative_runner) and set status to still/need_brain
+- Runner workers apply pending_action (run_actions) and set status to still/need_brain
 - A tiny "user" loop feeds canned replies when status=still to unblock the next brain step
 
 Run:
@@ -11,7 +11,6 @@ Run:
 No real OpenAI calls are made; we use a deterministic fake brain.
 """
 
-import json
 import sys
 import tempfile
 import time
@@ -25,18 +24,11 @@ if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
 from bulus.core.schemas import Action  # noqa: E402
-from bulus.core.states import AgentState  # noqa: E402
-from bulus.runner.worker import imperative_runner  # noqa: E402
+from bulus.core.states import WAITING_STATES, AgentState  # noqa: E402
+from bulus.runner.worker import run_actions  # noqa: E402
 from bulus.storage import repository as repo_mod  # noqa: E402
 from bulus.storage.repository import BulusRepo  # noqa: E402
 
-# States that imply we're waiting for user input after runner applies an update
-WAITING_STATES = {
-    AgentState.ASK_NAME.value,
-    AgentState.ASK_AGE.value,
-    AgentState.ASK_OCCUPATION.value,
-}
-
 # Canned user replies for the demo
 USER_REPLIES = {
     AgentState.ASK_NAME.value: "Я тестовый пользователь",
@@ -46,7 +38,8 @@ USER_REPLIES = {
 
 
 def _make_action(tool_name: str, payload: Dict[str, Any], thought: str) -> Action:
-    return Action(tool_name=tool_name, payload_str=json.dumps(payload, ensure_ascii=False), thought=thought)
+    """Builds an Action from a parsed payload; used by the brain stub and to restore pending_action."""
+    return Action.from_payload(tool_name, payload, thought)
 
 
 def fake_brain(history: list) -> Action:
@@ -85,7 +78,7 @@ def seed_sessions(sessions_dir: Path):
     """Create two demo sessions with different starting points."""
     now = time.time()
     sessions = {
-        "sim_alpha": [],  # пустая история
+        "sim_alpha": [],  # empty history
         "sim_bravo": [
             (now, "user_said", "Привет, я Браво!", AgentState.HELLO.value, {}, None),
         ],
@@ -122,10 +115,11 @@ def runner_worker(sessions_dir: Path):
         if not pending:
             continue
         action = _make_action(pending["tool_name"], pending.get("payload", {}), pending.get("thought", ""))
-        new_entry = imperative_runner(doc["history"], action)
-        doc["history"].append(new_entry)
+        # A batch yields one Ice entry per tool
+        new_entries = run_actions(doc["history"], action)
+        doc["history"].extend(new_entries)
 
-        next_state = new_entry[3]
+        next_state = new_entries[-1][3]
         next_status = "still" if next_state in WAITING_STATES else "need_brain"
 
         meta["pending_action"] = None
@@ -0,0 +1,5 @@
+import sys
+
+from bulus.cli import main
+
+sys.exit(main())
@@ -0,0 +1,141 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from bulus.config import CACHE_DIR
+from bulus.core.schemas import Action
+
+
+class BrainCache:
+    """
+    Content-addressed кэш решений мозга.
+
+    Ключ — sha256 от (model, отрендеренные messages), т.е. от всего, что
+    видит LLM. Раз Action = f(Conversation_History), повторный replay, fork
+    или прогон сценариев с тем же промптом не платит за вызов API.
+    Два уровня: in-memory LRU (`max_entries`) и JSON-файлы в `directory`
+    (None — только память). `ttl` в секундах, None — без истечения.
+    Ошибочные Action (tool_name="error") не кэшируются.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float | None = None, directory: str | Path | None = CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = Path(directory) if directory is not None else None
+        self._memory: OrderedDict = OrderedDict()  # key -> (stored_at, record)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    @staticmethod
+    def key(model: str, messages: list) -> str:
+        raw = json.dumps([model, messages], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def get(self, key: str) -> Action | None:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None and self._expired(item[0]):
+                del self._memory[key]
+                item = None
+            if item is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return Action(**item[1])
+
+        record = self._read_disk(key)
+        with self._lock:
+            if record is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, record["stored_at"], record["action"])
+        return Action(**record["action"])
+
+    def put(self, key: str, action: Action):
+        if action.tool_name == "error":
+            return
+        data = {"tool_name": action.tool_name, "payload_str": action.payload_str, "thought": action.thought}
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, data)
+        self._write_disk(key, {"stored_at": stored_at, "action": data})
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def clear(self, disk: bool = False):
+        with self._lock:
+            self._memory.clear()
+        if disk and self.directory is not None and self.directory.exists():
+            for path in self.directory.glob("*/*.json"):
+                with contextlib.suppress(FileNotFoundError):
+                    path.unlink()
+
+    def prune(self) -> int:
+        """Удаляет просроченные записи с диска; возвращает их количество."""
+        if self.ttl is None or self.directory is None or not self.directory.exists():
+            return 0
+        removed = 0
+        for path in self.directory.glob("*/*.json"):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    stored_at = json.load(f).get("stored_at", 0)
+            except (OSError, json.JSONDecodeError):
+                stored_at = 0
+            if self._expired(stored_at):
+                with contextlib.suppress(FileNotFoundError):
+                    path.unlink()
+                removed += 1
+        return removed
+
+    # --- внутреннее ---
+
+    def _remember(self, key: str, stored_at: float, data: dict):
+        self._memory[key] = (stored_at, data)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str) -> dict | None:
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if self._expired(record.get("stored_at", 0)):
+            return None
+        return record
+
+    def _write_disk(self, key: str, record: dict):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        os.makedirs(path.parent, exist_ok=True)
+        tmp_path = path.with_suffix(f".tmp-{os.getpid()}-{threading.get_ident()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
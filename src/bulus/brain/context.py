@@ -0,0 +1,199 @@
+import time
+from typing import Callable, List
+
+from bulus.brain.prompts import PromptBuilder, estimate_tokens, fit_line
+from bulus.core.schemas import IceEntry, IceHistory
+
+SUMMARY_TOOL = "summary"
+
+# (предыдущее саммари, записи нового span) -> текст саммари
+Summarizer = Callable[[str | None, List[IceEntry]], str]
+
+
+def extractive_summary(previous: str | None, entries: List[IceEntry], max_chars: int = 1200) -> str:
+    """
+    Детерминированное локальное саммари без LLM: кто что сказал и смены стейтов.
+    При переполнении отрезается самое старое.
+    """
+    parts = [previous] if previous else []
+    for entry in entries:
+        tool, payload = entry[1], entry[2]
+        if tool == "user_said":
+            parts.append(f"U: {str(payload)[:80]}")
+        elif tool == "send_message" and isinstance(payload, dict):
+            parts.append(f"A: {str(payload.get('text', ''))[:80]}")
+        elif tool == "update" and isinstance(payload, dict) and payload.get("state"):
+            parts.append(f"->{payload['state']}")
+    text = "; ".join(parts)
+    if len(text) > max_chars:
+        # Обрезаем по границе элемента, чтобы не оставлять огрызков слов
+        text = text[-max_chars:]
+        text = text[text.find("; ") + 2 :] if "; " in text else text
+    return text
+
+
+class ContextWindow(PromptBuilder):
+    """
+    Выбор контекста для длинных сессий по бюджету токенов.
+
+    В промпт попадают:
+    - последнее саммари (запись `summary` в Ice) — сжатая история до его `covers[1]`;
+    - закреплённая запись — последняя смена стейта после `covers[1]`, даже если она вне окна;
+    - самые свежие записи, пока влезают в `token_budget`.
+
+    `covers` — абсолютные индексы в истории сессии, а `at` — абсолютный индекс
+    самого саммари. По ним окно работает и на хвосте истории (load_recent):
+    достаточно записей от `covers[1]` до конца (см. tail_needed), промпт тот же,
+    что и на полной истории.
+
+    Сумма estimate_tokens() по строкам не превышает `token_budget`: саммари
+    и закреплённая запись урезаются до своих долей бюджета, а запись, которая
+    не влезает в остаток (например, огромная реплика юзера), — до остатка
+    (см. fit_line); более старые записи после неё не берутся.
+
+    Саммари создаются в maybe_summarize() и дописываются в ledger как
+    обычные Ice-записи, поэтому replay видит ровно тот же промпт.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 2000,
+        min_summary_span: int = 20,
+        summarizer: Summarizer = extractive_summary,
+        max_scan: int = 5000,
+        cache_size: int = 4096,
+        summary_share: float = 0.3,
+        pinned_share: float = 0.1,
+    ):
+        super().__init__(window_entries=None, token_budget=token_budget, cache_size=cache_size)
+        self.min_summary_span = min_summary_span
+        # Доли token_budget, больше которых саммари и закреплённая запись не занимают
+        self.summary_share = summary_share
+        self.pinned_share = pinned_share
+        self.summarizer = summarizer
+        self.max_scan = max_scan
+
+    # --- разметка истории ---
+
+    def _latest_summary(self, ice_history: IceHistory):
+        """(index, entry) последнего саммари или (None, None); скан ограничен max_scan."""
+        total = len(ice_history)
+        for i in range(total - 1, max(total - self.max_scan, 0) - 1, -1):
+            entry = ice_history[i]
+            if entry[1] == SUMMARY_TOOL:
+                return i, entry
+        return None, None
+
+    @staticmethod
+    def _offset(index: int | None, summary) -> int:
+        """
+        Абсолютный индекс ice_history[0]. Саммари помнит свою позицию (`at`);
+        без него (или у саммари старого формата) история считается полной.
+        """
+        if summary is None or "at" not in summary[2]:
+            return 0
+        return summary[2]["at"] - index
+
+    def tail_needed(self, ice_history: IceHistory) -> int | None:
+        """
+        Сколько последних записей нужно окну: от конца покрытого саммари до конца истории.
+        None — саммари с позицией в ice_history нет, нужна вся история сессии.
+        """
+        index, summary = self._latest_summary(ice_history)
+        if summary is None or "at" not in summary[2]:
+            return None
+        return len(ice_history) - (summary[2]["covers"][1] - self._offset(index, summary))
+
+    def _latest_transition(self, ice_history: IceHistory, stop: int = 0):
+        total = len(ice_history)
+        for i in range(total - 1, max(total - self.max_scan, stop) - 1, -1):
+            entry = ice_history[i]
+            if entry[1] == "update" and isinstance(entry[2], dict) and entry[2].get("state"):
+                return i, entry
+        return None, None
+
+    def _layout(self, ice_history: IceHistory):
+        """
+        Возвращает (summary_line, pinned_line, window_lines, window_start, covered_end, offset);
+        индексы — в ice_history, offset — абсолютный индекс ice_history[0].
+        """
+        summary_index, summary = self._latest_summary(ice_history)
+        offset = self._offset(summary_index, summary)
+        covered_end = max(summary[2]["covers"][1] - offset, 0) if summary else 0
+        summary_line = self.render_line(summary) if summary else None
+        if summary_line:
+            summary_line = fit_line(summary_line, int(self.token_budget * self.summary_share))
+
+        # Только после covers[1]: на хвосте и на полной истории закреплена одна и та же запись
+        pinned_index, pinned = self._latest_transition(ice_history, covered_end)
+        pinned_line = self.render_line(pinned) if pinned else None
+        if pinned_line:
+            pinned_line = fit_line(pinned_line, int(self.token_budget * self.pinned_share))
+
+        budget = self.token_budget
+        for line in (summary_line, pinned_line):
+            if line:
+                budget -= estimate_tokens(line)
+
+        window = []
+        used = 0
+        window_start = len(ice_history)
+        for i in range(len(ice_history) - 1, covered_end - 1, -1):
+            entry = ice_history[i]
+            if entry[1] == SUMMARY_TOOL:
+                continue
+            line = self.render_line(entry)
+            if line is not None:
+                cost = estimate_tokens(line)
+                if used + cost > budget:
+                    # Не влезает целиком: урезаем до остатка бюджета, старше не берём
+                    line = fit_line(line, budget - used)
+                    if line is not None:
+                        window.append(line)
+                        window_start = i
+                    break
+                used += cost
+                window.append(line)
+            window_start = i
+        window.reverse()
+
+        if pinned_index is not None and pinned_index >= window_start:
+            pinned_line = None  # и так в окне
+        return summary_line, pinned_line, window, window_start, covered_end, offset
+
+    # --- PromptBuilder API ---
+
+    def select_lines(self, ice_history: IceHistory) -> list:
+        summary_line, pinned_line, window, _, _, _ = self._layout(ice_history)
+        return [line for line in (summary_line, pinned_line) if line] + window
+
+    # --- саммари ---
+
+    def maybe_summarize(self, ice_history: IceHistory) -> IceEntry | None:
+        """
+        Если вне окна накопилось >= min_summary_span несжатых записей,
+        возвращает новую summary-запись (её нужно дописать в ledger), иначе None.
+        ice_history — вся история или хвост от covers[1] последнего саммари.
+        """
+        if not ice_history:
+            return None
+        _, summary = self._latest_summary(ice_history)
+        _, _, _, window_start, covered_end, offset = self._layout(ice_history)
+        span = [e for e in ice_history[covered_end:window_start] if e[1] != SUMMARY_TOOL]
+        if len(span) < self.min_summary_span:
+            return None
+
+        previous = summary[2].get("text") if summary else None
+        last = ice_history[-1]
+        return (
+            time.time(),
+            SUMMARY_TOOL,
+            {
+                "text": self.summarizer(previous, span),
+                "covers": [0, offset + window_start],
+                "at": offset + len(ice_history),
+            },
+            last[3],
+            last[4],
+            None,
+        )
@@ -1,23 +1,21 @@
 import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 
-from bulus.core.states import VALID_STATES_LIST
+from bulus.core.states import AGENT_FSM
+from bulus.runner.registry import ToolRegistry
+from bulus.runner.tools import registry
 
-# Описание инструментов
-TOOLS_SCHEMA = {
-    "send_message": "Send text to user. Args: {'text': str}",
-    "update": """
-    Update context. Atomic operation.
-    Args (optional): 
-    {
-      'state': str,   # Transition to new FSM State
-      'memory': dict  # Data to MERGE. Set value to null to delete.
-    }
-    """,
-    "test_ping": "Execute ping logic. Args: {'payload': str}",
-}
+
+@lru_cache(maxsize=4)
+def static_prompt_parts(tool_registry: ToolRegistry, registry_version: int) -> str:
+    """JSON статической части промпта (тулы) — пересчитывается только при смене реестра."""
+    return json.dumps(tool_registry.schema())
 
 
 def get_system_prompt(state: str, storage: dict) -> str:
+    tools_json = static_prompt_parts(registry, registry.version)
     return f"""
     You are the 'Stateless Brain' of Bulus.
     
@@ -26,8 +24,8 @@ def get_system_prompt(state: str, storage: dict) -> str:
     - Memory: {json.dumps(storage, ensure_ascii=False)}
     
     CONSTRAINTS:
-    - Valid States: {json.dumps(VALID_STATES_LIST)}
-    - Tools: {json.dumps(TOOLS_SCHEMA)}
+    - {AGENT_FSM.prompt_states(state)}
+    - Tools: {tools_json}
     
     STRATEGY:
     1. If user provides info -> Call `update` to save (memory) AND switch state.
@@ -38,3 +36,124 @@ def get_system_prompt(state: str, storage: dict) -> str:
     
     Decide the SINGLE next action.
     """
+
+
+def render_entry(tool: str, payload) -> str | None:
+    """Маппинг Ice-записи в читаемую для LLM строку (None — запись не показываем)."""
+    if tool == "user_said":
+        return f"[USER]: {payload}"
+    if tool == "send_message":
+        return f"[AGENT]: {payload.get('text', str(payload))}"
+    if tool == "update":
+        changes = []
+        if "state" in payload:
+            changes.append(f"State->{payload['state']}")
+        if "memory" in payload:
+            changes.append("Memory Updated")
+        if "error" in payload:
+            changes.append(f"Rejected: {payload['error']}")
+        return f"[SYSTEM]: {', '.join(changes)}"
+    if tool == "test_ping":
+        return "[SYSTEM]: Ping Executed"
+    if tool == "summary":
+        return f"[SUMMARY]: {payload.get('text', '')}"
+    return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая локальная оценка токенов (~4 символа на токен), без токенайзера."""
+    return len(text) // 4 + 1
+
+
+# Меньше стольких символов от исходной строки оставлять нет смысла — строку выкидываем
+MIN_ELIDED_CHARS = 32
+
+
+def fit_line(line: str, max_tokens: int) -> str | None:
+    """
+    Строка, укороченная до `max_tokens` по estimate_tokens: начало и конец
+    с маркером "[…N chars elided]" посередине. None — в бюджет не влезает даже огрызок.
+    """
+    if estimate_tokens(line) <= max_tokens:
+        return line
+    max_chars = 4 * max_tokens - 1  # наибольшая длина с estimate_tokens <= max_tokens
+    keep = max_chars - len(f" […{len(line)} chars elided] ")
+    if keep < MIN_ELIDED_CHARS:
+        return None
+    head = (keep + 1) // 2
+    tail = keep - head
+    return f"{line[:head]} […{len(line) - keep} chars elided] {line[len(line) - tail :]}"
+
+
+class PromptBuilder:
+    """
+    Инкрементальный рендер Ice в промпт.
+
+    Ice-записи иммутабельны, поэтому строка для записи рендерится один раз
+    и берётся из LRU-кэша (ключ — ts + tool записи: он переживает перечитывание
+    истории с диска на каждом шаге, в отличие от id() payload). Окно контекста
+    задаётся числом записей (`window_entries`) и/или бюджетом токенов
+    (`token_budget`): записи набираются с конца, пока влезают.
+    """
+
+    def __init__(self, window_entries: int | None = 15, token_budget: int | None = None, cache_size: int = 4096):
+        self.window_entries = window_entries
+        self.token_budget = token_budget
+        self.cache_size = cache_size
+        self._lines: OrderedDict = OrderedDict()  # (ts, tool) -> (payload, line)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Кэш строк и блокировка не переносятся: билдер уезжает в процессы-воркеры через pickle
+        state = dict(self.__dict__)
+        del state["_lines"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lines = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render_line(self, entry) -> str | None:
+        if len(entry) < 3:
+            return None
+        tool, payload = entry[1], entry[2]
+        key = (entry[0], tool)
+        with self._lock:
+            cached = self._lines.get(key)
+            # Сверка payload: у записей одного пакета ts может совпасть
+            if cached is not None and (cached[0] is payload or cached[0] == payload):
+                self._lines.move_to_end(key)
+                return cached[1]
+
+        try:
+            line = render_entry(tool, payload)
+        except Exception:
+            line = None
+        with self._lock:
+            self._lines[key] = (payload, line)
+            if len(self._lines) > self.cache_size:
+                self._lines.popitem(last=False)
+        return line
+
+    def select_lines(self, ice_history) -> list:
+        """Строки окна контекста в хронологическом порядке."""
+        total = len(ice_history)
+        stop = total - self.window_entries if self.window_entries is not None else 0
+        lines = []
+        used = 0
+        for i in range(total - 1, max(stop, 0) - 1, -1):
+            line = self.render_line(ice_history[i])
+            if line is None:
+                continue
+            if self.token_budget is not None:
+                cost = estimate_tokens(line)
+                if lines and used + cost > self.token_budget:
+                    break
+                used += cost
+            lines.append(line)
+        lines.reverse()
+        return lines
+
+    def render_ice(self, ice_history) -> str:
+        return "\n".join(self.select_lines(ice_history))
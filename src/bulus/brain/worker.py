@@ -1,17 +1,30 @@
-from openai import OpenAI
+import asyncio
+import contextvars
 
-from bulus.brain.prompts import get_system_prompt
+from openai import AsyncOpenAI, OpenAI
+
+from bulus import telemetry
+from bulus.brain.cache import BrainCache
+from bulus.brain.prompts import PromptBuilder, get_system_prompt
 from bulus.config import API_KEY, MODEL_NAME
 from bulus.core.schemas import Action, IceHistory
 from bulus.core.states import AgentState
 
 client = OpenAI(api_key=API_KEY) if API_KEY else None
+async_client = AsyncOpenAI(api_key=API_KEY) if API_KEY else None
 
 
-def stateless_brain(ice_history: IceHistory, client_override=None) -> Action:
-    llm_client = client_override or client
-    if not llm_client:
-        return Action(tool_name="error", payload_str="{}", thought="No API Key in .env")
+# Общий билдер промпта: кэширует отрендеренные строки Ice между вызовами
+default_prompt_builder = PromptBuilder()
+
+
+def build_messages(ice_history: IceHistory, builder: PromptBuilder | None = None) -> list:
+    """
+    Рендерит Ice в сообщения для LLM (общая часть sync/async мозга).
+    Читаются только последний кадр и окно builder'а, поэтому достаточно
+    хвоста истории (repo.load_tail()), а не всей сессии.
+    """
+    builder = builder or default_prompt_builder
 
     # 1. Восстановление контекста
     if not ice_history:
@@ -23,46 +36,153 @@ def stateless_brain(ice_history: IceHistory, client_override=None) -> Action:
         current_state = last_ice[3] if len(last_ice) > 3 else "unknown"
         current_storage = last_ice[4] if len(last_ice) > 4 else {}
 
-    # 2. Формирование Ice (фильтруем старые мысли)
-    items = []
-    # Берем последние 15 записей для контекста
-    recent_ice = ice_history[-15:]
-
-    for _i, item in enumerate(recent_ice):
-        try:
-            tool = item[1]
-            payload = item[2]
-            # thought = item[5] (пока скрываем для экономии)
-
-            # Маппинг для LLM (читаемый вид)
-            if tool == "user_said":
-                items.append(f"[USER]: {payload}")
-            elif tool == "send_message":
-                items.append(f"[AGENT]: {payload.get('text', str(payload))}")
-            elif tool == "update":
-                changes = []
-                if "state" in payload:
-                    changes.append(f"State->{payload['state']}")
-                if "memory" in payload:
-                    changes.append("Memory Updated")
-                items.append(f"[SYSTEM]: {', '.join(changes)}")
-            elif tool == "test_ping":
-                items.append("[SYSTEM]: Ping Executed")
-        except Exception:
-            pass
-
-    ice_text = "\n".join(items)
-
-    # 3. Вызов API
+    # 2. Формирование Ice: окно последних записей (по числу записей / бюджету токенов)
+    ice_text = builder.render_ice(ice_history)
+
+    return [
+        {"role": "system", "content": get_system_prompt(current_state, current_storage)},
+        {"role": "user", "content": f"Ice:\n{ice_text}\n\nNext step?"},
+    ]
+
+
+def _cached_action(cache: BrainCache | None, cache_key: str | None) -> Action | None:
+    if cache_key is None:
+        return None
+    action = cache.get(cache_key)
+    telemetry.count("brain.cache_hit" if action is not None else "brain.cache_miss")
+    return action
+
+
+def _count_usage(completion):
+    """Токены запроса/ответа (и попавшие в prompt cache провайдера) — в счётчики телеметрии."""
+    usage = getattr(completion, "usage", None)
+    if usage is None or not telemetry.is_enabled():
+        return
+    telemetry.count("llm.tokens_in", getattr(usage, "prompt_tokens", 0) or 0)
+    telemetry.count("llm.tokens_out", getattr(usage, "completion_tokens", 0) or 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+    if cached:
+        telemetry.count("llm.tokens_cached", cached)
+
+
+def stateless_brain(
+    ice_history: IceHistory,
+    client_override=None,
+    cache: BrainCache | None = None,
+    prompt_builder: PromptBuilder | None = None,
+    model: str | None = None,
+) -> Action:
+    llm_client = client_override or client
+    model = model or MODEL_NAME
+    with telemetry.span("brain.prompt"):
+        messages = build_messages(ice_history, prompt_builder)
+
+    # Детерминированный кэш: тот же промпт + модель -> тот же Action без вызова API
+    cache_key = BrainCache.key(model, messages) if cache is not None else None
+    if (cached := _cached_action(cache, cache_key)) is not None:
+        return cached
+
+    if not llm_client:
+        return Action(tool_name="error", payload_str="{}", thought="No API Key in .env")
+
+    # 3. Вызов API (валидация Action идёт внутри parse — спан action.validate вложен в brain.llm)
     try:
-        completion = llm_client.beta.chat.completions.parse(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": get_system_prompt(current_state, current_storage)},
-                {"role": "user", "content": f"Ice:\n{ice_text}\n\nNext step?"},
-            ],
-            response_format=Action,
-        )
+        with telemetry.span("brain.llm", model=model):
+            completion = llm_client.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=Action,
+            )
+        _count_usage(completion)
+        action = completion.choices[0].message.parsed
+    except Exception as e:
+        return Action(tool_name="error", payload_str="{}", thought=f"LLM Error: {str(e)}")
+
+    if cache_key is not None:
+        cache.put(cache_key, action)
+    return action
+
+
+class BrainLimiter:
+    """
+    Backpressure для async мозга: не больше `max_concurrency` одновременных
+    LLM-вызовов и `timeout` секунд на каждый. Лишние вызовы ждут слота.
+
+    run() реентерабелен в пределах задачи: если тот же лимитер передан и
+    движку, и astateless_brain(limiter=...), вложенный вызов не ждёт второго
+    слота (иначе N сессий держат по слоту и ждут ещё по одному — deadlock).
+    """
+
+    def __init__(self, max_concurrency: int = 16, timeout: float | None = 60.0):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._semaphore: asyncio.Semaphore | None = None
+        # True в контексте задачи, которая уже держит слот этого лимитера
+        self._held = contextvars.ContextVar(f"bulus_limiter_{id(self)}", default=False)
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Создаём лениво: семафор должен жить в том event loop, где его используют
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, coro):
+        """Выполняет корутину в слоте семафора с таймаутом (asyncio.TimeoutError при превышении)."""
+        if self._held.get():
+            return await asyncio.wait_for(coro, self.timeout)
+        async with self.semaphore:
+            # wait_for запускает coro в задаче с копией текущего контекста — она видит флаг
+            token = self._held.set(True)
+            try:
+                return await asyncio.wait_for(coro, self.timeout)
+            finally:
+                self._held.reset(token)
+
+
+async def astateless_brain(
+    ice_history: IceHistory,
+    client_override=None,
+    limiter: BrainLimiter | None = None,
+    timeout: float | None = None,
+    cache: BrainCache | None = None,
+    prompt_builder: PromptBuilder | None = None,
+    model: str | None = None,
+) -> Action:
+    """Async-версия stateless_brain: не блокирует поток на время сетевого запроса."""
+    llm_client = client_override or async_client
+    model = model or MODEL_NAME
+    with telemetry.span("brain.prompt"):
+        messages = build_messages(ice_history, prompt_builder)
+
+    cache_key = BrainCache.key(model, messages) if cache is not None else None
+    if (cached := _cached_action(cache, cache_key)) is not None:
+        return cached
+
+    if not llm_client:
+        return Action(tool_name="error", payload_str="{}", thought="No API Key in .env")
+
+    async def _call():
+        with telemetry.span("brain.llm", model=model):
+            completion = await llm_client.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=Action,
+            )
+        _count_usage(completion)
         return completion.choices[0].message.parsed
+
+    try:
+        if limiter is None:
+            action = await asyncio.wait_for(_call(), timeout)
+        else:
+            action = await limiter.run(asyncio.wait_for(_call(), timeout))
+    except asyncio.TimeoutError:
+        return Action(tool_name="error", payload_str="{}", thought="LLM Timeout")
     except Exception as e:
         return Action(tool_name="error", payload_str="{}", thought=f"LLM Error: {str(e)}")
+
+    if cache_key is not None:
+        cache.put(cache_key, action)
+    return action
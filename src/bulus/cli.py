@@ -0,0 +1,230 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from functools import partial
+from itertools import islice
+
+from bulus import telemetry
+from bulus.brain.cache import BrainCache
+from bulus.brain.context import ContextWindow
+from bulus.brain.worker import stateless_brain
+from bulus.config import NOTIFY_CHANNEL, STORAGE_BACKEND
+from bulus.engine.cluster import ShardedEngine
+from bulus.engine.replay import ReplayCheckpoint, ReplayEngine
+from bulus.storage import discover_sessions, repository
+from bulus.storage.notify import SocketChannel
+from bulus.storage.watch import InotifyWatcher, inotify_available
+
+# Интервал полного перескана в serve (если не задан --poll): редкий, когда о каждой
+# записи приходит уведомление, и частый, когда писатели могут ничего не публиковать
+RESCAN_NOTIFIED = 30.0
+RESCAN_UNNOTIFIED = 1.0
+
+
+def load_callable(path: str):
+    """'package.module:attr' -> объект."""
+    module_name, _, attr = path.partition(":")
+    if not attr:
+        raise argparse.ArgumentTypeError(f"Expected 'module:attr', got '{path}'")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def cmd_replay(args) -> int:
+    if args.sessions_dir:
+        repository.SESSIONS_DIR = args.sessions_dir
+
+    brain = load_callable(args.brain) if args.brain else stateless_brain
+    options = {}
+    if args.model:
+        options["model"] = args.model
+    if args.cache:
+        options["cache"] = BrainCache()
+    if options:
+        brain = partial(brain, **options)
+
+    sessions = discover_sessions().items()
+    if args.limit is not None:
+        sessions = list(islice(sessions, args.limit))
+
+    checkpoint = ReplayCheckpoint(args.checkpoint) if args.checkpoint else None
+    histogram = telemetry.HistogramSink() if args.trace else None
+    if args.trace:
+        telemetry.enable(histogram, telemetry.JsonlSink(args.trace))
+    try:
+        report = ReplayEngine(brain=brain, max_workers=args.workers, checkpoint=checkpoint).run(sessions)
+    finally:
+        if args.trace:
+            telemetry.disable()
+
+    print(report.format())
+    if histogram is not None:
+        print(histogram.format())
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+    return 1 if args.fail_on_divergence and report.divergences else 0
+
+
+def notify_mode(kind: str, backend: str | None) -> str:
+    """--notify с раскрытым auto: inotify для файловых бэкендов на Linux, иначе socket."""
+    if kind != "auto":
+        return kind
+    # sqlite пишет в одну БД — inotify не знает, какая сессия изменилась
+    file_backend = (backend or STORAGE_BACKEND) != "sqlite"
+    return "inotify" if inotify_available() and file_backend else "socket"
+
+
+def rescan_interval(kind: str, poll: float | None) -> float:
+    """
+    --poll или умолчание для режима уведомлений. inotify видит все записи;
+    в сокет публикуют только писатели с BULUS_NOTIFY=socket, так что без него
+    в окружении serve (значит, скорее всего, и у писателей) перескан частый.
+    """
+    if poll is not None:
+        return poll
+    if kind == "inotify" or (kind == "socket" and NOTIFY_CHANNEL == "socket"):
+        return RESCAN_NOTIFIED
+    return RESCAN_UNNOTIFIED
+
+
+def open_watcher(kind: str):
+    """Подписка на изменения сессий для serve (kind из notify_mode): inotify, SocketChannel или None."""
+    if kind == "inotify":
+        return InotifyWatcher()
+    if kind == "socket":
+        return SocketChannel().subscribe()
+    return None
+
+
+def serve_forever(engine: ShardedEngine, watcher, rescan: float):
+    """Будит сессии по уведомлениям; полный перескан раз в `rescan` секунд ловит то, что никто не опубликовал."""
+    engine.submit(discover_sessions())
+    rescan_at = time.monotonic() + rescan
+    while True:
+        timeout = max(0.0, rescan_at - time.monotonic())
+        change = watcher.get(timeout) if watcher is not None else None
+        if change is not None:
+            engine.on_change(change)
+            continue
+        if watcher is None:
+            time.sleep(timeout)
+        if time.monotonic() >= rescan_at:
+            engine.submit(discover_sessions())
+            rescan_at = time.monotonic() + rescan
+
+
+def cmd_serve(args) -> int:
+    if args.sessions_dir:
+        repository.SESSIONS_DIR = args.sessions_dir
+
+    brain = load_callable(args.brain) if args.brain else stateless_brain
+    if args.model:
+        brain = partial(brain, model=args.model)
+
+    kind = "none" if args.until_idle else notify_mode(args.notify, args.backend)
+    rescan = rescan_interval(kind, args.poll)
+    if kind == "socket":
+        # Воркеры serve (spawn) наследуют окружение и публикуют свои записи в сокет
+        os.environ["BULUS_NOTIFY"] = "socket"
+
+    engine = ShardedEngine(
+        brain=brain,
+        backend=args.backend,
+        brain_workers=args.brain_workers,
+        runner_workers=args.runner_workers,
+        brain_threads=args.brain_threads,
+        runner_threads=args.runner_threads,
+        context=ContextWindow(token_budget=args.context_budget) if args.context_budget else None,
+    )
+    print(f"Serving {repository.SESSIONS_DIR} with {args.brain_workers} brain and {args.runner_workers} runner workers")
+    if not args.until_idle:
+        print(f"Change notifications: {kind}, full rescan every {rescan:g}s")
+    watcher = open_watcher(kind)
+    started = time.perf_counter()
+    with engine:
+        try:
+            if args.until_idle:
+                while engine.submit(discover_sessions()):
+                    engine.wait_idle()
+            else:
+                serve_forever(engine, watcher, rescan)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"{engine.steps['brain']} brain steps, {engine.steps['runner']} runner steps "
+        f"in {elapsed:.1f}s, {len(engine.errors)} errors"
+    )
+    for session_id, error in engine.errors[:10]:
+        print(f"   {session_id}: {error}")
+    return 1 if engine.errors else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="bulus", description="Bulus command line tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay = commands.add_parser(
+        "replay", help="Re-run recorded brain decisions of every stored session and report divergences"
+    )
+    replay.add_argument("--sessions-dir", help="Sessions directory (default: BULUS sessions dir)")
+    replay.add_argument("--brain", help="Brain callable as 'module:attr' (default: stateless_brain)")
+    replay.add_argument("--model", help="Model name passed to the brain (default: OPENAI_MODEL_NAME)")
+    replay.add_argument("--cache", action="store_true", help="Use the on-disk brain decision cache")
+    replay.add_argument("--workers", type=int, default=16, help="Concurrent brain calls (default: 16)")
+    replay.add_argument("--checkpoint", help="JSONL checkpoint file; finished sessions are skipped on restart")
+    replay.add_argument("--report", help="Write the aggregate report as JSON to this path")
+    replay.add_argument("--limit", type=int, help="Replay at most N sessions")
+    replay.add_argument("--trace", help="Write telemetry spans/counters as JSONL to this path and print a summary")
+    replay.add_argument("--fail-on-divergence", action="store_true", help="Exit with status 1 if any decision differs")
+    replay.set_defaults(func=cmd_replay)
+
+    serve = commands.add_parser(
+        "serve", help="Run brain and runner worker processes over the sessions directory, sharded by session_id"
+    )
+    serve.add_argument("--sessions-dir", help="Sessions directory (default: BULUS sessions dir)")
+    serve.add_argument("--backend", help="Storage backend (default: BULUS_STORAGE_BACKEND)")
+    serve.add_argument("--brain", help="Brain callable as 'module:attr' (default: stateless_brain)")
+    serve.add_argument("--model", help="Model name passed to the brain (default: OPENAI_MODEL_NAME)")
+    serve.add_argument(
+        "--brain-workers", type=int, default=os.cpu_count() or 1, help="Brain worker processes (default: CPU count)"
+    )
+    serve.add_argument("--runner-workers", type=int, default=1, help="Runner worker processes (default: 1)")
+    serve.add_argument("--brain-threads", type=int, default=8, help="Concurrent brain calls per process (default: 8)")
+    serve.add_argument("--runner-threads", type=int, default=4, help="Runner threads per process (default: 4)")
+    serve.add_argument(
+        "--context-budget",
+        type=int,
+        help="Token budget of the brain's context window; older turns are folded into summaries (default: off)",
+    )
+    serve.add_argument(
+        "--notify",
+        choices=("auto", "inotify", "socket", "none"),
+        default="auto",
+        help="How to learn about session writes by other processes (default: inotify on Linux, else socket)",
+    )
+    serve.add_argument(
+        "--poll",
+        type=float,
+        help="Seconds between full rescans of the sessions dir "
+        "(default: 30 with inotify or BULUS_NOTIFY=socket, else 1: writers may publish nothing)",
+    )
+    serve.add_argument("--until-idle", action="store_true", help="Exit once no session needs the brain or runner")
+    serve.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
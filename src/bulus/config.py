@@ -17,6 +17,14 @@ MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-5-mini")  # Или gpt-4o-mini
 BULUS_DIR = BASE_DIR / ".bulus"
 BLOBS_DIR = BULUS_DIR / "blobs"
 SESSIONS_DIR = BULUS_DIR / "sessions"
+CACHE_DIR = BULUS_DIR / "cache"  # кэш решений мозга, создаётся по требованию
+
+# Бэкенд хранения сессий: "json" (один файл), "log" (append-only сегменты), "sqlite" или "binary" (.bulus)
+STORAGE_BACKEND = os.getenv("BULUS_STORAGE_BACKEND", "json")
+
+# BULUS_NOTIFY=socket: каждая запись сессии публикуется в SocketChannel (SESSIONS_DIR/.notify),
+# чтобы `bulus serve` и другие подписчики узнавали о ней без поллинга
+NOTIFY_CHANNEL = os.getenv("BULUS_NOTIFY", "")
 
 # Авто-создание папок
 os.makedirs(BLOBS_DIR, exist_ok=True)
@@ -0,0 +1,188 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, List
+
+from bulus.core.schemas import IceEntry
+
+# Delta между двумя снапшотами storage:
+# {"set": {key: value, ...}, "unset": [key, ...]}
+StorageDelta = Dict[str, Any]
+
+
+class FrozenSnapshot(dict):
+    """
+    Снапшот storage только для чтения: его делят записи CompactIce и кэш
+    материализации, поэтому мутация на месте запрещена. Патч делается на копии
+    (dict.copy() / dict(snapshot) возвращают обычный dict), как в apply_update.
+    """
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Storage snapshot is read-only; copy it before patching")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        # pickle/deepcopy отдают обычный dict: копия уже ни с кем не разделена
+        return dict, (dict(self),)
+
+
+def storage_delta(prev: dict, cur: dict) -> StorageDelta | None:
+    """Разница между снапшотами; None, если они совпадают."""
+    if cur is prev:
+        return None
+    changed = {k: v for k, v in cur.items() if k not in prev or prev[k] != v}
+    removed = [k for k in prev if k not in cur]
+    if not changed and not removed:
+        return None
+    return {"set": changed, "unset": removed}
+
+
+def apply_delta(storage: dict, delta: StorageDelta | None) -> dict:
+    """Применяет delta к снапшоту и возвращает НОВЫЙ dict (исходный не трогаем)."""
+    if not delta:
+        return storage
+    result = dict(storage)
+    for k in delta.get("unset", []):
+        result.pop(k, None)
+    result.update(delta.get("set", {}))
+    return result
+
+
+class CompactIce(Sequence):
+    """
+    Компактное представление Ice history.
+
+    Снапшот storage хранится только когда он меняется (delta к предыдущему),
+    каждый `keyframe_every`-й снапшот — целиком. Записи, которые не меняют
+    память (send_message, user_said, ...), ссылаются на тот же снапшот.
+    append() снимает копию storage, наружу отдаются FrozenSnapshot — общие
+    снапшоты нельзя испортить мутацией на месте.
+    Полный storage восстанавливается лениво при доступе; снаружи это обычная
+    последовательность IceEntry-кортежей.
+    """
+
+    def __init__(self, entries: Iterable[IceEntry] = (), keyframe_every: int = 32, cache_size: int = 64):
+        self.keyframe_every = max(1, keyframe_every)
+        self._rows: List[tuple] = []  # (ts, tool, payload, state, snap_pos, thought)
+        self._deltas: List[StorageDelta | None] = []  # по одному на изменение storage
+        self._keyframes: Dict[int, dict] = {}  # snap_pos -> полный снапшот
+        self._cache: OrderedDict = OrderedDict()  # snap_pos -> материализованный снапшот
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+        self._last_storage: dict | None = None
+        for entry in entries:
+            self.append(entry)
+
+    # --- Sequence API ---
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._materialize_row(self._rows[i]) for i in range(*index.indices(len(self._rows)))]
+        return self._materialize_row(self._rows[index])
+
+    def __iter__(self):
+        for row in self._rows:
+            yield self._materialize_row(row)
+
+    def __repr__(self) -> str:
+        return f"CompactIce(entries={len(self._rows)}, snapshots={len(self._deltas)})"
+
+    # --- запись ---
+
+    def append(self, entry: IceEntry):
+        ts, tool, payload, state, storage, thought = entry
+        if not isinstance(storage, FrozenSnapshot):
+            # Копия: вызывающий может дальше мутировать свой dict на месте
+            storage = FrozenSnapshot(storage or {})
+        if self._last_storage is None:
+            delta = storage_delta({}, storage) or {"set": {}, "unset": []}
+        else:
+            delta = storage_delta(self._last_storage, storage)
+
+        if delta is None:
+            snap_pos = len(self._deltas) - 1
+        else:
+            snap_pos = len(self._deltas)
+            self._deltas.append(delta)
+            if snap_pos % self.keyframe_every == 0:
+                self._keyframes[snap_pos] = storage
+
+        self._last_storage = storage
+        self._rows.append((ts, tool, payload, state, snap_pos, thought))
+
+    def extend(self, entries: Iterable[IceEntry]):
+        for entry in entries:
+            self.append(entry)
+
+    # --- чтение ---
+
+    def storage_at(self, index: int) -> dict:
+        """Полный снапшот storage после записи `index`."""
+        return self._snapshot(self._rows[index][4])
+
+    def _materialize_row(self, row: tuple) -> IceEntry:
+        ts, tool, payload, state, snap_pos, thought = row
+        return (ts, tool, payload, state, self._snapshot(snap_pos), thought)
+
+    def _snapshot(self, snap_pos: int) -> dict:
+        # Кэш под блокировкой: общий префикс форков читают параллельные ветки
+        with self._cache_lock:
+            cached = self._cache.get(snap_pos)
+            if cached is not None:
+                self._cache.move_to_end(snap_pos)
+                return cached
+
+        # Ближайший keyframe слева + применение delta до нужной позиции
+        base = snap_pos - snap_pos % self.keyframe_every
+        snapshot = self._keyframes[base]
+        if snap_pos != base:
+            snapshot = FrozenSnapshot(snapshot)
+            for pos in range(base + 1, snap_pos + 1):
+                delta = self._deltas[pos]
+                for k in delta.get("unset", []):
+                    dict.pop(snapshot, k, None)
+                dict.update(snapshot, delta.get("set", {}))
+
+        with self._cache_lock:
+            self._cache[snap_pos] = snapshot
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return snapshot
+
+    # --- (де)сериализация ---
+
+    def to_rows(self) -> list:
+        """JSON-совместимые строки: storage заменён на delta (null — без изменений)."""
+        rows = []
+        prev_pos = -1
+        for ts, tool, payload, state, snap_pos, thought in self._rows:
+            delta = self._deltas[snap_pos] if snap_pos != prev_pos else None
+            rows.append([ts, tool, payload, state, delta, thought])
+            prev_pos = snap_pos
+        return rows
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[list], keyframe_every: int = 32) -> "CompactIce":
+        """Восстанавливает CompactIce из to_rows(); полные копии снимаются только в keyframe."""
+        ice = cls(keyframe_every=keyframe_every)
+        working: dict = {}
+        for ts, tool, payload, state, delta, thought in rows:
+            if delta is not None or not ice._deltas:
+                snap_pos = len(ice._deltas)
+                ice._deltas.append(delta or {"set": {}, "unset": []})
+                if delta:
+                    for k in delta.get("unset", []):
+                        working.pop(k, None)
+                    working.update(delta.get("set", {}))
+                if snap_pos % ice.keyframe_every == 0:
+                    ice._keyframes[snap_pos] = FrozenSnapshot(working)
+            ice._rows.append((ts, tool, payload, state, len(ice._deltas) - 1, thought))
+        ice._last_storage = FrozenSnapshot(working) if ice._rows else None
+        return ice
@@ -0,0 +1,88 @@
+import json
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Mapping, Tuple
+
+
+@dataclass(frozen=True)
+class StateSpec:
+    """
+    Декларация одного стейта FSM.
+
+    transitions — в какие стейты из него можно перейти (остаться в том же
+    можно всегда); waiting — агент ждёт реплику юзера; terminal — выходов
+    нет; requires — ключи memory, без которых в стейт не войти.
+    """
+
+    name: str
+    transitions: Tuple[str, ...] = ()
+    waiting: bool = False
+    terminal: bool = False
+    requires: Tuple[str, ...] = ()
+
+
+class FSM:
+    """
+    Скомпилированная FSM: спецификация один раз превращается во frozenset'ы
+    и таблицы смежности, все проверки — O(1) lookup'ы. Общая для валидатора
+    Action, раннера, движка и промпта.
+    """
+
+    def __init__(self, specs: Iterable[StateSpec], initial: str):
+        specs = list(specs)
+        order = tuple(spec.name for spec in specs)
+        if len(set(order)) != len(order):
+            raise ValueError(f"Duplicate states in FSM spec: {order}")
+        known = frozenset(order)
+        if initial not in known:
+            raise ValueError(f"Initial state '{initial}' is not declared")
+        for spec in specs:
+            unknown = set(spec.transitions) - known
+            if unknown:
+                raise ValueError(f"State '{spec.name}' has transitions to undeclared states: {sorted(unknown)}")
+            if spec.terminal and spec.transitions:
+                raise ValueError(f"Terminal state '{spec.name}' cannot have transitions")
+
+        self.initial = initial
+        self.order = order
+        self.states: FrozenSet[str] = known
+        self.waiting: FrozenSet[str] = frozenset(spec.name for spec in specs if spec.waiting)
+        self.terminal: FrozenSet[str] = frozenset(spec.name for spec in specs if spec.terminal)
+        self.transitions: Mapping[str, FrozenSet[str]] = {spec.name: frozenset(spec.transitions) for spec in specs}
+        self.requires: Mapping[str, FrozenSet[str]] = {spec.name: frozenset(spec.requires) for spec in specs}
+
+        # Легальные стейты для промпта: текущий + переходы, в порядке объявления.
+        # Из незнакомого стейта (старые сессии) можно в любой.
+        self._next: Dict[str, Tuple[str, ...]] = {
+            name: tuple(s for s in order if s == name or s in self.transitions[name]) for name in order
+        }
+        self._prompt: Dict[str | None, str] = {name: self._render_prompt(self._next[name]) for name in order}
+        self._prompt[None] = self._render_prompt(order)
+
+    def _render_prompt(self, names: Tuple[str, ...]) -> str:
+        text = f"Valid States: {json.dumps(list(names))}"
+        requires = {name: sorted(self.requires[name]) for name in names if self.requires[name]}
+        if requires:
+            text += f"\n    - State Requirements (memory keys): {json.dumps(requires)}"
+        return text
+
+    def next_states(self, state: str) -> Tuple[str, ...]:
+        """Куда можно перейти из `state` (включая сам state)."""
+        return self._next.get(state, self.order)
+
+    def prompt_states(self, state: str) -> str:
+        """Готовая строка промпта со списком легальных стейтов (предвычислена при компиляции)."""
+        return self._prompt.get(state, self._prompt[None])
+
+    def check_transition(self, current: str, target: str, storage: Mapping) -> str | None:
+        """None, если переход current -> target легален при таком storage; иначе текст ошибки."""
+        if target == current:
+            return None
+        if target not in self.states:
+            return f"Invalid state '{target}'. Allowed: {list(self.order)}"
+        allowed = self.transitions.get(current)
+        if allowed is not None and target not in allowed:
+            return f"Illegal transition '{current}' -> '{target}'. Allowed: {list(self.next_states(current))}"
+        missing = self.requires[target].difference(storage)
+        if missing:
+            return f"State '{target}' requires memory keys: {sorted(missing)}"
+        return None
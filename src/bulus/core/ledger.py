@@ -0,0 +1,121 @@
+from collections.abc import Sequence
+from typing import Iterable, Iterator, Tuple
+
+from bulus.core.compact import CompactIce
+from bulus.core.schemas import IceEntry
+
+
+class Ledger(Sequence):
+    """
+    Ice ledger с дешёвыми rewind/fork.
+
+    Ledger — это узел дерева веток: префикс длины `base` принадлежит
+    родителю (общий, не копируется), собственные записи лежат в CompactIce.
+    Каждые `checkpoint_every` изменений storage хранится полный снапшот,
+    поэтому at(n) стоит O(глубина форков + checkpoint_every), а fork(n) — O(1).
+    Форки copy-on-write: родитель никогда не меняется через потомка.
+    """
+
+    def __init__(self, entries: Iterable[IceEntry] = (), checkpoint_every: int = 32):
+        self.checkpoint_every = checkpoint_every
+        self._parent: Ledger | None = None
+        self._base = 0
+        self._tail = CompactIce(entries, keyframe_every=checkpoint_every)
+
+    @classmethod
+    def _branch(cls, parent: "Ledger", base: int) -> "Ledger":
+        ledger = cls(checkpoint_every=parent.checkpoint_every)
+        ledger._parent = parent
+        ledger._base = base
+        return ledger
+
+    # --- Sequence API ---
+
+    def __len__(self) -> int:
+        return self._base + len(self._tail)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return list(self._iter_range(start, stop))
+            return [self.at(i) for i in range(start, stop, step)]
+        return self.at(index)
+
+    def __iter__(self) -> Iterator[IceEntry]:
+        return self._iter_range(0, len(self))
+
+    def __repr__(self) -> str:
+        return f"Ledger(entries={len(self)}, base={self._base}, depth={self.depth})"
+
+    @property
+    def depth(self) -> int:
+        """Сколько форков над корневым ledger."""
+        node, depth = self._parent, 0
+        while node is not None:
+            node, depth = node._parent, depth + 1
+        return depth
+
+    # --- запись ---
+
+    def append(self, entry: IceEntry):
+        self._tail.append(entry)
+
+    def extend(self, entries: Iterable[IceEntry]):
+        self._tail.extend(entries)
+
+    # --- time travel ---
+
+    def at(self, n: int) -> IceEntry:
+        """Запись #n (поддерживает отрицательные индексы)."""
+        if n < 0:
+            n += len(self)
+        if not 0 <= n < len(self):
+            raise IndexError("ledger index out of range")
+        node = self
+        while n < node._base:
+            node = node._parent
+        return node._tail[n - node._base]
+
+    def state_at(self, n: int) -> Tuple[str, dict]:
+        """(state, storage) после записи #n."""
+        entry = self.at(n)
+        return entry[3], entry[4]
+
+    def fork(self, n: int) -> "Ledger":
+        """
+        Новая ветка, содержащая первые n записей (rewind к turn #n).
+        Дальнейшие append идут только в ветку.
+        """
+        if not 0 <= n <= len(self):
+            raise IndexError("fork point out of range")
+        # Короткая цепочка: если точка форка внутри префикса родителя — форкаем родителя
+        node = self
+        while node._parent is not None and n <= node._base:
+            node = node._parent
+        return Ledger._branch(node, n)
+
+    def replay_from(self, n: int) -> Iterator[IceEntry]:
+        """Записи начиная с #n по порядку."""
+        if n < 0:
+            n += len(self)
+        return self._iter_range(max(0, n), len(self))
+
+    def _iter_range(self, start: int, stop: int) -> Iterator[IceEntry]:
+        # Собираем узлы цепочки от корня, чтобы идти по каждому последовательно
+        chain = []
+        node = self
+        while node is not None:
+            chain.append(node)
+            node = node._parent
+        chain.reverse()
+
+        pos = start
+        for i, node in enumerate(chain):
+            node_stop = chain[i + 1]._base if i + 1 < len(chain) else len(self)
+            node_stop = min(node_stop, stop)
+            while pos < node_stop:
+                yield node._tail[pos - node._base]
+                pos += 1
+            if pos >= stop:
+                return
@@ -1,15 +1,38 @@
 import json
 from typing import Any, Dict, List, Tuple, TypeAlias
 
-from pydantic import BaseModel, Field, PrivateAttr, model_validator
+from pydantic import BaseModel, Field, PrivateAttr, ValidationInfo, model_validator
 
-from bulus.core.states import VALID_STATES_LIST
+from bulus import telemetry
+from bulus.core.states import AGENT_FSM
 
 # --- Ice Structure ---
 # (timestamp, tool_name, payload, state, storage, thought)
 IceEntry: TypeAlias = Tuple[float, str, Dict[str, Any], str, Dict[str, Any], str | None]
 IceHistory: TypeAlias = List[IceEntry]
 
+# Пакет независимых действий за один шаг мозга:
+# payload = {"actions": [{"tool_name": str, "payload": dict, "thought": str?}, ...]}
+BATCH_TOOL = "batch"
+
+
+def check_payload(tool_name: str, data: Any) -> Any:
+    """Проверки payload, общие для ответа LLM и уже распарсенных действий; исходный dict не мутируется."""
+    # 1. Валидация логики 'update' (легальность перехода проверяет раннер: он знает текущий стейт)
+    if tool_name == "update" and isinstance(data, dict) and "state" in data and data["state"] not in AGENT_FSM.states:
+        error = f"Invalid state '{data['state']}'. Allowed: {list(AGENT_FSM.order)}"
+        data = {**{k: v for k, v in data.items() if k != "state"}, "error": error}
+
+    # 2. Валидация пакета действий
+    if tool_name == BATCH_TOOL:
+        items = data.get("actions") if isinstance(data, dict) else None
+        if not isinstance(items, list) or not all(
+            isinstance(item, dict) and isinstance(item.get("tool_name"), str) and item["tool_name"] != BATCH_TOOL
+            for item in items
+        ):
+            data = {"error": "Batch payload must be {'actions': [{'tool_name': str, 'payload': dict}, ...]}"}
+    return data
+
 
 # --- Action Model (SOTA for Strict Mode) ---
 class Action(BaseModel):
@@ -27,18 +50,39 @@ class Action(BaseModel):
         return self._payload
 
     @model_validator(mode="after")
-    def validate_and_parse(self):
-        # 1. Парсим JSON
-        try:
-            data = json.loads(self.payload_str)
-        except json.JSONDecodeError:
-            self._payload = {"error": "Invalid JSON string from LLM"}
-            return self
-
-        # 2. Валидация логики 'update'
-        if self.tool_name == "update" and "state" in data and data["state"] not in VALID_STATES_LIST:
-            data["error"] = f"Invalid state '{data['state']}'. Allowed: {VALID_STATES_LIST}"
-            del data["state"]
-
-        self._payload = data
+    def validate_and_parse(self, info: ValidationInfo):
+        with telemetry.span("action.validate", tool=self.tool_name):
+            # 1. Парсим JSON (from_payload передаёт уже распарсенный payload через context)
+            if info.context is not None and "payload" in info.context:
+                data = info.context["payload"]
+            else:
+                try:
+                    data = json.loads(self.payload_str)
+                except json.JSONDecodeError:
+                    self._payload = {"error": "Invalid JSON string from LLM"}
+                    return self
+
+            self._payload = check_payload(self.tool_name, data)
         return self
+
+    @classmethod
+    def from_payload(cls, tool_name: str, payload: Any, thought: str = "", payload_str: str | None = None) -> "Action":
+        """
+        Action из уже распарсенного payload (pending_action, элемент пакета):
+        без повторного json.loads, проверки payload — те же.
+        payload_str кодируется, только если не передан.
+        """
+        if payload_str is None:
+            payload_str = json.dumps(payload, ensure_ascii=False)
+        return cls.model_validate(
+            {"tool_name": tool_name, "payload_str": payload_str, "thought": thought}, context={"payload": payload}
+        )
+
+    def sub_actions(self) -> List["Action"]:
+        """Действия пакета по порядку; для обычного Action — [self]."""
+        if self.tool_name != BATCH_TOOL:
+            return [self]
+        return [
+            Action.from_payload(item["tool_name"], item.get("payload", {}), item.get("thought") or self.thought)
+            for item in self._payload.get("actions", [])
+        ]
@@ -1,5 +1,7 @@
 from enum import Enum
 
+from bulus.core.fsm import FSM, StateSpec
+
 
 class AgentState(str, Enum):
     HELLO = "hello"
@@ -9,5 +11,29 @@ class AgentState(str, Enum):
     CALL_PING = "call_ping"
 
 
+_ASK_STATES = (AgentState.ASK_NAME.value, AgentState.ASK_AGE.value, AgentState.ASK_OCCUPATION.value)
+
+# Декларативная FSM агента: юзер может назвать несколько полей сразу,
+# поэтому между вопросами можно прыгать в любом порядке; call_ping — финал,
+# в него пускаем только когда все поля собраны.
+AGENT_FSM = FSM(
+    [
+        StateSpec(AgentState.HELLO.value, transitions=(*_ASK_STATES, AgentState.CALL_PING.value)),
+        *(
+            StateSpec(
+                state,
+                transitions=(*(s for s in _ASK_STATES if s != state), AgentState.CALL_PING.value),
+                waiting=True,
+            )
+            for state in _ASK_STATES
+        ),
+        StateSpec(AgentState.CALL_PING.value, terminal=True, requires=("name", "age", "occupation")),
+    ],
+    initial=AgentState.HELLO.value,
+)
+
 # Список для валидации в Pydantic
-VALID_STATES_LIST = [s.value for s in AgentState]
+VALID_STATES_LIST = list(AGENT_FSM.order)
+
+# Стейты, в которых агент ждёт юзера (движок ставит сессии status=still)
+WAITING_STATES = AGENT_FSM.waiting
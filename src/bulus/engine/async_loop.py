@@ -0,0 +1,125 @@
+import asyncio
+import contextlib
+import contextvars
+from functools import partial
+from typing import Awaitable, Callable, Dict, Iterable
+
+from bulus import telemetry
+from bulus.brain.context import ContextWindow
+from bulus.brain.worker import BrainLimiter, astateless_brain
+from bulus.core.schemas import Action, IceHistory
+from bulus.engine.loop import (
+    HOT_TAIL,
+    load_recent,
+    record_pending_action,
+    runner_step,
+    summarize_step,
+    user_step,
+    with_context,
+)
+from bulus.engine.scheduler import READY_STATUSES
+from bulus.storage import open_repo
+from bulus.storage.notify import AsyncSubscription
+from bulus.storage.repository import BulusRepo, ConflictError
+
+AsyncBrain = Callable[[IceHistory], Awaitable[Action]]
+
+
+async def _offload(func, *args):
+    """
+    Блокирующий вызов (диск, sqlite, синхронный summarizer) в пуле потоков
+    loop'а, чтобы цикл событий не стоял, пока другие сессии ждут мозг.
+    Контекст (текущий спан, сборщик таймингов шага) переносится в поток,
+    как в asyncio.to_thread, которого нет в Python 3.8.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(contextvars.copy_context().run, func, *args))
+
+
+class AsyncSessionEngine:
+    """
+    asyncio-движок: каждая сессия — корутина, которая крутит шаги
+    brain/runner, пока не дойдёт до ожидания пользователя (status=still).
+    Все LLM-вызовы проходят через общий BrainLimiter (семафор + таймаут),
+    поэтому сотни сессий думают параллельно на одном ядре без перегрузки API.
+    На цикле событий ждётся только мозг: чтение, шаг раннера и запись
+    идут в пуле потоков (_offload).
+    С `context` история сворачивается в саммари, как в SessionScheduler.
+    """
+
+    def __init__(
+        self,
+        brain: AsyncBrain = astateless_brain,
+        repo_factory: Callable[[str], BulusRepo] = open_repo,
+        limiter: BrainLimiter | None = None,
+        on_waiting: Callable[[str, dict], None] | None = None,
+        context: ContextWindow | None = None,
+    ):
+        self.brain = with_context(brain, context)
+        self.context = context
+        self.repo_factory = repo_factory
+        self.limiter = limiter or BrainLimiter()
+        self.on_waiting = on_waiting
+
+    async def _think(self, history: IceHistory) -> Action:
+        try:
+            return await self.limiter.run(self.brain(history))
+        except asyncio.TimeoutError:
+            return Action(tool_name="error", payload_str="{}", thought="LLM Timeout")
+
+    async def drive(self, session_id: str) -> dict:
+        """Продвигает сессию до ожидания пользователя; возвращает итоговый doc (metadata + хвост истории)."""
+        repo = self.repo_factory(session_id)
+        while True:
+            doc = await _offload(load_recent, repo, HOT_TAIL, self.context)
+            status = doc["metadata"].get("status", "need_brain")
+
+            if status == "need_runner":
+                with contextlib.suppress(ConflictError):
+                    await _offload(runner_step, repo, doc)
+            elif status == "need_brain":
+                with telemetry.span("engine.brain_step"), telemetry.collect_step() as timings:
+                    new_entries = await _offload(summarize_step, doc, self.context)
+                    action = await self._think(doc.get("history", []))
+                # Конфликт: история изменилась, пока мозг думал — перечитываем и думаем заново
+                with contextlib.suppress(ConflictError):
+                    await _offload(partial(record_pending_action, repo, doc, action, new_entries, timings=timings))
+            else:
+                if self.on_waiting:
+                    self.on_waiting(session_id, doc)
+                return doc
+
+    async def run(self, session_ids: Iterable[str]) -> Dict[str, dict]:
+        """Параллельно гонит все сессии до ожидания пользователя."""
+        session_ids = list(session_ids)
+        docs = await asyncio.gather(*(self.drive(sid) for sid in session_ids))
+        return dict(zip(session_ids, docs))
+
+    async def watch(self, subscription: AsyncSubscription):
+        """
+        Гонит сессии по уведомлениям AsyncioChannel (например, реплики, записанные
+        другими потоками): на need_brain/need_runner запускается drive(), если сессия
+        ещё не в работе. Уведомления о собственных записях drive() отсекаются по версии.
+        """
+        driving: Dict[str, asyncio.Task] = {}
+        versions: Dict[str, int] = {}
+
+        def finished(session_id: str, task: asyncio.Task):
+            driving.pop(session_id, None)
+            if not task.cancelled() and task.exception() is None:
+                versions[session_id] = task.result()["metadata"].get("version", 0)
+
+        async for change in subscription:
+            if change.status not in READY_STATUSES or change.session_id in driving:
+                continue
+            if change.version <= versions.get(change.session_id, -1):
+                continue
+            task = asyncio.create_task(self.drive(change.session_id))
+            driving[change.session_id] = task
+            task.add_done_callback(partial(finished, change.session_id))
+
+    async def post_user_message(self, session_id: str, text: str) -> dict:
+        """Реплика пользователя: пишет user_said и продвигает сессию дальше."""
+        repo = self.repo_factory(session_id)
+        await _offload(user_step, repo, None, text)
+        return await self.drive(session_id)
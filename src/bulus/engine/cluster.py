@@ -0,0 +1,364 @@
+import bisect
+import hashlib
+import multiprocessing
+import multiprocessing.connection
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable
+
+from bulus.brain.context import ContextWindow
+from bulus.brain.worker import stateless_brain
+from bulus.engine.loop import Brain, brain_step, load_recent, runner_step, user_step, with_context
+from bulus.engine.scheduler import READY_STATUSES
+from bulus.storage import open_repo, repository
+from bulus.storage.notify import Change
+from bulus.storage.repository import ConflictError, CorruptSessionError
+
+# Роль воркера по статусу сессии, который он обслуживает
+ROLES = {"need_brain": "brain", "need_runner": "runner"}
+
+# Сколько раз шаг сессии ставится заново после смерти воркера; дальше сессия — в errors
+STEP_RETRIES = 1
+
+
+def _hash(key: str) -> int:
+    # Не hash(): он рандомизирован в каждом процессе (PYTHONHASHSEED)
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Консистентное хеширование session_id на шарды 0..shards-1.
+
+    У каждого шарда `replicas` виртуальных точек на кольце: нагрузка
+    распределяется ровно, а при изменении числа шардов переезжает
+    только ~1/shards сессий.
+    """
+
+    def __init__(self, shards: int, replicas: int = 64):
+        if shards < 1:
+            raise ValueError("HashRing needs at least one shard")
+        self.shards = shards
+        points = sorted((_hash(f"shard-{shard}#{r}"), shard) for shard in range(shards) for r in range(replicas))
+        self._points = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, session_id: str) -> int:
+        i = bisect.bisect(self._points, _hash(session_id)) % len(self._points)
+        return self._owners[i]
+
+
+def _run_step(repo_factory, brain: Brain, context: ContextWindow | None, status: str, session_id: str):
+    """Один шаг сессии в воркере -> (session_id, новый статус, версия, ошибка)."""
+    try:
+        repo = repo_factory(session_id)
+        doc = load_recent(repo, context=context if status == "need_brain" else None)
+        # Статус мог измениться, пока пробуждение шло через брокер
+        if doc["metadata"].get("status") == status:
+            if status == "need_runner":
+                runner_step(repo, doc)
+            else:
+                brain_step(repo, doc, brain=brain, context=context)
+        return session_id, doc["metadata"].get("status"), doc["metadata"].get("version", 0), None
+    except ConflictError:
+        # Сессию изменили во время шага — шаг отброшен, брокер маршрутизирует по свежему статусу
+        try:
+            metadata = repo_factory(session_id).load_metadata()
+            return session_id, metadata.get("status"), metadata.get("version", 0), None
+        except Exception as e:
+            return session_id, None, None, repr(e)
+    except Exception as e:
+        return session_id, None, None, repr(e)
+
+
+def _worker_main(role: str, index: int, inbox, outbox, sessions_dir: str, backend, brain: Brain, context, threads: int):
+    """
+    Процесс-воркер: берёт пробуждения (status, session_id) из своей очереди,
+    делает шаги в пуле потоков и отчитывается брокеру в общую outbox.
+    """
+    # Остановкой управляет родитель (stop() шлёт None), Ctrl+C в группе процессов игнорируем
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    repository.SESSIONS_DIR = sessions_dir
+    repo_factory = partial(open_repo, backend=backend)
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"bulus-{role}-{index}") as pool:
+        while (job := inbox.get()) is not None:
+            status, session_id = job
+            future = pool.submit(_run_step, repo_factory, brain, context, status, session_id)
+            future.add_done_callback(lambda f: outbox.put(f.result()))
+
+
+class ShardedEngine:
+    """
+    Движок на нескольких процессах: N brain-воркеров и M runner-воркеров.
+
+    Сессия закреплена за шардом консистентным хешем session_id (своё кольцо
+    для каждой роли), так что её шаги всегда делает один и тот же процесс.
+    Брокер в родительском процессе носит пробуждения по multiprocessing-очередям
+    и держит не больше одного шага сессии в работе: два воркера никогда
+    не трогают одну сессию одновременно. Пришедшее во время шага пробуждение
+    откладывается до его конца, как в SessionScheduler.
+
+    `brain` должен пиклиться (функция уровня модуля или partial от неё):
+    воркеры стартуют через spawn. С `context` (ContextWindow) история
+    сворачивается в саммари, как в SessionScheduler.
+
+    Умерший воркер (OOM, segfault, os._exit в мозге) перезапускается, а его
+    шаги в работе ставятся заново: шаг перечитывает статус и коммитит с
+    expected_version, так что повтор безопасен. Сессия, на которой воркер
+    умер больше STEP_RETRIES раз подряд, попадает в errors и снимается с
+    работы — wait_idle() и `serve --until-idle` не зависают.
+
+    Сессии, шаг которых упал (исключение в мозге, битый файл), попадают в
+    `failed`: submit() их больше не будит, иначе каждый перескан повторял бы
+    ту же ошибку. Снимает отметку только новая запись сессии (on_change,
+    post_user_message).
+    """
+
+    def __init__(
+        self,
+        brain: Brain = stateless_brain,
+        backend: str | None = None,
+        brain_workers: int = 2,
+        runner_workers: int = 1,
+        brain_threads: int = 8,
+        runner_threads: int = 4,
+        on_waiting: Callable[[str, dict], None] | None = None,
+        context: ContextWindow | None = None,
+    ):
+        self.brain = with_context(brain, context)
+        self.context = context
+        self.backend = backend
+        self.brain_threads = brain_threads
+        self.runner_threads = runner_threads
+        self.on_waiting = on_waiting  # вызывается в родителе, когда сессия ждёт пользователя (status=still)
+        self.rings = {"brain": HashRing(brain_workers), "runner": HashRing(runner_workers)}
+        self.steps = {"brain": 0, "runner": 0}
+        self.errors: list = []
+        self.failed: set = set()  # session_id, чей шаг упал в этом запуске
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._outbox = self._ctx.Queue()
+        self._inboxes: Dict[str, list] = {}
+        self._workers: Dict[tuple, multiprocessing.process.BaseProcess] = {}  # (role, index) -> процесс
+        self._crashes: Dict[str, int] = {}  # session_id -> смертей воркера подряд на её шаге
+        self._stopping = threading.Event()
+        self._monitor: threading.Thread | None = None
+        self._inflight: Dict[str, str] = {}  # session_id -> статус шага в работе
+        self._rewake: Dict[str, str] = {}
+        # session_id -> последняя известная версия: уведомления о собственных шагах воркеров не будят повторно
+        self._versions: Dict[str, int] = {}
+        self._waiting_calls = 0  # on_waiting в работе: реплика из него ещё может разбудить сессию
+        self._cond = threading.Condition()
+        self._collector: threading.Thread | None = None
+        self._callbacks = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bulus-on-waiting")
+
+    # --- управление ---
+
+    def start(self):
+        self._sessions_dir = str(repository.SESSIONS_DIR)
+        for role in ("brain", "runner"):
+            self._inboxes[role] = [self._ctx.Queue() for _ in range(self.rings[role].shards)]
+            for index in range(self.rings[role].shards):
+                self._spawn(role, index).start()
+        self._collector = threading.Thread(target=self._collect_loop, name="bulus-broker", daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._monitor_loop, name="bulus-monitor", daemon=True)
+        self._monitor.start()
+
+    def _spawn(self, role: str, index: int):
+        """Процесс-воркер для (role, index) с его текущей очередью; запускает вызывающий."""
+        threads = self.brain_threads if role == "brain" else self.runner_threads
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                role,
+                index,
+                self._inboxes[role][index],
+                self._outbox,
+                self._sessions_dir,
+                self.backend,
+                self.brain,
+                self.context,
+                threads,
+            ),
+            name=f"bulus-{role}-{index}",
+            daemon=True,
+        )
+        self._workers[role, index] = process
+        return process
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping.set()
+        if self._monitor:
+            self._monitor.join()
+        for inboxes in self._inboxes.values():
+            for inbox in inboxes:
+                inbox.put(None)
+        for process in self._workers.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._collector:
+            self._outbox.put(None)
+            self._collector.join()
+        self._callbacks.shutdown(wait=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- входящие события ---
+
+    def shard_for(self, session_id: str, status: str) -> int:
+        """Номер воркера своей роли, который делает шаги `status` для сессии."""
+        return self.rings[ROLES[status]].shard_for(session_id)
+
+    def submit(self, session_ids: Iterable[str] | str) -> int:
+        """
+        Регистрирует сессии: читает статус и будит нужный воркер.
+        Сессии в работе пропускаются. Возвращает, сколько сессий разбужено.
+        """
+        if isinstance(session_ids, str):
+            session_ids = [session_ids]
+        woken = 0
+        for session_id in session_ids:
+            with self._cond:
+                if session_id in self._inflight or session_id in self.failed:
+                    continue
+            try:
+                metadata = open_repo(session_id, self.backend).load_metadata()
+            except CorruptSessionError as e:
+                with self._cond:
+                    self.failed.add(session_id)
+                self.errors.append((session_id, repr(e)))
+                continue
+            woken += self._route(session_id, metadata.get("status", "need_brain"))
+        return woken
+
+    def wake(self, session_id: str, status: str):
+        """Пробуждение: сессии есть работа со статусом `status`."""
+        with self._cond:
+            self._wake_locked(session_id, status)
+
+    def on_change(self, change: Change):
+        """Уведомление о записи сессии (bulus.storage.notify): будит воркер, если это не эхо уже известной версии."""
+        with self._cond:
+            if change.version <= self._versions.get(change.session_id, -1):
+                return
+            self._versions[change.session_id] = change.version
+            self.failed.discard(change.session_id)
+            if change.status in READY_STATUSES:
+                self._wake_locked(change.session_id, change.status)
+
+    def post_user_message(self, session_id: str, text: str):
+        """Реплика пользователя: пишет user_said и будит мозг для этой сессии."""
+        user_step(open_repo(session_id, self.backend), None, text)
+        with self._cond:
+            self.failed.discard(session_id)
+            self._wake_locked(session_id, "need_brain")
+
+    def inflight(self) -> int:
+        with self._cond:
+            return len(self._inflight)
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Ждёт, пока ни один шаг и ни один on_waiting не в работе (или пока не истечёт timeout)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._inflight and not self._waiting_calls, timeout=timeout)
+
+    # --- брокер ---
+
+    def _wake_locked(self, session_id: str, status: str):
+        if session_id in self._inflight:
+            self._rewake[session_id] = status
+            return
+        role = ROLES[status]
+        self._inflight[session_id] = status
+        self._inboxes[role][self.rings[role].shard_for(session_id)].put((status, session_id))
+
+    def _route(self, session_id: str, status: str) -> bool:
+        if status in READY_STATUSES:
+            self.wake(session_id, status)
+            return True
+        if status == "still" and self.on_waiting:
+            with self._cond:
+                self._notify_waiting_locked(session_id)
+        return False
+
+    def _notify_waiting_locked(self, session_id: str):
+        self._waiting_calls += 1
+        self._callbacks.submit(self._notify_waiting, session_id)
+
+    def _notify_waiting(self, session_id: str):
+        try:
+            self.on_waiting(session_id, open_repo(session_id, self.backend).load())
+        except Exception as e:
+            self.errors.append((session_id, e))
+        finally:
+            with self._cond:
+                self._waiting_calls -= 1
+                self._cond.notify_all()
+
+    def _monitor_loop(self):
+        """Ждёт смерти воркеров (sentinel процесса) и перезапускает их."""
+        while not self._stopping.is_set():
+            workers = dict(self._workers)
+            dead = multiprocessing.connection.wait([p.sentinel for p in workers.values()], timeout=0.5)
+            if self._stopping.is_set():
+                return
+            for (role, index), process in workers.items():
+                if process.sentinel in dead:
+                    process.join()
+                    self._restart_worker(role, index, process.exitcode)
+
+    def _restart_worker(self, role: str, index: int, exitcode: int | None):
+        """
+        Новый процесс с новой очередью (в старой могли остаться недочитанные пробуждения)
+        и повтор шагов, которые были в работе у умершего.
+        """
+        error = f"{role} worker {index} died (exit code {exitcode})"
+        with self._cond:
+            inbox = self._inboxes[role][index] = self._ctx.Queue()
+            for session_id, status in list(self._inflight.items()):
+                if ROLES[status] != role or self.rings[role].shard_for(session_id) != index:
+                    continue
+                self._crashes[session_id] = self._crashes.get(session_id, 0) + 1
+                if self._crashes[session_id] <= STEP_RETRIES:
+                    inbox.put((status, session_id))
+                    continue
+                del self._inflight[session_id]
+                self._rewake.pop(session_id, None)
+                self._crashes.pop(session_id)
+                self.failed.add(session_id)
+                self.errors.append((session_id, error))
+            process = self._spawn(role, index)
+            self._cond.notify_all()
+        process.start()
+
+    def _collect_loop(self):
+        while (report := self._outbox.get()) is not None:
+            session_id, next_status, version, error = report
+            if error is not None:
+                self.errors.append((session_id, error))
+            with self._cond:
+                if error is not None:
+                    self.failed.add(session_id)
+                if version is not None:
+                    self._versions[session_id] = max(version, self._versions.get(session_id, -1))
+                status = self._inflight.pop(session_id, None)
+                if status is not None:
+                    self.steps[ROLES[status]] += 1
+                    self._crashes.pop(session_id, None)
+                # Статус из отчёта мог устареть: шаг перепроверит его по хранилищу
+                next_status = self._rewake.pop(session_id, next_status)
+                # Перепостановка под той же блокировкой: wait_idle не увидит "дыры"
+                if next_status in READY_STATUSES:
+                    self._wake_locked(session_id, next_status)
+                elif next_status == "still" and self.on_waiting:
+                    self._notify_waiting_locked(session_id)
+                self._cond.notify_all()
@@ -0,0 +1,185 @@
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Iterable, List
+
+from bulus.brain.worker import stateless_brain
+from bulus.core.ledger import Ledger
+from bulus.core.schemas import IceEntry, IceHistory
+from bulus.core.states import AgentState
+from bulus.engine.loop import WAITING_STATES, Brain
+from bulus.runner.registry import ToolRegistry
+from bulus.runner.tools import registry
+from bulus.runner.worker import run_actions
+from bulus.storage import open_repo
+
+# Почему ветка остановилась
+WAITING, MAX_DEPTH, ERROR = "waiting", "max_depth", "error"
+
+
+@dataclass(frozen=True)
+class Variant:
+    """
+    Альтернатива в точке форка: Ice-запись, которая дописывается вместо
+    того, что случилось в оригинале (реплика юзера или результат тула).
+    state/storage по умолчанию берутся из кадра перед точкой форка.
+    """
+
+    label: str
+    tool: str
+    payload: Any
+    thought: str | None = None
+    state: str | None = None
+    storage: dict | None = None
+
+    @classmethod
+    def user_said(cls, text: str, label: str | None = None) -> "Variant":
+        return cls(label=label or text, tool="user_said", payload=text)
+
+    @classmethod
+    def tool_output(cls, tool: str, payload: Any, label: str | None = None, **overrides) -> "Variant":
+        return cls(label=label or f"{tool}:{payload}", tool=tool, payload=payload, **overrides)
+
+    def entry(self, frame: IceEntry | None) -> IceEntry:
+        state = frame[3] if frame is not None else AgentState.HELLO.value
+        storage = frame[4] if frame is not None else {}
+        return (
+            time.time(),
+            self.tool,
+            self.payload,
+            self.state if self.state is not None else state,
+            self.storage if self.storage is not None else storage,
+            self.thought,
+        )
+
+
+@dataclass
+class Branch:
+    variant: Variant
+    ledger: Ledger
+    fork_at: int
+    steps: int = 0
+    stop_reason: str = MAX_DEPTH
+    error: str | None = None
+
+    @property
+    def label(self) -> str:
+        return self.variant.label
+
+    def new_entries(self) -> List[IceEntry]:
+        """Записи ветки после точки форка (включая саму альтернативу)."""
+        return list(self.ledger.replay_from(self.fork_at))
+
+    def to_dict(self) -> dict:
+        return {
+            "label": self.label,
+            "steps": self.steps,
+            "stop_reason": self.stop_reason,
+            "error": self.error,
+            "final_state": self.ledger[-1][3],
+            "entries": self.new_entries(),
+        }
+
+
+@dataclass
+class BranchTree:
+    """
+    Результат исследования: общий префикс (root) и ветки от точки fork_at.
+    Каждая ветка — Ledger, который можно отдать во viewer
+    (show_bulus_trace(branch.ledger)) или форкнуть дальше.
+    """
+
+    root: Ledger
+    fork_at: int
+    branches: List[Branch] = field(default_factory=list)
+    session_id: str | None = None
+
+    def __getitem__(self, label: str) -> Branch:
+        for branch in self.branches:
+            if branch.label == label:
+                return branch
+        raise KeyError(label)
+
+    def to_dict(self) -> dict:
+        """JSON-совместимое дерево: префикс один раз, у веток — только их собственные записи."""
+        return {
+            "session_id": self.session_id,
+            "fork_at": self.fork_at,
+            "prefix": self.root[: self.fork_at],
+            "branches": [branch.to_dict() for branch in self.branches],
+        }
+
+
+class ForkExplorer:
+    """
+    Counterfactual-прогон: от точки форка сессии запускает по ветке на
+    каждую альтернативу и ведёт её stateless_brain + раннером, пока агент
+    не начнёт ждать юзера (WAITING_STATES) или не кончится `max_depth` шагов.
+
+    Ветки — Ledger.fork() общего префикса: O(1), без копирования истории.
+    Ветки независимы и идут параллельно на пуле потоков (вызовы мозга — I/O).
+    По умолчанию тулы исполняются в песочнице (registry.dry_run()): внешние
+    эффекты не срабатывают, state/storage меняют только PURE-тулы.
+    """
+
+    def __init__(
+        self,
+        brain: Brain = stateless_brain,
+        max_depth: int = 8,
+        tool_registry: ToolRegistry | None = None,
+        max_workers: int = 8,
+        executor: Executor | None = None,
+    ):
+        self.brain = brain
+        self.max_depth = max_depth
+        self.tool_registry = tool_registry or registry.dry_run()
+        self.max_workers = max_workers
+        self.executor = executor
+
+    def run_branch(self, branch: Branch) -> Branch:
+        """Продвигает одну ветку до ожидания юзера / max_depth / ошибки мозга."""
+        ledger = branch.ledger
+        try:
+            while branch.steps < self.max_depth:
+                action = self.brain(ledger)
+                ledger.extend(run_actions(ledger, action, self.tool_registry))
+                branch.steps += 1
+                if action.tool_name == "error":
+                    branch.stop_reason, branch.error = ERROR, action.thought
+                    return branch
+                if ledger[-1][3] in WAITING_STATES:
+                    branch.stop_reason = WAITING
+                    return branch
+            branch.stop_reason = MAX_DEPTH
+        except Exception as e:
+            branch.stop_reason, branch.error = ERROR, str(e)
+        return branch
+
+    def explore(self, history: IceHistory | Ledger, fork_at: int, variants: Iterable[Variant]) -> BranchTree:
+        """Форкает историю в точке `fork_at` (первые fork_at записей) и прогоняет все альтернативы."""
+        root = history if isinstance(history, Ledger) else Ledger(history)
+        if fork_at < 0:
+            fork_at += len(root)
+        frame = root[fork_at - 1] if fork_at > 0 else None
+
+        tree = BranchTree(root=root, fork_at=fork_at)
+        for variant in variants:
+            ledger = root.fork(fork_at)
+            ledger.append(variant.entry(frame))
+            tree.branches.append(Branch(variant=variant, ledger=ledger, fork_at=fork_at))
+
+        if self.executor is not None:
+            list(self.executor.map(self.run_branch, tree.branches))
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bulus-fork") as pool:
+                list(pool.map(self.run_branch, tree.branches))
+        return tree
+
+    def explore_session(
+        self, session_id: str, fork_at: int, variants: Iterable[Variant], backend: str | None = None
+    ) -> BranchTree:
+        """explore() для сохранённой сессии; сама сессия не меняется."""
+        history = open_repo(session_id, backend=backend).load()["history"]
+        tree = self.explore(history, fork_at, variants)
+        tree.session_id = session_id
+        return tree
@@ -1,57 +1,213 @@
-import json
+import functools
 import time
+from typing import Callable, Iterable
 
+from bulus import telemetry
+from bulus.brain.context import ContextWindow
 from bulus.brain.worker import stateless_brain
-from bulus.core.schemas import Action, IceEntry
-from bulus.core.states import AgentState
-from bulus.runner.worker import imperative_runner
+from bulus.core.schemas import Action, IceEntry, IceHistory
+from bulus.core.states import WAITING_STATES, AgentState
+from bulus.runner.worker import run_actions
+from bulus.storage import open_repo
 from bulus.storage.repository import BulusRepo
-
-WAITING_STATES = {
-    AgentState.ASK_NAME.value,
-    AgentState.ASK_AGE.value,
-    AgentState.ASK_OCCUPATION.value,
-}
-
-
-def run_session_loop(session_id: str):
+from bulus.storage.sidelog import DECISIONS, TIMINGS, SideLog
+
+# Сколько последних записей нужно шагам движка без ContextWindow:
+# мозг смотрит на окно PromptBuilder (15 записей), раннер — на последний кадр
+HOT_TAIL = 32
+
+Brain = Callable[[IceHistory], Action]
+
+
+def pending_to_action(pending_action: dict) -> Action:
+    """
+    Восстанавливает Action из metadata.pending_action. Пишется только payload_str
+    мозга: он парсится один раз, без json.dumps. Записи старых форматов хранят
+    распарсенный payload (иногда вместе с payload_str) — он берётся как есть.
+    """
+    tool_name = pending_action.get("tool_name", "error")
+    thought = pending_action.get("thought", "")
+    payload_str = pending_action.get("payload_str")
+    if payload_str is not None and "payload" not in pending_action:
+        return Action(tool_name=tool_name, payload_str=payload_str, thought=thought)
+    return Action.from_payload(tool_name, pending_action.get("payload", {}), thought, payload_str=payload_str)
+
+
+def load_recent(repo: BulusRepo, n: int = HOT_TAIL, context: ContextWindow | None = None) -> dict:
+    """
+    doc с metadata и только последними n записями истории — стоимость
+    не зависит от длины разговора. metadata читается первой: если между
+    чтениями сессию дописали, версия окажется старой и commit() шага
+    получит ConflictError, а не запишет решение по устаревшему хвосту.
+
+    С `context` хвост удлиняется до конца покрытого последним саммари
+    (ContextWindow.tail_needed); пока саммари нет — читается вся история.
+    """
+    with telemetry.span("storage.load"):
+        metadata = repo.load_metadata()
+        history = repo.load_tail(n)
+        # Хвост короче n — это уже вся история
+        while context is not None and len(history) == n:
+            needed = context.tail_needed(history)
+            if needed is not None and needed <= n:
+                break
+            # Саммари нет в хвосте — ищем дальше, расширяя окно геометрически
+            n = needed if needed is not None else n * 4
+            history = repo.load_tail(n)
+        return {"metadata": metadata, "history": history}
+
+
+def record_timings(session_id: str, entry: IceEntry, timings: dict):
+    """
+    Дописывает [ts записи, тайминги хода] в SideLog "timings" сессии;
+    вьюер сопоставляет их с записями Ice по ts.
+    """
+    SideLog(session_id, TIMINGS).append([entry[0], timings])
+
+
+def record_decision(session_id: str, entries: list, action: Action):
+    """
+    Дописывает [ts первой записи, число записей, tool_name, payload_str] решения
+    мозга в SideLog "decisions" сессии. ts первой записи — id решения: по нему
+    replay находит границы пакета и исходный payload мозга (раннер может
+    переписать payload записи, см. guard_transition).
+    """
+    SideLog(session_id, DECISIONS).append([entries[0][0], len(entries), action.tool_name, action.payload_str])
+
+
+def with_context(brain, context: ContextWindow | None):
+    """
+    Мозг, который рендерит промпт тем же ContextWindow, что сворачивает историю
+    в brain_step. brain должен принимать prompt_builder=, как stateless_brain.
+    """
+    return brain if context is None else functools.partial(brain, prompt_builder=context)
+
+
+def summarize_step(doc: dict, context: ContextWindow | None) -> list:
+    """Сворачивает старые записи в summary-запись (дописывается и в doc); возвращает новые записи Ice."""
+    if context is None:
+        return []
+    summary = context.maybe_summarize(doc["history"])
+    if summary is None:
+        return []
+    doc["history"].append(summary)
+    return [summary]
+
+
+def brain_step(
+    repo: BulusRepo, doc: dict, brain: Brain = stateless_brain, context: ContextWindow | None = None
+) -> Action:
+    """
+    BRAIN STEP — записывает pending_action, чтобы раннер применил.
+    С `context` старые записи сначала сворачиваются в summary-запись Ice
+    (мозг должен рендерить промпт тем же ContextWindow); doc должен быть
+    прочитан load_recent(..., context=context) или целиком.
+    """
+    with telemetry.span("engine.brain_step"), telemetry.collect_step() as timings:
+        new_entries = summarize_step(doc, context)
+        action = brain(doc.get("history", []))
+    record_pending_action(repo, doc, action, new_entries, timings=timings)
+    return action
+
+
+def record_pending_action(
+    repo: BulusRepo,
+    doc: dict,
+    action: Action,
+    new_entries: Iterable[IceEntry] = (),
+    timings: dict | None = None,
+):
+    """
+    Сохраняет решение мозга в metadata (и новые записи Ice, если есть) и передаёт ход раннеру.
+    `timings` шага мозга едут в pending_action, раннер допишет их к своим.
+    """
+    pending_action = {"tool_name": action.tool_name, "payload_str": action.payload_str, "thought": action.thought}
+    if timings:
+        pending_action["timings"] = timings
+    doc["metadata"]["pending_action"] = pending_action
+    doc["metadata"]["status"] = "need_runner"
+    # Если сессию изменили после чтения (например, пришла реплика юзера) — ConflictError,
+    # решение мозга по устаревшей истории не пишется
+    with telemetry.span("storage.commit"):
+        repo.commit(list(new_entries), doc["metadata"], expected_version=doc["metadata"].get("version"))
+
+
+def runner_step(repo: BulusRepo, doc: dict) -> IceEntry | None:
+    """
+    RUNNER STEP — применяет pending_action (одиночный или пакет) и выставляет still/need_brain.
+    Нужен только хвост истории: новые записи дописываются через repo.commit().
+    """
+    pending_action = doc["metadata"].get("pending_action")
+    if not pending_action:
+        doc["metadata"]["status"] = "need_brain"
+        repo.commit([], doc["metadata"], expected_version=doc["metadata"].get("version"))
+        return None
+
+    with telemetry.span("engine.runner_step"), telemetry.collect_step() as timings:
+        action = pending_to_action(pending_action)
+        new_entries = run_actions(doc["history"], action)
+    new_ice = new_entries[-1]
+
+    next_state = new_ice[3]
+    doc["metadata"]["pending_action"] = None
+    doc["metadata"]["status"] = "still" if next_state in WAITING_STATES else "need_brain"
+    with telemetry.span("storage.commit"):
+        repo.commit(new_entries, doc["metadata"], expected_version=doc["metadata"].get("version"))
+    doc["history"].extend(new_entries)
+    # Вне metadata: хот-пас (load_metadata/commit) не читает и не переписывает растущие журналы
+    record_decision(repo.session_id, new_entries, action)
+    if timings is not None:
+        record_timings(repo.session_id, new_ice, telemetry.merge_timings(pending_action.get("timings"), timings))
+    return new_ice
+
+
+def user_step(repo: BulusRepo, doc: dict | None, user_text: str) -> IceEntry:
+    """
+    Создаёт Ice событие от юзера (стейт/сторадж из последнего кадра) и будит мозг.
+    Без `doc` последний кадр читается через repo.load_head_state().
+    """
+    if doc is None:
+        state, storage = repo.load_head_state()
+    else:
+        ice = doc.get("history", [])
+        state = ice[-1][3] if ice else AgentState.HELLO.value
+        storage = ice[-1][4] if ice else {}
+
+    user_entry: IceEntry = (
+        time.time(),
+        "user_said",
+        user_text,  # Payload у user_said просто строка
+        state,
+        storage,
+        None,  # У юзера нет мыслей
+    )
+    with telemetry.span("storage.append"):
+        repo.append(user_entry, status="need_brain")
+    return user_entry
+
+
+def run_session_loop(session_id: str, context: ContextWindow | None = None):
+    """
+    Интерактивный цикл одной сессии. С `context` длинная история сворачивается
+    в саммари, а мозг видит окно по бюджету токенов (см. ContextWindow).
+    """
     print(f"🧊 Bulus Engine started for session: {session_id}")
-    repo = BulusRepo(session_id)
+    repo = open_repo(session_id)
+    brain = with_context(stateless_brain, context)
 
     while True:
-        # 1. Загрузка
-        doc = repo.load()
-        ice = doc.get("history", [])
-        status = doc.get("metadata", {}).get("status", "need_brain")
-        pending_action = doc.get("metadata", {}).get("pending_action")
+        # 1. Загрузка: metadata + хвост истории, а не вся сессия
+        doc = load_recent(repo, context=context)
+        status = doc["metadata"].get("status", "need_brain")
 
         # 0. RUNNER STEP (если мозг уже записал pending_action)
         if status == "need_runner":
-            if not pending_action:
-                doc["metadata"]["status"] = "need_brain"
-                repo.save(doc)
-                continue
-
-            action = Action(
-                tool_name=pending_action.get("tool_name", "error"),
-                payload_str=json.dumps(pending_action.get("payload", {}), ensure_ascii=False),
-                thought=pending_action.get("thought", ""),
-            )
-            new_ice = imperative_runner(ice, action)
-            doc["history"].append(new_ice)
-
-            next_state = new_ice[3]
-            doc["metadata"]["pending_action"] = None
-            doc["metadata"]["status"] = "still" if next_state in WAITING_STATES else "need_brain"
-            repo.save(doc)
-            time.sleep(0.1)
+            runner_step(repo, doc)
             continue
 
         # ЛОГИКА ОЖИДАНИЯ ЮЗЕРА:
         # если статус still — ждем пользователя; иначе даем ход мозгу.
-        wait_for_user = status == "still"
-
-        if wait_for_user:
+        if status == "still":
             try:
                 user_text = input("\nUSER > ")
             except KeyboardInterrupt:
@@ -60,38 +216,15 @@ def run_session_loop(session_id: str):
             if user_text.lower() in ["exit", "q"]:
                 break
 
-            # Создаем Ice событие от юзера
-            # Берем стейт/сторадж из последнего кадра
-            state = ice[-1][3]
-            storage = ice[-1][4]
-
-            user_entry: IceEntry = (
-                time.time(),
-                "user_said",
-                user_text,  # Payload у user_said просто строка
-                state,
-                storage,
-                None,  # У юзера нет мыслей
-            )
-            repo.append(user_entry, status="need_brain")
+            user_step(repo, doc, user_text)
             continue
 
-        # 2. BRAIN STEP — записываем pending_action, чтобы раннер применил
+        # 2. BRAIN STEP
         print("🧠 Thinking...")
-        action = stateless_brain(ice)
+        action = brain_step(repo, doc, brain=brain, context=context)
         print(f"   [Thought]: {action.thought}")
         print(f"   [Tool]:    {action.tool_name} | {action.payload}")
 
-        doc["metadata"]["pending_action"] = {
-            "tool_name": action.tool_name,
-            "payload": action.payload,
-            "thought": action.thought,
-        }
-        doc["metadata"]["status"] = "need_runner"
-        repo.save(doc)
-
-        time.sleep(0.5)
-
 
 if __name__ == "__main__":
     run_session_loop("demo_session")
@@ -0,0 +1,280 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from bulus.brain.worker import stateless_brain
+from bulus.core.schemas import BATCH_TOOL, Action, IceHistory
+from bulus.engine.loop import Brain
+from bulus.storage import discover_sessions, open_repo
+from bulus.storage.sidelog import DECISIONS, SideLog
+
+# Записи, которые пишет не мозг
+NON_BRAIN_TOOLS = {"user_said", "summary"}
+
+# Итог сравнения решения: совпало / другой тул / тот же тул с другим payload / мозг вернул ошибку
+MATCH, TOOL, PAYLOAD, ERROR = "match", "tool", "payload", "error"
+
+
+class HistoryPrefix(Sequence):
+    """Первые `end` записей истории без копирования (история, которую видел мозг на шаге)."""
+
+    def __init__(self, history: IceHistory, end: int):
+        self._history = history
+        self._end = end
+
+    def __len__(self) -> int:
+        return self._end
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._history[i] for i in range(*index.indices(self._end))]
+        if index < 0:
+            index += self._end
+        if not 0 <= index < self._end:
+            raise IndexError("HistoryPrefix index out of range")
+        return self._history[index]
+
+
+def _is_brain_entry(entry) -> bool:
+    return entry[1] not in NON_BRAIN_TOOLS and entry[5] is not None
+
+
+def recorded_decisions(history: IceHistory, decisions: list | None = None) -> Iterator[Tuple[int, Action]]:
+    """
+    Решения мозга: (индекс первой записи решения, Action).
+
+    `decisions` — строки SideLog "decisions" сессии (см. loop.record_decision): по ts
+    первой записи известны границы решения и исходный Action мозга, а не payload
+    записи, который раннер мог переписать. Решения, которых там нет (старые сессии,
+    потерянная при падении строка), восстанавливаются из Ice: подряд идущие записи с
+    одинаковым thought — один пакет (sub-actions наследуют thought пакета).
+    """
+    by_ts = {row[0]: row for row in decisions or ()}
+    i, total = 0, len(history)
+    while i < total:
+        entry = history[i]
+        row = by_ts.get(entry[0])
+        if row is not None:
+            _, count, tool_name, payload_str = row
+            yield i, Action(tool_name=tool_name, payload_str=payload_str, thought=entry[5] or "")
+            i += count
+            continue
+        if not _is_brain_entry(entry):
+            i += 1
+            continue
+        j = i + 1
+        while j < total and _is_brain_entry(history[j]) and history[j][5] == entry[5] and history[j][0] not in by_ts:
+            j += 1
+        if j - i == 1:
+            payload = entry[2]
+            tool_name = entry[1]
+        else:
+            tool_name = BATCH_TOOL
+            payload = {"actions": [{"tool_name": e[1], "payload": e[2]} for e in history[i:j]]}
+        yield i, Action(tool_name=tool_name, payload_str=json.dumps(payload, ensure_ascii=False), thought=entry[5])
+        i = j
+
+
+def _signature(action: Action) -> list:
+    """То, что сравнивается при replay: тулы и payload (thought не важен)."""
+    return [[a.tool_name, a.payload] for a in action.sub_actions()] or [[action.tool_name, action.payload]]
+
+
+def compare_actions(recorded: Action, replayed: Action) -> str:
+    if replayed.tool_name == "error" and recorded.tool_name != "error":
+        return ERROR
+    recorded_sig, replayed_sig = _signature(recorded), _signature(replayed)
+    if [t for t, _ in recorded_sig] != [t for t, _ in replayed_sig]:
+        return TOOL
+    if recorded_sig != replayed_sig:
+        return PAYLOAD
+    return MATCH
+
+
+@dataclass
+class ReplayReport:
+    """Агрегированный отчёт о расхождениях replay с записанными решениями."""
+
+    sessions: int = 0
+    decisions: int = 0
+    kinds: Counter = field(default_factory=Counter)
+    transitions: Counter = field(default_factory=Counter)  # "записанный тул -> новый тул"
+    by_session: Counter = field(default_factory=Counter)  # session_id -> число расхождений
+    samples: List[dict] = field(default_factory=list)
+    elapsed: float = 0.0
+    max_samples: int = 20
+
+    def add_session(self, session_id: str, results: List[dict]):
+        self.sessions += 1
+        for result in results:
+            self.decisions += 1
+            self.kinds[result["kind"]] += 1
+            if result["kind"] == MATCH:
+                continue
+            self.by_session[session_id] += 1
+            self.transitions[f"{result['recorded'][0]} -> {result['replayed'][0]}"] += 1
+            if len(self.samples) < self.max_samples:
+                self.samples.append({"session_id": session_id, **result})
+
+    @property
+    def divergences(self) -> int:
+        return self.decisions - self.kinds[MATCH]
+
+    def to_dict(self) -> dict:
+        minutes = self.elapsed / 60
+        return {
+            "sessions": self.sessions,
+            "decisions": self.decisions,
+            "matched": self.kinds[MATCH],
+            "match_rate": self.kinds[MATCH] / self.decisions if self.decisions else 1.0,
+            "divergences": {kind: self.kinds[kind] for kind in (TOOL, PAYLOAD, ERROR)},
+            "tool_transitions": dict(self.transitions.most_common()),
+            "top_sessions": dict(self.by_session.most_common(10)),
+            "samples": self.samples,
+            "elapsed_s": round(self.elapsed, 3),
+            "decisions_per_minute": round(self.decisions / minutes) if minutes else None,
+        }
+
+    def format(self) -> str:
+        data = self.to_dict()
+        lines = [
+            f"Sessions:   {data['sessions']}",
+            f"Decisions:  {data['decisions']} ({data['decisions_per_minute'] or '-'} / min)",
+            f"Matched:    {data['matched']} ({data['match_rate']:.1%})",
+            "Divergent:  " + ", ".join(f"{kind}={count}" for kind, count in data["divergences"].items()),
+        ]
+        for transition, count in list(data["tool_transitions"].items())[:10]:
+            lines.append(f"  {transition}: {count}")
+        return "\n".join(lines)
+
+
+class ReplayCheckpoint:
+    """
+    JSONL-файл с результатами завершённых сессий (одна строка на сессию).
+    При повторном запуске эти сессии не переигрываются, но входят в отчёт.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, List[dict]]:
+        done: Dict[str, List[dict]] = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # недописанная строка после падения
+                done[record["session_id"]] = record["results"]
+        return done
+
+    def record(self, session_id: str, results: List[dict]):
+        line = json.dumps({"session_id": session_id, "results": results}, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+
+
+class ReplayEngine:
+    """
+    Batch replay корпуса сессий: на каждом шаге мозга заново вызывает `brain`
+    с той историей, которую видел исходный мозг, и сравнивает новый Action
+    с записанным.
+
+    Решения независимы (вход — записанный префикс, а не новые действия),
+    поэтому вызовы мозга идут параллельно на пуле из `max_workers` потоков;
+    в работе одновременно не больше `max_workers * 4` решений, так что память
+    не растёт с размером корпуса. С `checkpoint` завершённые сессии
+    сохраняются и пропускаются при перезапуске.
+    """
+
+    def __init__(
+        self,
+        brain: Brain = stateless_brain,
+        max_workers: int = 16,
+        checkpoint: ReplayCheckpoint | None = None,
+        on_session: Callable[[str, List[dict]], None] | None = None,
+    ):
+        self.brain = brain
+        self.max_workers = max_workers
+        self.checkpoint = checkpoint
+        self.on_session = on_session
+
+    def _decide(self, history: IceHistory, index: int, recorded: Action) -> dict:
+        try:
+            replayed = self.brain(HistoryPrefix(history, index))
+        except Exception as e:
+            replayed = Action(tool_name="error", payload_str="{}", thought=f"Replay Error: {e}")
+        return {
+            "index": index,
+            "kind": compare_actions(recorded, replayed),
+            "recorded": [recorded.tool_name, recorded.payload],
+            "replayed": [replayed.tool_name, replayed.payload],
+        }
+
+    def run(self, sessions: Iterable[Tuple[str, str]] | None = None) -> ReplayReport:
+        """
+        Переигрывает сессии (пары session_id, backend; по умолчанию все из
+        SESSIONS_DIR) и возвращает агрегированный отчёт.
+        """
+        started = time.perf_counter()
+        report = ReplayReport()
+        done = self.checkpoint.load() if self.checkpoint else {}
+        sessions = discover_sessions().items() if sessions is None else sessions
+
+        # session_id -> {"left": int, "results": list}; трогается только из этого потока
+        pending: Dict[str, dict] = {}
+
+        def finish(session_id: str, results: List[dict]):
+            results.sort(key=lambda r: r["index"])
+            if self.checkpoint:
+                self.checkpoint.record(session_id, results)
+            if self.on_session:
+                self.on_session(session_id, results)
+            report.add_session(session_id, results)
+
+        def jobs():
+            for session_id, backend in sessions:
+                if session_id in done:
+                    report.add_session(session_id, done[session_id])
+                    continue
+                history = open_repo(session_id, backend=backend).load()["history"]
+                decisions = list(recorded_decisions(history, SideLog(session_id, DECISIONS).load()))
+                if not decisions:
+                    finish(session_id, [])
+                    continue
+                pending[session_id] = {"left": len(decisions), "results": []}
+                for index, recorded in decisions:
+                    yield session_id, history, index, recorded
+
+        window = self.max_workers * 4
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bulus-replay") as pool:
+            inflight: dict = {}
+            for session_id, history, index, recorded in jobs():
+                while len(inflight) >= window:
+                    self._collect(inflight, pending, finish, wait(inflight, return_when=FIRST_COMPLETED).done)
+                inflight[pool.submit(self._decide, history, index, recorded)] = session_id
+            self._collect(inflight, pending, finish, wait(inflight).done)
+
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    @staticmethod
+    def _collect(inflight: dict, pending: dict, finish, completed):
+        for future in completed:
+            session_id = inflight.pop(future)
+            state = pending[session_id]
+            state["results"].append(future.result())
+            state["left"] -= 1
+            if not state["left"]:
+                del pending[session_id]
+                finish(session_id, state["results"])
@@ -0,0 +1,198 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable
+
+from bulus.brain.context import ContextWindow
+from bulus.brain.worker import stateless_brain
+from bulus.engine.loop import Brain, brain_step, load_recent, runner_step, user_step, with_context
+from bulus.storage import open_repo
+from bulus.storage.repository import BulusRepo, ConflictError
+
+# Статусы, для которых у движка есть работа
+READY_STATUSES = ("need_runner", "need_brain")
+
+
+class SessionScheduler:
+    """
+    Движок для N сессий в одном процессе.
+
+    Сессии лежат в ready-очередях по статусу (need_brain / need_runner).
+    Диспетчер будится через Condition при появлении работы или освобождении
+    слота — без sleep-поллинга. Мозг ограничен `max_brain_concurrency`
+    параллельными вызовами; шаги раннера дешёвые и идут в отдельный пул.
+    Одна сессия никогда не обрабатывается двумя потоками одновременно.
+
+    С `context` (ContextWindow) шаг мозга сворачивает старые записи в саммари,
+    а мозг рендерит промпт тем же окном: он должен принимать prompt_builder=,
+    как stateless_brain.
+    """
+
+    def __init__(
+        self,
+        brain: Brain = stateless_brain,
+        repo_factory: Callable[[str], BulusRepo] = open_repo,
+        max_brain_concurrency: int = 8,
+        runner_workers: int = 4,
+        on_waiting: Callable[[str, dict], None] | None = None,
+        context: ContextWindow | None = None,
+    ):
+        self.brain = with_context(brain, context)
+        self.context = context
+        self.repo_factory = repo_factory
+        self.max_brain_concurrency = max_brain_concurrency
+        self.on_waiting = on_waiting  # вызывается, когда сессия ждёт пользователя (status=still)
+
+        self._queues: Dict[str, deque] = {status: deque() for status in READY_STATUSES}
+        self._queued: set = set()
+        self._inflight: set = set()
+        # Пробуждения, пришедшие во время шага сессии (например, реплика юзера из on_waiting):
+        # session_id -> статус; сессия ставится в очередь, когда шаг закончится
+        self._rewake: Dict[str, str] = {}
+        self._brain_slots = max_brain_concurrency
+        self._cond = threading.Condition()
+        self._running = False
+        self._dispatcher: threading.Thread | None = None
+        self._brain_pool = ThreadPoolExecutor(max_workers=max_brain_concurrency, thread_name_prefix="bulus-brain")
+        self._runner_pool = ThreadPoolExecutor(max_workers=runner_workers, thread_name_prefix="bulus-runner")
+        self.errors: list = []
+
+    # --- управление ---
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="bulus-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._dispatcher:
+            self._dispatcher.join()
+        self._brain_pool.shutdown(wait=True)
+        self._runner_pool.shutdown(wait=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- входящие события ---
+
+    def submit(self, session_ids: Iterable[str] | str):
+        """Регистрирует сессии: читает статус и ставит в нужную очередь."""
+        if isinstance(session_ids, str):
+            session_ids = [session_ids]
+        for session_id in session_ids:
+            doc = load_recent(self.repo_factory(session_id))
+            self._route(session_id, doc)
+
+    def post_user_message(self, session_id: str, text: str):
+        """Реплика пользователя: пишет user_said и будит мозг для этой сессии."""
+        repo = self.repo_factory(session_id)
+        user_step(repo, None, text)
+        self._enqueue(session_id, "need_brain")
+
+    def pending(self, status: str) -> int:
+        with self._cond:
+            return len(self._queues[status])
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Ждёт, пока очереди пусты и нет шагов в работе (или пока не истечёт timeout)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queued and not self._inflight, timeout=timeout)
+
+    # --- внутреннее ---
+
+    def _enqueue(self, session_id: str, status: str):
+        with self._cond:
+            self._enqueue_locked(session_id, status)
+
+    def _enqueue_locked(self, session_id: str, status: str):
+        if session_id in self._inflight:
+            self._rewake[session_id] = status
+            return
+        if session_id in self._queued:
+            return
+        self._queues[status].append(session_id)
+        self._queued.add(session_id)
+        self._cond.notify_all()
+
+    def _route(self, session_id: str, doc: dict):
+        status = doc["metadata"].get("status", "need_brain")
+        if status in self._queues:
+            self._enqueue(session_id, status)
+        elif status == "still" and self.on_waiting:
+            self.on_waiting(session_id, doc)
+
+    def _reload(self, session_id: str) -> dict | None:
+        try:
+            return load_recent(self.repo_factory(session_id))
+        except Exception as e:
+            self.errors.append((session_id, e))
+            return None
+
+    def _next_job(self):
+        # Раннер в приоритете: он дешёвый и разблокирует мозг
+        if self._queues["need_runner"]:
+            return "need_runner", self._queues["need_runner"].popleft()
+        if self._queues["need_brain"] and self._brain_slots > 0:
+            self._brain_slots -= 1
+            return "need_brain", self._queues["need_brain"].popleft()
+        return None
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                job = None
+                while self._running and (job := self._next_job()) is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                status, session_id = job
+                self._queued.discard(session_id)
+                self._inflight.add(session_id)
+            pool = self._runner_pool if status == "need_runner" else self._brain_pool
+            pool.submit(self._run_job, status, session_id)
+
+    def _run_job(self, status: str, session_id: str):
+        doc = None
+        try:
+            repo = self.repo_factory(session_id)
+            # metadata + хвост истории: стоимость шага не растёт с длиной разговора
+            doc = load_recent(repo, context=self.context if status == "need_brain" else None)
+            # Статус мог измениться, пока сессия стояла в очереди
+            if doc["metadata"].get("status") == status:
+                if status == "need_runner":
+                    runner_step(repo, doc)
+                else:
+                    brain_step(repo, doc, brain=self.brain, context=self.context)
+        except ConflictError:
+            # Сессию изменили во время шага — шаг отброшен, маршрутизируем по свежему статусу
+            doc = self._reload(session_id)
+        except Exception as e:
+            self.errors.append((session_id, e))
+            doc = None
+
+        next_status = doc["metadata"].get("status") if doc is not None else None
+        if next_status == "still" and self.on_waiting:
+            try:
+                self.on_waiting(session_id, doc)
+            except Exception as e:
+                self.errors.append((session_id, e))
+        with self._cond:
+            self._inflight.discard(session_id)
+            if status == "need_brain":
+                self._brain_slots += 1
+            # Статус doc мог устареть: шаг перепроверит его по хранилищу
+            next_status = self._rewake.pop(session_id, next_status)
+            # Перепостановка в очередь под той же блокировкой: wait_idle не увидит "дыры"
+            if next_status in self._queues:
+                self._enqueue_locked(session_id, next_status)
+            self._cond.notify_all()
@@ -0,0 +1,87 @@
+from dataclasses import dataclass, replace
+from enum import Enum
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+# handler(state, storage, payload, thought) -> (next_state, next_storage)
+ToolHandler = Callable[[str, dict, Any, str], Tuple[str, dict]]
+
+
+def _noop_handler(state: str, storage: dict, payload: Any, thought: str) -> Tuple[str, dict]:
+    return state, storage
+
+
+class SideEffect(str, Enum):
+    PURE = "pure"  # только вычисляет новый state/storage
+    IDEMPOTENT = "idempotent"  # внешний эффект, безопасно повторять
+    EXTERNAL = "external"  # внешний эффект, повтор заметен (сообщение юзеру, платёж, ...)
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    name: str
+    handler: ToolHandler
+    schema: str
+    effect: SideEffect
+    listed: bool = True  # показывать ли тул мозгу в промпте
+
+
+class ToolRegistry:
+    """
+    Реестр тулов: имя -> handler, схема для промпта и класс side effect.
+    Раннер диспатчит по dict за O(1), промпт берёт список тулов отсюда же,
+    поэтому их не нужно синхронизировать руками.
+    """
+
+    def __init__(self):
+        self._tools: Dict[str, ToolSpec] = {}
+        # Растёт при каждой регистрации — по нему инвалидируется кэш промпта
+        self.version = 0
+
+    def tool(self, name: str, schema: str = "", effect: SideEffect = SideEffect.EXTERNAL, listed: bool = True):
+        """Декоратор регистрации тула."""
+
+        def decorator(handler: ToolHandler) -> ToolHandler:
+            self.register(ToolSpec(name=name, handler=handler, schema=schema, effect=SideEffect(effect), listed=listed))
+            return handler
+
+        return decorator
+
+    def register(self, spec: ToolSpec):
+        self._tools[spec.name] = spec
+        self.version += 1
+
+    def unregister(self, name: str):
+        if self._tools.pop(name, None) is not None:
+            self.version += 1
+
+    def dry_run(self) -> "ToolRegistry":
+        """
+        Копия реестра для песочницы (replay, форки): тулы с внешними эффектами
+        не исполняются и не меняют state/storage, PURE-тулы работают как есть.
+        """
+        sandbox = ToolRegistry()
+        for spec in self._tools.values():
+            if spec.effect is not SideEffect.PURE:
+                spec = replace(spec, handler=_noop_handler)
+            sandbox.register(spec)
+        return sandbox
+
+    def get(self, name: str) -> ToolSpec | None:
+        return self._tools.get(name)
+
+    def schema(self) -> Dict[str, str]:
+        """Описание тулов для промпта (в порядке регистрации)."""
+        return {name: spec.schema for name, spec in self._tools.items() if spec.listed}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __iter__(self) -> Iterator[ToolSpec]:
+        return iter(list(self._tools.values()))
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+
+# Реестр по умолчанию; встроенные тулы регистрируются в bulus.runner.tools
+registry = ToolRegistry()
@@ -1,16 +1,22 @@
+from bulus.core.schemas import BATCH_TOOL
+from bulus.runner.registry import SideEffect, registry
+
+
 def apply_update(current_state: str, current_storage: dict, payload: dict):
     """
     Реализует логику PATCH для storage и смену стейта.
     """
     next_state = current_state
-    next_storage = current_storage.copy()
+    # Без патча памяти снапшот переиспользуется как есть (structural sharing)
+    next_storage = current_storage
 
     # 1. Смена стейта
     if "state" in payload and payload["state"]:
         next_state = payload["state"]
 
     # 2. Обновление памяти (Patch)
-    if "memory" in payload and isinstance(payload["memory"], dict):
+    if "memory" in payload and isinstance(payload["memory"], dict) and payload["memory"]:
+        next_storage = current_storage.copy()
         for k, v in payload["memory"].items():
             if v is None:
                 # Удаление ключа, если LLM прислала null
@@ -21,3 +27,50 @@ def apply_update(current_state: str, current_storage: dict, payload: dict):
                 next_storage[k] = v
 
     return next_state, next_storage
+
+
+# --- Встроенные тулы ---
+
+
+@registry.tool("send_message", schema="Send text to user. Args: {'text': str}", effect=SideEffect.EXTERNAL)
+def send_message(state: str, storage: dict, payload: dict, thought: str):
+    print(f" >>> [REAL MESSAGE SENT]: {payload.get('text')}")
+    return state, storage
+
+
+@registry.tool(
+    "update",
+    schema="""
+    Update context. Atomic operation.
+    Args (optional): 
+    {
+      'state': str,   # Transition to new FSM State
+      'memory': dict  # Data to MERGE. Set value to null to delete.
+    }
+    """,
+    effect=SideEffect.PURE,
+)
+def update(state: str, storage: dict, payload: dict, thought: str):
+    return apply_update(state, storage, payload)
+
+
+@registry.tool("test_ping", schema="Execute ping logic. Args: {'payload': str}", effect=SideEffect.IDEMPOTENT)
+def test_ping(state: str, storage: dict, payload: dict, thought: str):
+    print(" >>> PONG! 🏓 (Backend service triggered)")
+    return state, storage
+
+
+@registry.tool(
+    BATCH_TOOL,
+    schema="Run several independent tools in ONE step. Args: {'actions': [{'tool_name': str, 'payload': dict}]}",
+    effect=SideEffect.EXTERNAL,
+)
+def batch(state: str, storage: dict, payload: dict, thought: str):
+    # Пакет разворачивается раннером (bulus.runner.worker.run_actions), сам по себе не исполняется
+    raise ValueError("'batch' actions must be executed with run_actions()")
+
+
+@registry.tool("error", effect=SideEffect.PURE, listed=False)
+def error(state: str, storage: dict, payload: dict, thought: str):
+    print(f" >>> [ERROR]: {thought}")
+    return state, storage
@@ -1,14 +1,27 @@
 import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import List
 
-from bulus.core.schemas import Action, IceEntry, IceHistory
-from bulus.core.states import AgentState
-from bulus.runner.tools import apply_update
+from bulus import telemetry
+from bulus.core.compact import apply_delta, storage_delta
+from bulus.core.fsm import FSM
+from bulus.core.schemas import BATCH_TOOL, Action, IceEntry, IceHistory
+from bulus.core.states import AGENT_FSM, AgentState
+from bulus.runner.registry import SideEffect, ToolRegistry
+from bulus.runner.tools import registry  # реестр со встроенными тулами
 
 
-def imperative_runner(ice_history: IceHistory, action: Action) -> IceEntry:
+def imperative_runner(
+    ice_history: IceHistory, action: Action, tool_registry: ToolRegistry = registry, fsm: FSM = AGENT_FSM
+) -> IceEntry:
     """
     Исполняет Action, мутирует данные и возвращает НОВЫЙ IceEntry.
+    Пакет (tool_name="batch") исполняется через run_actions, возвращается его
+    последняя запись (итоговые state/storage); все записи пакета — в run_actions().
     """
+    if action.tool_name == BATCH_TOOL:
+        return run_actions(ice_history, action, tool_registry, fsm=fsm)[-1]
+
     # 1. Инит контекста из последнего кадра
     if not ice_history:
         current_state = AgentState.HELLO.value
@@ -18,6 +31,27 @@ def imperative_runner(ice_history: IceHistory, action: Action) -> IceEntry:
         current_state = last_ice[3]
         current_storage = last_ice[4]
 
+    return execute_action(current_state, current_storage, action, tool_registry, fsm)
+
+
+def guard_transition(fsm: FSM, current_state: str, next_state: str, next_storage: dict, payload):
+    """
+    Нелегальный по FSM переход не применяется: стейт остаётся прежним, а
+    ошибка пишется в payload записи (как у валидатора Action), чтобы мозг
+    увидел её в Ice. Изменения memory сохраняются.
+    """
+    error = fsm.check_transition(current_state, next_state, next_storage)
+    if error is None:
+        return next_state, payload
+    if isinstance(payload, dict):
+        payload = {**{k: v for k, v in payload.items() if k != "state"}, "error": error}
+    return current_state, payload
+
+
+def execute_action(
+    current_state: str, current_storage: dict, action: Action, tool_registry: ToolRegistry, fsm: FSM = AGENT_FSM
+) -> IceEntry:
+    """Исполняет один Action от заданного контекста (state, storage)."""
     tool = action.tool_name
     payload = action.payload
     thought = action.thought
@@ -26,18 +60,12 @@ def imperative_runner(ice_history: IceHistory, action: Action) -> IceEntry:
     next_state = current_state
     next_storage = current_storage
 
-    # 2. Роутинг
-    if tool == "update":
-        next_state, next_storage = apply_update(current_state, current_storage, payload)
-
-    elif tool == "send_message":
-        print(f" >>> [REAL MESSAGE SENT]: {payload.get('text')}")
-
-    elif tool == "test_ping":
-        print(" >>> PONG! 🏓 (Backend service triggered)")
-
-    elif tool == "error":
-        print(f" >>> [ERROR]: {thought}")
+    # 2. Роутинг через реестр тулов (неизвестный тул — no-op)
+    spec = tool_registry.get(tool)
+    if spec is not None:
+        with telemetry.span("runner.tool", tool=tool):
+            next_state, next_storage = spec.handler(current_state, current_storage, payload, thought)
+        next_state, payload = guard_transition(fsm, current_state, next_state, next_storage, payload)
 
     # 3. Сборка нового Ice
     new_entry = (
@@ -50,3 +78,74 @@ def imperative_runner(ice_history: IceHistory, action: Action) -> IceEntry:
     )
 
     return new_entry
+
+
+def run_actions(
+    ice_history: IceHistory,
+    action: Action,
+    tool_registry: ToolRegistry = registry,
+    executor: Executor | None = None,
+    max_workers: int = 8,
+    fsm: FSM = AGENT_FSM,
+) -> List[IceEntry]:
+    """
+    Исполняет Action или пакет (tool_name="batch") и возвращает новые IceEntry по порядку.
+
+    PURE-тулы (update и т.п.) меняют контекст и идут строго последовательно.
+    EXTERNAL-тулы (send_message и т.п.) тоже: порядок их эффектов заметен
+    снаружи — сообщения должны уйти юзеру в порядке пакета.
+    Подряд идущие IDEMPOTENT-тулы независимы: они исполняются параллельно
+    на пуле потоков от одного и того же контекста, а их изменения storage
+    сливаются в порядке пакета — результат детерминирован.
+    """
+    if not ice_history:
+        state, storage = AgentState.HELLO.value, {}
+    else:
+        state, storage = ice_history[-1][3], ice_history[-1][4]
+
+    actions = action.sub_actions()
+    if not actions:
+        # Пустой/невалидный пакет фиксируем в Ice как есть
+        return [(time.time(), action.tool_name, action.payload, state, storage, action.thought)]
+
+    def is_concurrent(a: Action) -> bool:
+        spec = tool_registry.get(a.tool_name)
+        return spec is not None and spec.effect is SideEffect.IDEMPOTENT
+
+    with telemetry.span("runner.dispatch", tool=action.tool_name, actions=len(actions)):
+        entries: List[IceEntry] = []
+        own_pool = None
+        try:
+            i = 0
+            while i < len(actions):
+                group = [actions[i]]
+                if is_concurrent(actions[i]):
+                    while i + len(group) < len(actions) and is_concurrent(actions[i + len(group)]):
+                        group.append(actions[i + len(group)])
+
+                if len(group) == 1:
+                    entry = execute_action(state, storage, group[0], tool_registry, fsm)
+                    state, storage = entry[3], entry[4]
+                    entries.append(entry)
+                else:
+                    if executor is None and own_pool is None:
+                        own_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bulus-tool")
+                    pool = executor or own_pool
+                    with telemetry.span("runner.tool_group", size=len(group)):
+                        futures = [
+                            pool.submit(tool_registry.get(a.tool_name).handler, state, storage, a.payload, a.thought)
+                            for a in group
+                        ]
+                        results = [future.result() for future in futures]
+                    base_state, base_storage = state, storage
+                    for a, (result_state, result_storage) in zip(group, results):
+                        storage = apply_delta(storage, storage_delta(base_storage, result_storage))
+                        payload = a.payload
+                        if result_state != base_state:
+                            state, payload = guard_transition(fsm, state, result_state, storage, payload)
+                        entries.append((time.time(), a.tool_name, payload, state, storage, a.thought))
+                i += len(group)
+        finally:
+            if own_pool is not None:
+                own_pool.shutdown(wait=False)
+        return entries
@@ -0,0 +1,67 @@
+import os
+from typing import Dict
+
+from bulus.config import NOTIFY_CHANNEL, STORAGE_BACKEND
+from bulus.storage import notify, repository
+from bulus.storage.binary_repository import BINARY_SUFFIX, BinaryBulusRepo
+from bulus.storage.log_repository import LogBulusRepo
+from bulus.storage.repository import LOCK_SUFFIX, BulusRepo
+from bulus.storage.sqlite_repository import DB_FILE, SqliteBulusRepo, SqliteStore
+
+BACKENDS = {
+    "json": BulusRepo,
+    "log": LogBulusRepo,
+    "sqlite": SqliteBulusRepo,
+    "binary": BinaryBulusRepo,
+}
+
+if NOTIFY_CHANNEL == "socket":
+    notify.add_channel(notify.SocketChannel())
+
+
+def open_repo(session_id: str, backend: str | None = None) -> BulusRepo:
+    """Создаёт репозиторий сессии для выбранного бэкенда (по умолчанию из BULUS_STORAGE_BACKEND)."""
+    name = backend or STORAGE_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}'. Available: {sorted(BACKENDS)}")
+    return BACKENDS[name](session_id)
+
+
+# Если сессия лежит в нескольких форматах, берём более новый: .json остаётся после миграции
+_BACKEND_PRIORITY = {"json": 0, "log": 1, "binary": 1, "sqlite": 2}
+
+
+def discover_sessions(directory: str | None = None) -> Dict[str, str]:
+    """Все сессии в каталоге (по умолчанию SESSIONS_DIR): session_id -> имя бэкенда."""
+    directory = str(directory or repository.SESSIONS_DIR)
+    found: Dict[str, str] = {}
+
+    def add(session_id: str, backend: str):
+        current = found.get(session_id)
+        if current is None or _BACKEND_PRIORITY[backend] > _BACKEND_PRIORITY[current]:
+            found[session_id] = backend
+
+    if not os.path.isdir(directory):
+        return found
+    for name in sorted(os.listdir(directory)):
+        # Временные файлы атомарной записи и .lock-файлы блокировок — не сессии
+        if ".tmp-" in name or ".old-" in name or name.endswith(LOCK_SUFFIX):
+            continue
+        path = os.path.join(directory, name)
+        stem, ext = os.path.splitext(name)
+        if ext in (".json", ".jsonl") and os.path.isfile(path):
+            add(stem, "json")
+        elif ext == ".log" and os.path.isdir(path):
+            add(stem, "log")
+        elif ext == BINARY_SUFFIX and os.path.isfile(path):
+            add(stem, "binary")
+
+    db_path = os.path.join(directory, DB_FILE)
+    if os.path.exists(db_path):
+        store = SqliteStore(db_path)
+        try:
+            for session_id in store.session_ids():
+                add(session_id, "sqlite")
+        finally:
+            store.close()
+    return dict(sorted(found.items()))
@@ -0,0 +1,213 @@
+import json
+import mmap
+import struct
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import BinaryIO, Iterable, List
+
+from bulus.core.schemas import IceEntry
+
+# Формат файла сессии (.bulus), все числа little-endian:
+#
+#   MAGIC
+#   record*          u32 длина тела + тело (RECORD + tool + state + [payload, thought] JSON + storage JSON?)
+#   metadata         JSON
+#   index            на каждую запись (offset записи, offset записи со снапшотом storage)
+#   FOOTER           (offset metadata, offset index, число записей, MAGIC)
+#
+# Снапшот storage пишется только когда он меняется; остальные записи
+# ссылаются на него через index, поэтому запись n читается за O(1)
+# без декодирования соседних.
+MAGIC = b"BULUSB1\n"
+LENGTH = struct.Struct("<I")
+RECORD = struct.Struct("<dBHHII")  # ts, flags, len(tool), len(state), len(data), len(storage)
+INDEX_ITEM = struct.Struct("<QQ")
+FOOTER = struct.Struct("<QQQ8s")
+
+OWN_STORAGE = 0x01
+
+
+class BinaryFormatError(ValueError):
+    """Файл не похож на .bulus или обрезан."""
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_record(entry: IceEntry, storage_blob: bytes | None) -> bytes:
+    """Кодирует одну Ice-запись; storage_blob=None — storage как у предыдущей записи."""
+    ts, tool, payload, state, _, thought = entry
+    tool_b = str(tool).encode("utf-8")
+    state_b = str(state).encode("utf-8")
+    data_b = _dumps([payload, thought])
+    flags = OWN_STORAGE if storage_blob is not None else 0
+    storage_b = storage_blob or b""
+    header = RECORD.pack(float(ts), flags, len(tool_b), len(state_b), len(data_b), len(storage_b))
+    body = b"".join((header, tool_b, state_b, data_b, storage_b))
+    return LENGTH.pack(len(body)) + body
+
+
+def write_session(f: BinaryIO, metadata: dict, entries: Iterable[IceEntry], base: "BinaryIce | None" = None) -> int:
+    """
+    Пишет сессию в открытый бинарный файл. С `base` записи и index старого
+    файла копируются как есть (без декодирования), кодируются только `entries`.
+    Возвращает число записей.
+    """
+    f.write(MAGIC)
+    offset = len(MAGIC)
+    index = bytearray()
+    prev_storage = None
+    storage_offset = 0
+    if base is not None and len(base):
+        with memoryview(base.buf) as view:
+            f.write(view[len(MAGIC) : base.records_end])
+            index += view[base.index_offset : base.index_offset + len(base) * INDEX_ITEM.size]
+        offset = base.records_end
+        storage_offset = base.storage_offset(len(base) - 1)
+        prev_storage = base.storage_at(len(base) - 1)
+
+    count = len(base) if base is not None else 0
+    for entry in entries:
+        storage = entry[4]
+        own = prev_storage is None or (storage is not prev_storage and storage != prev_storage)
+        if own:
+            storage_offset = offset
+            prev_storage = storage
+        record = encode_record(entry, _dumps(storage) if own else None)
+        f.write(record)
+        index += INDEX_ITEM.pack(offset, storage_offset)
+        offset += len(record)
+        count += 1
+
+    meta_b = _dumps(metadata)
+    f.write(meta_b)
+    f.write(index)
+    f.write(FOOTER.pack(offset, offset + len(meta_b), count, MAGIC))
+    return count
+
+
+class BinaryIce(Sequence):
+    """
+    Ленивое read-only представление .bulus файла (обычно поверх mmap).
+
+    Записи декодируются только при доступе: len(), history[-1] и
+    tail(k) не трогают остальную историю. Снапшоты storage кэшируются
+    по offset, так что записи с общим storage получают один и тот же dict.
+    """
+
+    def __init__(self, buf, cache_size: int = 64):
+        if len(buf) < len(MAGIC) + FOOTER.size or buf[: len(MAGIC)] != MAGIC:
+            raise BinaryFormatError("Not a bulus binary session")
+        meta_offset, index_offset, count, magic = FOOTER.unpack_from(buf, len(buf) - FOOTER.size)
+        if magic != MAGIC or index_offset + count * INDEX_ITEM.size != len(buf) - FOOTER.size:
+            raise BinaryFormatError("Corrupt bulus binary session footer")
+        self.buf = buf
+        self.records_end = meta_offset
+        self.index_offset = index_offset
+        self._count = count
+        self._metadata_raw = buf[meta_offset:index_offset]
+        self._storages: OrderedDict = OrderedDict()
+        self._cache_size = cache_size
+
+    @classmethod
+    def open(cls, path: str) -> "BinaryIce":
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buf)
+
+    @property
+    def metadata(self) -> dict:
+        # Каждый раз новый dict: вызывающий код его мутирует
+        return json.loads(self._metadata_raw)
+
+    # --- Sequence API ---
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            if step == 1:
+                return self._decode_range(start, stop)
+            return [self._decode(i) for i in range(start, stop, step)]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("BinaryIce index out of range")
+        return self._decode(index)
+
+    def __iter__(self):
+        return iter(self._decode_range(0, self._count))
+
+    def tail(self, k: int) -> List[IceEntry]:
+        """Последние k записей (декодируются только они)."""
+        return self[max(self._count - k, 0) :] if k > 0 else []
+
+    # --- декодирование ---
+
+    def _offsets(self, index: int) -> tuple:
+        return INDEX_ITEM.unpack_from(self.buf, self.index_offset + index * INDEX_ITEM.size)
+
+    def storage_offset(self, index: int) -> int:
+        return self._offsets(index)[1]
+
+    def storage_at(self, index: int) -> dict:
+        return self._storage(self.storage_offset(index))
+
+    def _storage_blob(self, offset: int) -> bytes:
+        _, _, tool_len, state_len, data_len, storage_len = RECORD.unpack_from(self.buf, offset + LENGTH.size)
+        start = offset + LENGTH.size + RECORD.size + tool_len + state_len + data_len
+        return self.buf[start : start + storage_len]
+
+    def _storage(self, offset: int) -> dict:
+        storage = self._storages.get(offset)
+        if storage is not None:
+            self._storages.move_to_end(offset)
+            return storage
+        storage = json.loads(self._storage_blob(offset))
+        self._storages[offset] = storage
+        if len(self._storages) > self._cache_size:
+            self._storages.popitem(last=False)
+        return storage
+
+    def _decode(self, index: int) -> IceEntry:
+        offset, storage_offset = self._offsets(index)
+        ts, _, tool_len, state_len, data_len, _ = RECORD.unpack_from(self.buf, offset + LENGTH.size)
+        pos = offset + LENGTH.size + RECORD.size
+        tool = self.buf[pos : pos + tool_len].decode("utf-8")
+        pos += tool_len
+        state = self.buf[pos : pos + state_len].decode("utf-8")
+        pos += state_len
+        payload, thought = json.loads(self.buf[pos : pos + data_len])
+        return (ts, tool, payload, state, self._storage(storage_offset), thought)
+
+    def _decode_range(self, start: int, stop: int) -> List[IceEntry]:
+        """Декодирует записи [start, stop) пачкой: один json.loads на все payload и один на все снапшоты."""
+        if start >= stop:
+            return []
+        buf = self.buf
+        names: dict = {}  # bytes -> str: tool/state повторяются, декодируем один раз
+        heads, blobs, storage_offsets = [], [], {}
+        index = buf[self.index_offset + start * INDEX_ITEM.size : self.index_offset + stop * INDEX_ITEM.size]
+        for offset, storage_offset in INDEX_ITEM.iter_unpack(index):
+            ts, _, tool_len, state_len, data_len, _ = RECORD.unpack_from(buf, offset + LENGTH.size)
+            pos = offset + LENGTH.size + RECORD.size
+            tool_b = buf[pos : pos + tool_len]
+            state_b = buf[pos + tool_len : pos + tool_len + state_len]
+            pos += tool_len + state_len
+            blobs.append(buf[pos : pos + data_len])
+            tool = names.get(tool_b) or names.setdefault(tool_b, tool_b.decode("utf-8"))
+            state = names.get(state_b) or names.setdefault(state_b, state_b.decode("utf-8"))
+            heads.append((ts, tool, state, storage_offset))
+            storage_offsets.setdefault(storage_offset, None)
+
+        datas = json.loads(b"[" + b",".join(blobs) + b"]")
+        offsets = list(storage_offsets)
+        storages = json.loads(b"[" + b",".join(self._storage_blob(o) for o in offsets) + b"]")
+        by_offset = dict(zip(offsets, storages))
+        return [
+            (ts, tool, data[0], state, by_offset[storage_offset], data[1])
+            for (ts, tool, state, storage_offset), data in zip(heads, datas)
+        ]
@@ -0,0 +1,145 @@
+import os
+import threading
+
+from bulus.core.schemas import IceEntry
+from bulus.storage.binary_format import BinaryFormatError, BinaryIce, write_session
+from bulus.storage.repository import BulusRepo, CorruptSessionError, atomic_open, atomic_write_json, same_entry
+
+BINARY_SUFFIX = ".bulus"
+
+
+class BinaryBulusRepo(BulusRepo):
+    """
+    Сессия в компактном бинарном формате (.bulus, см. binary_format).
+
+    Файл читается через mmap: load_tail(k) и entry(n) декодируют только
+    нужные записи. save() копирует уже записанные записи байтами и
+    кодирует лишь новые. JSON остаётся форматом обмена: export_json()
+    пишет обычный .json, а если .bulus ещё нет — сессия читается из .json/.jsonl.
+    """
+
+    def __init__(self, session_id: str, **kwargs):
+        super().__init__(session_id, **kwargs)
+        self.bin_path = f"{self.file_path[: -len('.json')]}{BINARY_SUFFIX}"
+        self._ice: tuple | None = None  # (inode, mtime_ns, size) -> открытый BinaryIce
+        self._ice_lock = threading.Lock()
+
+    def ice(self) -> BinaryIce | None:
+        """Ленивая история поверх mmap (None — бинарного файла ещё нет); переоткрывается при смене файла."""
+        try:
+            st = os.stat(self.bin_path)
+        except FileNotFoundError:
+            return None
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._ice_lock:
+            if self._ice is not None and self._ice[0] == signature:
+                return self._ice[1]
+            try:
+                ice = BinaryIce.open(self.bin_path)
+            except (BinaryFormatError, ValueError) as e:
+                raise CorruptSessionError(f"Session file {self.bin_path} is corrupt: {e}") from e
+            self._ice = (signature, ice)
+            return ice
+
+    # --- чтение ---
+
+    def load(self) -> dict:
+        ice = self.ice()
+        if ice is None:
+            return super().load()
+        return self._normalize_doc({"metadata": ice.metadata, "history": list(ice)})
+
+    def load_metadata(self) -> dict:
+        """metadata из хвоста файла — записи истории не декодируются."""
+        ice = self.ice()
+        if ice is None:
+            return super().load_metadata()
+        return self._normalize_doc({"metadata": ice.metadata, "history": []})["metadata"]
+
+    def load_tail(self, k: int) -> list:
+        """Последние k записей истории."""
+        ice = self.ice()
+        if ice is None:
+            return super().load_tail(k)
+        return ice.tail(k)
+
+    def entry(self, n: int) -> IceEntry:
+        """Запись n (поддерживаются отрицательные индексы) без чтения остальной истории."""
+        ice = self.ice()
+        if ice is None:
+            return super().load()["history"][n]
+        return ice[n]
+
+    def export_json(self, path: str | None = None) -> str:
+        """Экспорт в обычный JSON-формат BulusRepo; по умолчанию рядом, в <session_id>.json."""
+        path = path or self.file_path
+        atomic_write_json(path, self.load(), fsync=False, indent=2)
+        return path
+
+    # --- запись ---
+
+    def _stored_version(self) -> int:
+        ice = self.ice()
+        if ice is None:
+            return super()._stored_version()
+        return ice.metadata.get("version", 0)
+
+    def _write_doc(self, doc: dict):
+        """
+        Ice append-only: если история только выросла, старые записи копируются байтами.
+        Последняя записанная запись сверяется с doc: отмотанная и дописанная заново
+        история переписывается целиком, а не приклеивается к старому префиксу.
+        """
+        history = doc.get("history", [])
+        base = self.ice()
+        if base is not None and _extends(base, history):
+            self._write(doc.get("metadata", {}), history[len(base) :], base)
+        else:
+            self._write(doc.get("metadata", {}), history, None)
+
+    def _commit(self, entries: list, metadata: dict):
+        base = self.ice()
+        if base is None:
+            super()._commit(entries, metadata)  # миграция из .json/.jsonl
+            return
+        self._write(metadata, entries, base)
+
+    def append(self, entry: IceEntry, status: str | None = None):
+        """Дописывает запись без декодирования существующей истории."""
+        with self._locked():
+            base = self.ice()
+            if base is None:
+                # Миграция из .json/.jsonl: пишем всю историю
+                doc = self.load()
+                doc["history"].append(entry)
+                metadata, new_entries = doc["metadata"], doc["history"]
+            else:
+                metadata, new_entries = base.metadata, [entry]
+            if status:
+                metadata["status"] = status
+            metadata["version"] = metadata.get("version", 0) + 1
+            self._write(metadata, new_entries, base)
+
+    def update_status(self, status: str):
+        with self._locked():
+            base = self.ice()
+            doc = self.load() if base is None else None
+            metadata = doc["metadata"] if doc is not None else base.metadata
+            metadata["status"] = status
+            metadata["version"] = metadata.get("version", 0) + 1
+            self._write(metadata, doc["history"] if doc is not None else [], base)
+
+    def _write(self, metadata: dict, new_entries: list, base: BinaryIce | None):
+        os.makedirs(os.path.dirname(self.bin_path), exist_ok=True)
+        with atomic_open(self.bin_path, "wb", fsync=self.committer is None) as f:
+            write_session(f, metadata, new_entries, base)
+        if self.committer is not None:
+            self.committer.add(self.bin_path)
+        self._changed = metadata
+
+
+def _extends(base: BinaryIce, history: list) -> bool:
+    """Продолжает ли `history` записанную историю (сверяется последняя записанная запись)."""
+    if len(history) < len(base):
+        return False
+    return not len(base) or same_entry(base[-1], history[len(base) - 1])
@@ -0,0 +1,371 @@
+import contextlib
+import json
+import os
+import shutil
+from collections import deque
+
+from bulus import telemetry
+from bulus.core.schemas import IceEntry
+from bulus.storage.group_commit import fsync_dir
+from bulus.storage.repository import BulusRepo, atomic_write_json, same_entry
+
+META_FILE = "meta.json"
+SEGMENT_SUFFIX = ".jsonl"
+# Папки поколений лога внутри <id>.log/: компакция пишет новое поколение рядом
+GENERATION_PREFIX = "gen-"
+
+
+class LogBulusRepo(BulusRepo):
+    """
+    Append-only хранилище: Ice history пишется строками в сегменты,
+    metadata — отдельной маленькой записью (meta.json).
+
+    meta.json — это commit-запись: в ней список сегментов, длина истории
+    и закоммиченный размер активного сегмента. Всё, что дописано в сегмент
+    после этого размера (обрыв записи), игнорируется при чтении и
+    отрезается при следующем append.
+
+    Сегменты лежат в папке поколения (<id>.log/gen-<n>/, номер — в meta.json
+    как "generation"); у логов прежнего формата без "generation" — прямо в <id>.log/.
+    """
+
+    def __init__(self, session_id: str, segment_max_bytes: int = 4 * 1024 * 1024, fsync_every: int = 16):
+        super().__init__(session_id)
+        self.log_dir = f"{self.file_path[: -len('.json')]}.log"
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_every = max(1, fsync_every)
+        self._unsynced = 0
+        # (version, length, active_bytes) -> последние прочитанные записи
+        self._tail_cache: tuple | None = None
+        if not os.path.isdir(self.log_dir):
+            self._recover_swap()
+
+    # --- служебное ---
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.log_dir, META_FILE)
+
+    def _data_dir(self, meta: dict) -> str:
+        generation = meta.get("generation")
+        return os.path.join(self.log_dir, f"{GENERATION_PREFIX}{generation}") if generation else self.log_dir
+
+    def _segment_path(self, meta: dict, name: str) -> str:
+        return os.path.join(self._data_dir(meta), name)
+
+    @staticmethod
+    def _segment_name(index: int) -> str:
+        return f"{index:06d}{SEGMENT_SUFFIX}"
+
+    @staticmethod
+    def _encode(entry) -> bytes:
+        return (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def _read_meta(self) -> dict | None:
+        try:
+            with open(self._meta_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_meta(self, meta: dict, fsync: bool):
+        """Атомарно заменяет meta.json (уникальный tmp + os.replace, как у BulusRepo)."""
+        atomic_write_json(self._meta_path(), meta, fsync=fsync, separators=(",", ":"))
+
+    def _iter_segment(self, meta: dict, name: str, limit: int | None):
+        """Читает записи сегмента до закоммиченного размера `limit` (None — весь файл)."""
+        try:
+            with open(self._segment_path(meta, name), "rb") as f:
+                data = f.read() if limit is None else f.read(limit)
+        except FileNotFoundError:
+            return
+        for line in data.splitlines():
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def _tail_segment(self, meta: dict, name: str, limit: int | None, k: int) -> list:
+        """Последние k записей сегмента: файл читается с конца блоками, а не целиком."""
+        try:
+            with open(self._segment_path(meta, name), "rb") as f:
+                pos = limit if limit is not None else f.seek(0, os.SEEK_END)
+                data = b""
+                block = 64 * 1024
+                while pos > 0 and data.count(b"\n") <= k:
+                    step = min(block, pos)
+                    pos -= step
+                    f.seek(pos)
+                    data = f.read(step) + data
+                    block *= 2
+        except FileNotFoundError:
+            return []
+        lines = data.splitlines()
+        if pos > 0:
+            lines = lines[1:]  # первая строка блока может быть неполной
+        entries = []
+        for line in lines:
+            if line.strip():
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries[-k:] if k > 0 else []
+
+    def _write_segments(self, directory: str, segments: list, active_bytes: int, entries: list, fsync: bool) -> int:
+        """
+        Дописывает записи в активный сегмент, ротируя его по segment_max_bytes.
+        Хвост после active_bytes (незакоммиченный обрыв) отрезается.
+        Возвращает новый закоммиченный размер активного сегмента.
+        """
+        pending = deque(self._encode(entry) for entry in entries)
+        if telemetry.is_enabled():
+            telemetry.count("storage.bytes_written", sum(len(line) for line in pending))
+        while True:
+            path = os.path.join(directory, segments[-1])
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.truncate(active_bytes)
+                f.seek(active_bytes)
+                while pending and (not active_bytes or active_bytes + len(pending[0]) <= self.segment_max_bytes):
+                    line = pending.popleft()
+                    f.write(line)
+                    active_bytes += len(line)
+                f.flush()
+                # Закрываемый при ротации сегмент синкаем всегда
+                if fsync or pending:
+                    os.fsync(f.fileno())
+            if not pending:
+                return active_bytes
+            segments.append(self._segment_name(len(segments)))
+            active_bytes = 0
+
+    def _write_log(self, doc: dict, previous: dict | None):
+        """
+        Полная перезапись лога (компакция) под блокировкой сессии. Сегменты
+        пишутся в новую папку поколения, затем meta.json атомарно переключается
+        на неё — это и есть commit: после падения meta.json указывает целиком
+        на старое или на новое поколение. Потом удаляются папки поколений,
+        на которые meta.json не ссылается (в т.ч. недописанные при падении).
+        """
+        os.makedirs(self.log_dir, exist_ok=True)
+        generation = (previous or {}).get("generation", 0) + 1
+        meta = {"generation": generation}
+        data_dir = self._data_dir(meta)
+        shutil.rmtree(data_dir, ignore_errors=True)  # остаток компакции, упавшей до commit
+        os.makedirs(data_dir)
+
+        segments = [self._segment_name(0)]
+        active_bytes = self._write_segments(data_dir, segments, 0, doc.get("history", []), fsync=True)
+        # Новые файлы и папка поколения должны пережить падение раньше, чем на них сошлётся meta.json
+        fsync_dir(data_dir)
+        fsync_dir(self.log_dir)
+
+        meta.update(
+            metadata=doc.get("metadata", {}),
+            length=len(doc.get("history", [])),
+            segments=segments,
+            active_bytes=active_bytes,
+        )
+        self._write_meta(meta, fsync=True)
+        self._remove_stale(data_dir)
+        self._unsynced = 0
+        return meta
+
+    def _remove_stale(self, data_dir: str):
+        """Удаляет поколения, кроме текущего `data_dir`, и сегменты лога прежнего формата."""
+        for name in os.listdir(self.log_dir):
+            path = os.path.join(self.log_dir, name)
+            if name.startswith(GENERATION_PREFIX) and path != data_dir:
+                shutil.rmtree(path, ignore_errors=True)
+            elif name.endswith(SEGMENT_SUFFIX):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+
+    def _recover_swap(self):
+        """
+        Остатки подмены папки лога целиком (так компактировали прежние версии):
+        <id>.log.old-<pid> и <id>.log.tmp-<pid>. Если падение пришлось между
+        двумя rename и <id>.log нет, возвращается .old-копия — последнее
+        закоммиченное состояние; остальное удаляется.
+        """
+        parent, base = os.path.split(self.log_dir)
+        try:
+            leftovers = sorted(name for name in os.listdir(parent) if name.startswith((f"{base}.old-", f"{base}.tmp-")))
+        except FileNotFoundError:
+            return
+        if not leftovers:
+            return
+        with self._flock():
+            for name in leftovers:  # .old- раньше .tmp-
+                path = os.path.join(parent, name)
+                if not os.path.exists(path):  # уже разобрал другой процесс
+                    continue
+                if name.startswith(f"{base}.old-") and not os.path.exists(self.log_dir):
+                    os.replace(path, self.log_dir)
+                else:
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def _ensure_log(self) -> dict:
+        """Возвращает meta; при первом обращении мигрирует .json/.jsonl в лог."""
+        meta = self._read_meta()
+        if meta is None:
+            meta = self._write_log(super().load(), None)
+        return meta
+
+    def _read_consistent(self, meta: dict, read):
+        """
+        (meta, read(meta)). Компакция удаляет сегменты старого поколения: если
+        к концу чтения их не стало, а meta.json уже ссылается на другое
+        поколение, чтение повторяется по новому meta.
+        """
+        while True:
+            result = read(meta)
+            segments = meta.get("segments")
+            if not segments or os.path.exists(self._segment_path(meta, segments[-1])):
+                return meta, result
+            fresh = self._read_meta()
+            if fresh is None or fresh.get("generation") == meta.get("generation"):
+                return meta, result
+            meta = fresh
+
+    # --- публичный API BulusRepo ---
+
+    def load(self) -> dict:
+        """Читает сессию из лога; если лога ещё нет — из .json/.jsonl."""
+        meta = self._read_meta()
+        if meta is None:
+            return super().load()
+        meta, history = self._read_consistent(meta, self._read_history)
+        return self._normalize_doc({"metadata": meta.get("metadata", {}), "history": history})
+
+    def _read_history(self, meta: dict) -> list:
+        segments = meta.get("segments", [])
+        history = []
+        for i, name in enumerate(segments):
+            limit = meta.get("active_bytes") if i == len(segments) - 1 else None
+            history.extend(self._iter_segment(meta, name, limit))
+        del history[meta.get("length", len(history)) :]
+        return history
+
+    def load_metadata(self) -> dict:
+        """Читает только meta.json."""
+        meta = self._read_meta()
+        if meta is None:
+            return super().load_metadata()
+        return self._normalize_doc({"metadata": meta.get("metadata", {}), "history": []})["metadata"]
+
+    def load_tail(self, n: int) -> list:
+        """Последние n записей: с конца активного сегмента, предыдущие — только если не хватило."""
+        meta = self._read_meta()
+        if meta is None:
+            return super().load_tail(n)
+        if n <= 0:
+            return []
+        key = (meta.get("metadata", {}).get("version"), meta.get("length"), meta.get("active_bytes"))
+        cached = self._tail_cache
+        if cached is not None and cached[0] == key and (len(cached[1]) >= n or len(cached[1]) == meta.get("length")):
+            return cached[1][-n:]
+
+        meta, entries = self._read_consistent(meta, lambda meta: self._read_tail(meta, n))
+        key = (meta.get("metadata", {}).get("version"), meta.get("length"), meta.get("active_bytes"))
+        self._tail_cache = (key, entries)
+        return entries[-n:]
+
+    def _stored_version(self) -> int:
+        meta = self._read_meta()
+        if meta is None:
+            return super()._stored_version()
+        return meta.get("metadata", {}).get("version", 0)
+
+    def _write_doc(self, doc: dict):
+        """
+        Ice append-only: если история только выросла, дописываются лишь
+        новые записи, иначе (в т.ч. после rewind и новых записей поверх)
+        лог перезаписывается целиком.
+        """
+        history = doc.get("history", [])
+        meta = self._read_meta()
+        if meta is None or not self._extends_stored(meta, history):
+            self._write_log(doc, meta)
+            self._changed = doc.get("metadata", {})
+            return
+        self._append_entries(meta, history[meta.get("length", 0) :], doc.get("metadata", meta.get("metadata", {})))
+
+    def _commit(self, entries: list, metadata: dict):
+        self._append_entries(self._ensure_log(), entries, metadata)
+
+    def append(self, entry: IceEntry, status: str | None = None):
+        """Дописывает одну запись в активный сегмент: O(1) по длине истории."""
+        with self._locked():
+            meta = self._ensure_log()
+            metadata = meta.get("metadata", {})
+            if status:
+                metadata["status"] = status
+            metadata["version"] = metadata.get("version", 0) + 1
+            self._append_entries(meta, [entry], metadata)
+
+    def update_status(self, status: str):
+        """Меняет статус, переписывая только meta.json."""
+        with self._locked():
+            meta = self._ensure_log()
+            metadata = meta.setdefault("metadata", {})
+            metadata["status"] = status
+            metadata["version"] = metadata.get("version", 0) + 1
+            self._write_meta(meta, fsync=self._tick())
+            self._changed = metadata
+
+    def sync(self):
+        """Принудительный fsync активного сегмента и meta.json."""
+        with self._flock():
+            meta = self._read_meta()
+            if meta is None:
+                return
+            with open(self._segment_path(meta, meta["segments"][-1]), "ab") as f:
+                os.fsync(f.fileno())
+            self._write_meta(meta, fsync=True)
+            self._unsynced = 0
+
+    # --- внутреннее ---
+
+    def _tick(self) -> bool:
+        """Считает несинхронизированные записи; True — пора делать fsync."""
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self._unsynced = 0
+            return True
+        return False
+
+    def _read_tail(self, meta: dict, n: int) -> list:
+        """Последние n закоммиченных записей: предыдущие сегменты читаются, только если не хватило."""
+        segments = meta.get("segments", [])
+        entries: list = []
+        for i in range(len(segments) - 1, -1, -1):
+            limit = meta.get("active_bytes") if i == len(segments) - 1 else None
+            entries[:0] = self._tail_segment(meta, segments[i], limit, n - len(entries))
+            if len(entries) >= n:
+                break
+        return entries
+
+    def _extends_stored(self, meta: dict, history: list) -> bool:
+        """
+        Продолжает ли `history` записанный лог. Сверяется последняя записанная
+        запись: doc, который отмотали и дописали заново, не должен приклеиться
+        к расходящемуся префиксу.
+        """
+        length = meta.get("length", 0)
+        if len(history) < length:
+            return False
+        if length == 0:
+            return True
+        stored = self._read_tail(meta, 1)
+        return bool(stored) and same_entry(stored[-1], history[length - 1])
+
+    def _append_entries(self, meta: dict, entries: list, metadata: dict):
+        do_fsync = self._tick()
+        meta["active_bytes"] = self._write_segments(
+            self._data_dir(meta), meta["segments"], meta.get("active_bytes", 0), entries, fsync=do_fsync
+        )
+        meta["metadata"] = metadata
+        meta["length"] = meta.get("length", 0) + len(entries)
+        self._write_meta(meta, fsync=do_fsync)
+        self._changed = metadata
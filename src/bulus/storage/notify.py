@@ -0,0 +1,193 @@
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import select
+import socket
+import threading
+from typing import List, NamedTuple
+
+from bulus.storage import repository
+
+NOTIFY_DIR = ".notify"
+
+# Имена сокетов подписчиков: <pid>-<n>.sock (путь AF_UNIX ограничен ~100 байтами)
+_subscriber_ids = itertools.count()
+
+
+class Change(NamedTuple):
+    """Уведомление о записи сессии: новый статус и версия metadata."""
+
+    session_id: str
+    status: str | None
+    version: int
+
+
+# Каналы, в которые публикуют все репозитории этого процесса
+_channels: List = []
+
+
+def add_channel(channel):
+    """Подключает канал: каждая запись сессии в этом процессе будет в него опубликована."""
+    if channel not in _channels:
+        _channels.append(channel)
+
+
+def remove_channel(channel):
+    with contextlib.suppress(ValueError):
+        _channels.remove(channel)
+
+
+def publish(session_id: str, metadata: dict):
+    """Вызывается репозиториями после записи; без каналов — одна проверка списка."""
+    if not _channels:
+        return
+    change = Change(session_id, metadata.get("status"), metadata.get("version", 0))
+    for channel in list(_channels):
+        channel.publish(change)
+
+
+class AsyncioChannel:
+    """
+    Внутрипроцессный канал для asyncio: у каждого подписчика своя asyncio.Queue.
+    publish() можно звать из любого потока — доставка через call_soon_threadsafe.
+    """
+
+    def __init__(self):
+        self._subscribers: set = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> "AsyncSubscription":
+        """Подписка в текущем event loop (вызывать из корутины)."""
+        subscription = AsyncSubscription(self, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: "AsyncSubscription"):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, change: Change):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.queue.put_nowait, change)
+            except RuntimeError:  # event loop подписчика уже закрыт
+                self.unsubscribe(subscription)
+
+
+class AsyncSubscription:
+    def __init__(self, channel: AsyncioChannel, loop: asyncio.AbstractEventLoop):
+        self.channel = channel
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def get(self, timeout: float | None = None) -> Change | None:
+        """Следующее уведомление; None, если за timeout ничего не пришло."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.channel.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Change:
+        return await self.queue.get()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SocketChannel:
+    """
+    Межпроцессный pub/sub на Unix datagram-сокетах.
+
+    Каждый подписчик биндит свой сокет в `directory` (по умолчанию
+    SESSIONS_DIR/.notify); publish() шлёт датаграмму [session_id, status, version]
+    во все сокеты каталога. Подписчик спит в recv — простой ничего не стоит.
+    Сокеты умерших подписчиков удаляются при первой неудачной отправке;
+    если очередь подписчика переполнена, уведомление теряется (счётчик `dropped`).
+    """
+
+    def __init__(self, directory: str | None = None):
+        self.directory = directory
+        self.dropped = 0
+        # publish() зовут из потоков писателей параллельно, += не атомарен
+        self._dropped_lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def path(self) -> str:
+        return self.directory or os.path.join(str(repository.SESSIONS_DIR), NOTIFY_DIR)
+
+    def _peer_paths(self) -> list:
+        # listdir на каждую публикацию: пара микросекунд, зато новый подписчик виден сразу
+        # (mtime каталога для кэша слишком грубый)
+        directory = self.path()
+        try:
+            return [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".sock")]
+        except FileNotFoundError:
+            return []
+
+    def publish(self, change: Change):
+        message = json.dumps(list(change), ensure_ascii=False).encode("utf-8")
+        for path in self._peer_paths():
+            try:
+                self._sock.sendto(message, path)
+            except BlockingIOError:
+                with self._dropped_lock:
+                    self.dropped += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+
+    def subscribe(self) -> "SocketSubscription":
+        directory = self.path()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}-{next(_subscriber_ids)}.sock")
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        return SocketSubscription(sock, path)
+
+    def close(self):
+        self._sock.close()
+
+
+class SocketSubscription:
+    def __init__(self, sock: socket.socket, path: str):
+        self.sock = sock
+        self.path = path
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def get(self, timeout: float | None = None) -> Change | None:
+        """Следующее уведомление; None, если за timeout ничего не пришло."""
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        if not ready:
+            return None
+        session_id, status, version = json.loads(self.sock.recv(65536))
+        return Change(session_id, status, version)
+
+    def close(self):
+        self.sock.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
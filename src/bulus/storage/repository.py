@@ -1,74 +1,309 @@
 import contextlib
+import copy
 import json
 import os
+import threading
+from contextlib import contextmanager
 
+from bulus import telemetry
 from bulus.config import SESSIONS_DIR
+from bulus.core.compact import CompactIce
 from bulus.core.schemas import IceEntry
+from bulus.core.states import AgentState
+from bulus.storage import notify
+from bulus.storage.group_commit import GroupCommitter, fsync_dir
+
+# <session_id>.json.lock рядом с файлом сессии — цель flock в _locked(). Файл пустой и
+# остаётся навсегда: удалять его без гонок нельзя (ждущий процесс держит старый inode).
+# Это не сессия: discover_sessions() и вьюер его пропускают.
+LOCK_SUFFIX = ".lock"
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессной блокировки нет, остаётся только version-check
+    fcntl = None
+
+
+class ConflictError(RuntimeError):
+    """save(expected_version=...) обнаружил, что сессию уже сохранил кто-то другой."""
+
+    def __init__(self, session_id: str, expected: int, actual: int):
+        super().__init__(f"Session '{session_id}' version conflict: expected {expected}, found {actual}")
+        self.session_id = session_id
+        self.expected = expected
+        self.actual = actual
+
+
+class CorruptSessionError(ValueError):
+    """Файл сессии не читается как JSON — не подменяем его пустой сессией."""
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = "w", fsync: bool = True):
+    """Открывает временный файл рядом с `path`; после успешной записи подменяет им `path` (os.replace)."""
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp_path, mode, encoding=None if "b" in mode else "utf-8") as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+            if telemetry.is_enabled():
+                telemetry.count("storage.bytes_written", f.tell())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    if fsync:
+        fsync_dir(os.path.dirname(path))
+
+
+def atomic_write_json(path: str, data, fsync: bool = True, **dump_kwargs):
+    """Атомарно пишет JSON в `path`."""
+    with atomic_open(path, "w", fsync=fsync) as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
 
 
 class BulusRepo:
-    """Хранилище сессий с metadata и Ice history в одном JSON-файле."""
+    """
+    Хранилище сессий с metadata и Ice history в одном JSON-файле.
+
+    save() атомарен (tmp + os.replace): после падения на диске либо старая,
+    либо новая версия. В metadata.version — счётчик сохранений;
+    save(doc, expected_version=...) бросает ConflictError, если сессию
+    успели перезаписать после чтения. С `committer` fsync откладывается
+    и делается пачкой (group commit), см. GroupCommitter. Запись идёт под
+    flock на <session_id>.json.lock (см. LOCK_SUFFIX).
+    """
 
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, compact: bool = False, committer: GroupCommitter | None = None):
         self.session_id = session_id
         self.file_path = os.path.join(SESSIONS_DIR, f"{session_id}.json")
+        # compact=True: история пишется delta-строками ("ice_delta") и читается как CompactIce
+        self.compact = compact
+        self.committer = committer
+        # (inode, mtime_ns, size) -> doc последнего прочитанного/записанного файла:
+        # пока файл не менялся, его не нужно перечитывать с диска
+        self._cache: tuple | None = None
+        # metadata последней записи под _locked(); публикуется после снятия flock
+        self._changed: dict | None = None
 
     def _default_doc(self):
         return {
-            "metadata": {"session_id": self.session_id, "status": "need_brain", "pending_action": None},
+            "metadata": {"session_id": self.session_id, "status": "need_brain", "pending_action": None, "version": 0},
             "history": [],
         }
 
     def _normalize_doc(self, data) -> dict:
         """Поддержка старого формата (список Ice) и нового с metadata."""
         if isinstance(data, list):
-            return {"metadata": {"session_id": self.session_id, "status": "need_brain"}, "history": data}
-        if not isinstance(data, dict):
+            data = {"metadata": {"session_id": self.session_id, "status": "need_brain"}, "history": data}
+        elif not isinstance(data, dict):
             return self._default_doc()
+        if "ice_delta" in data:
+            history = CompactIce.from_rows(data.pop("ice_delta"))
+            data["history"] = history if self.compact else list(history)
         # Ensure required keys exist
         data.setdefault("metadata", {"session_id": self.session_id, "status": "need_brain", "pending_action": None})
         data["metadata"].setdefault("session_id", self.session_id)
         data["metadata"].setdefault("status", "need_brain")
         data["metadata"].setdefault("pending_action", None)
+        data["metadata"].setdefault("version", 0)
         data.setdefault("history", [])
         return data
 
     def load(self) -> dict:
-        """Читает сессию (metadata + history) с диска."""
-        if not os.path.exists(self.file_path):
-            legacy_path = f"{self.file_path}l"  # .jsonl из старых версий
-            if os.path.exists(legacy_path):
-                ice = []
-                with open(legacy_path, encoding="utf-8") as f:
-                    for line in f:
-                        if line.strip():
-                            with contextlib.suppress(json.JSONDecodeError):
-                                ice.append(json.loads(line))
-                return self._normalize_doc(ice)
-            return self._default_doc()
-        with open(self.file_path, encoding="utf-8") as f:
-            try:
+        """
+        Читает сессию (metadata + history); пока файл не менялся, берёт её из кэша.
+        metadata и список history — копии, записи истории — только для чтения (см. load_tail).
+        """
+        if self.compact:
+            return self._read_file(remember=False)
+        return _copy_doc(self._cached_doc())
+
+    # --- чтение хвоста (горячий путь движка) ---
+
+    def load_metadata(self) -> dict:
+        """Только metadata сессии (status, pending_action, version, ...)."""
+        return copy.deepcopy(self._cached_doc()["metadata"])
+
+    def load_tail(self, n: int) -> list:
+        """
+        Последние n записей истории. Список новый, а сами записи общие с кэшем
+        чтения, как и в load(): копировать их на каждом шаге движка дорого, а
+        Ice иммутабелен — новые кадры собираются заново, записи только читают.
+        Мутация записи (в т.ч. её storage) испортит кэш; нужна правка — копируйте.
+        """
+        history = self._cached_doc()["history"]
+        return [history[i] for i in range(max(len(history) - n, 0), len(history))]
+
+    def load_head_state(self) -> tuple:
+        """(state, storage) последней записи — то, с чего продолжают раннер и мозг."""
+        tail = self.load_tail(1)
+        if not tail:
+            return AgentState.HELLO.value, {}
+        return tail[-1][3], tail[-1][4]
+
+    def _cached_doc(self) -> dict:
+        """
+        Нормализованный doc текущей версии файла. Кэш инвалидируется по
+        (inode, mtime_ns, size): save() всегда подменяет файл новым inode.
+        Возвращаемый объект общий — наружу отдаются только копии.
+        """
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            return self._load_legacy()
+        cache = self._cache
+        if cache is not None and cache[0] == _signature(st):
+            return cache[1]
+        return self._read_file()
+
+    def _read_file(self, remember: bool = True) -> dict:
+        try:
+            with open(self.file_path, encoding="utf-8") as f:
+                st = os.fstat(f.fileno())
                 data = json.load(f)
-            except json.JSONDecodeError:
-                return self._default_doc()
-        return self._normalize_doc(data)
+        except FileNotFoundError:
+            return self._load_legacy()
+        except json.JSONDecodeError as e:
+            raise CorruptSessionError(f"Session file {self.file_path} is corrupt: {e}") from e
+        doc = self._normalize_doc(data)
+        if remember:
+            self._cache = (_signature(st), doc)
+        return doc
+
+    def _load_legacy(self) -> dict:
+        legacy_path = f"{self.file_path}l"  # .jsonl из старых версий
+        if not os.path.exists(legacy_path):
+            return self._default_doc()
+        ice = []
+        with open(legacy_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    with contextlib.suppress(json.JSONDecodeError):
+                        ice.append(json.loads(line))
+        return self._normalize_doc(ice)
 
-    def save(self, doc: dict):
-        """Перезаписывает сессию целиком."""
-        os.makedirs(SESSIONS_DIR, exist_ok=True)
-        with open(self.file_path, "w", encoding="utf-8") as f:
-            json.dump(doc, f, ensure_ascii=False, indent=2)
+    def save(self, doc: dict, expected_version: int | None = None):
+        """
+        Атомарно сохраняет сессию и увеличивает metadata.version (в `doc` тоже).
+        expected_version — версия, с которой doc был прочитан; если на диске
+        уже другая, бросается ConflictError и ничего не пишется.
+        """
+        with self._locked():
+            current = self._stored_version()
+            if expected_version is not None and expected_version != current:
+                raise ConflictError(self.session_id, expected_version, current)
+            doc.setdefault("metadata", {})["version"] = current + 1
+            self._write_doc(doc)
+
+    def commit(self, entries: list, metadata: dict, expected_version: int | None = None):
+        """
+        Дописывает `entries` в историю и заменяет metadata одной атомарной
+        записью (metadata.version увеличивается, в переданном dict тоже).
+        В отличие от save() не требует полной истории на руках.
+        """
+        with self._locked():
+            current = self._stored_version()
+            if expected_version is not None and expected_version != current:
+                raise ConflictError(self.session_id, expected_version, current)
+            metadata["version"] = current + 1
+            self._commit(list(entries), metadata)
 
     def append(self, entry: IceEntry, status: str | None = None):
         """Добавляет событие и при необходимости меняет статус."""
-        doc = self.load()
-        doc["history"].append(entry)
-        if status:
-            doc["metadata"]["status"] = status
-        self.save(doc)
+        with self._locked():
+            doc = self.load()
+            doc["history"].append(entry)
+            if status:
+                doc["metadata"]["status"] = status
+            doc["metadata"]["version"] += 1
+            self._write_doc(doc)
 
     def update_status(self, status: str):
         """Обновляет только статус сессии."""
+        with self._locked():
+            doc = self.load()
+            doc["metadata"]["status"] = status
+            doc["metadata"]["version"] += 1
+            self._write_doc(doc)
+
+    # --- запись и версии ---
+
+    @contextmanager
+    def _locked(self):
+        """
+        Эксклюзивная блокировка сессии на время read-check-write. Запись внутри
+        отмечает изменение (_changed), а notify.publish идёт уже после снятия
+        flock, как у sqlite после транзакции: подписчик, который сразу читает
+        сессию, не ждёт блокировку писателя.
+        """
+        with self._flock():
+            self._changed = None
+            yield
+            changed, self._changed = self._changed, None
+        if changed is not None:
+            notify.publish(self.session_id, changed)
+
+    @contextmanager
+    def _flock(self):
+        """flock на соседнем .lock; без fcntl (Windows) — без блокировки."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        # Не flock на самом файле сессии: save() подменяет его новым inode
+        with open(f"{self.file_path}{LOCK_SUFFIX}", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _stored_version(self) -> int:
+        """Текущая версия на диске (0 — сессии ещё нет)."""
+        if not os.path.exists(self.file_path):
+            return 0
+        return self._cached_doc()["metadata"]["version"]
+
+    def _commit(self, entries: list, metadata: dict):
+        """commit() под блокировкой; версия уже проверена и выставлена."""
         doc = self.load()
-        doc["metadata"]["status"] = status
-        self.save(doc)
+        doc["history"].extend(entries)
+        doc["metadata"] = metadata
+        self._write_doc(doc)
+
+    def _write_doc(self, doc: dict):
+        """Атомарная запись doc; fsync сразу или через group commit."""
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        if self.compact:
+            history = doc.get("history", [])
+            if not isinstance(history, CompactIce):
+                history = CompactIce(history)
+            doc = {k: v for k, v in doc.items() if k != "history"}
+            doc["ice_delta"] = history.to_rows()
+        atomic_write_json(self.file_path, doc, fsync=self.committer is None, indent=2)
+        if self.committer is not None:
+            self.committer.add(self.file_path)
+        # Write-through: следующее чтение не перепарсивает только что записанный файл
+        self._cache = None if self.compact else (_signature(os.stat(self.file_path)), _copy_doc(doc))
+        self._changed = doc.get("metadata", {})
+
+
+def same_entry(a, b) -> bool:
+    """Одна и та же ли Ice-запись: сравнение по JSON, кортеж и список с теми же полями равны."""
+    return json.dumps(a, ensure_ascii=False, sort_keys=True) == json.dumps(b, ensure_ascii=False, sort_keys=True)
+
+
+def _signature(st: os.stat_result) -> tuple:
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _copy_doc(doc: dict) -> dict:
+    """Копия doc, которую можно мутировать: metadata глубоко, history — новый список тех же записей."""
+    copied = dict(doc)
+    copied["metadata"] = copy.deepcopy(doc["metadata"])
+    copied["history"] = list(doc["history"])
+    return copied
@@ -0,0 +1,49 @@
+import json
+import os
+
+from bulus.storage import repository
+
+SIDE_DIR = ".side"
+
+# Журналы движка: решения мозга (для replay) и тайминги шагов (для вьюера)
+DECISIONS = "decisions"
+TIMINGS = "timings"
+
+
+class SideLog:
+    """
+    Append-only JSONL-журнал сессии: SESSIONS_DIR/.side/<session_id>.<kind>.jsonl.
+
+    Для вспомогательных данных, которые растут вместе с сессией (решения мозга
+    для replay, тайминги шагов): в metadata они раздували бы каждое
+    load_metadata() и commit(). Хот-пас их не читает; запись — одна строка
+    в режиме append, без fsync. Недописанная строка после падения пропускается.
+    """
+
+    def __init__(self, session_id: str, kind: str):
+        self.session_id = session_id
+        self.kind = kind
+
+    def path(self) -> str:
+        return os.path.join(str(repository.SESSIONS_DIR), SIDE_DIR, f"{self.session_id}.{self.kind}.jsonl")
+
+    def append(self, row):
+        line = json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n"
+        path = self.path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Одна запись в O_APPEND-файл: строки параллельных писателей не перемешиваются
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def load(self) -> list:
+        rows = []
+        try:
+            with open(self.path(), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return rows
@@ -0,0 +1,288 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+
+from bulus import telemetry
+from bulus.core.schemas import IceEntry
+from bulus.storage import notify, repository
+from bulus.storage.repository import BulusRepo, ConflictError, same_entry
+
+DB_FILE = "bulus.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    status     TEXT NOT NULL,
+    metadata   TEXT NOT NULL,
+    length     INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_by_status ON sessions (status, updated_at);
+CREATE TABLE IF NOT EXISTS history (
+    session_id TEXT NOT NULL,
+    idx        INTEGER NOT NULL,
+    entry      TEXT NOT NULL,
+    PRIMARY KEY (session_id, idx)
+) WITHOUT ROWID;
+"""
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class SqliteStore:
+    """
+    Общая SQLite-база для многих сессий (stdlib sqlite3, WAL).
+
+    История лежит строками в таблице `history`, metadata — в `sessions`
+    с индексом по статусу. claim_next() атомарно забирает следующую сессию
+    в нужном статусе, поэтому несколько процессов-воркеров не дерутся за
+    одну и ту же сессию и не сканируют все файлы.
+    """
+
+    def __init__(self, db_path: str | None = None):
+        self.db_path = db_path or os.path.join(repository.SESSIONS_DIR, DB_FILE)
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3-соединение нельзя делить между потоками — по одному на поток
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE: сразу берём write-lock, чтобы чтение+запись были атомарны."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def repo(self, session_id: str) -> "SqliteBulusRepo":
+        return SqliteBulusRepo(session_id, store=self)
+
+    def claim_next(self, status: str, claim_status: str) -> str | None:
+        """
+        Атомарно берёт самую давнюю сессию в статусе `status` и переводит её
+        в `claim_status`. Возвращает session_id или None, если работы нет.
+        """
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT session_id, metadata FROM sessions WHERE status = ? ORDER BY updated_at LIMIT 1", (status,)
+            ).fetchone()
+            if row is None:
+                return None
+            metadata = json.loads(row[1])
+            metadata["status"] = claim_status
+            metadata["version"] = metadata.get("version", 0) + 1
+            conn.execute(
+                "UPDATE sessions SET status = ?, metadata = ?, updated_at = ? WHERE session_id = ?",
+                (claim_status, _dumps(metadata), time.time(), row[0]),
+            )
+            return row[0]
+
+    def session_ids(self, status: str | None = None, limit: int | None = None) -> List[str]:
+        """Сессии (в порядке давности обновления), опционально только в заданном статусе."""
+        query = "SELECT session_id FROM sessions"
+        params: list = []
+        if status is not None:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY updated_at"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [row[0] for row in self._conn().execute(query, params)]
+
+    def count_by_status(self) -> dict:
+        return dict(self._conn().execute("SELECT status, COUNT(*) FROM sessions GROUP BY status").fetchall())
+
+
+_stores: dict = {}
+_stores_lock = threading.Lock()
+
+
+def default_store() -> SqliteStore:
+    """Store по умолчанию — один на путь к БД (SESSIONS_DIR может быть переопределён)."""
+    db_path = os.path.join(repository.SESSIONS_DIR, DB_FILE)
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = _stores[db_path] = SqliteStore(db_path)
+        return store
+
+
+class SqliteBulusRepo(BulusRepo):
+    """BulusRepo поверх SqliteStore; если сессии ещё нет в БД — читает .json/.jsonl."""
+
+    def __init__(self, session_id: str, store: SqliteStore | None = None):
+        super().__init__(session_id)
+        self.store = store or default_store()
+
+    def _row(self, conn):
+        return conn.execute(
+            "SELECT status, metadata, length FROM sessions WHERE session_id = ?", (self.session_id,)
+        ).fetchone()
+
+    def load(self) -> dict:
+        conn = self.store._conn()
+        row = self._row(conn)
+        if row is None:
+            return super().load()
+        status, metadata, _ = row
+        history = [
+            json.loads(entry)
+            for (entry,) in conn.execute(
+                "SELECT entry FROM history WHERE session_id = ? ORDER BY idx", (self.session_id,)
+            )
+        ]
+        metadata = json.loads(metadata)
+        metadata["status"] = status
+        return self._normalize_doc({"metadata": metadata, "history": history})
+
+    def load_metadata(self) -> dict:
+        row = self._row(self.store._conn())
+        if row is None:
+            return super().load_metadata()
+        metadata = json.loads(row[1])
+        metadata["status"] = row[0]
+        return self._normalize_doc({"metadata": metadata, "history": []})["metadata"]
+
+    def load_tail(self, n: int) -> list:
+        """Последние n записей — по первичному ключу (session_id, idx), без чтения всей истории."""
+        conn = self.store._conn()
+        row = self._row(conn)
+        if row is None:
+            return super().load_tail(n)
+        if n <= 0:
+            return []
+        return [
+            json.loads(entry)
+            for (entry,) in conn.execute(
+                "SELECT entry FROM history WHERE session_id = ? AND idx >= ? ORDER BY idx",
+                (self.session_id, max(row[2] - n, 0)),
+            )
+        ]
+
+    def save(self, doc: dict, expected_version: int | None = None):
+        """
+        Ice append-only: если история выросла (и последняя записанная запись
+        совпадает) — вставляются только новые строки. Укороченная история
+        обрезается и тоже сверяется по последней оставшейся записи.
+        Проверка expected_version и запись идут в одной транзакции.
+        """
+        history = doc.get("history", [])
+        metadata = doc.setdefault("metadata", {})
+        with self.store.transaction() as conn:
+            row = self._row(conn)
+            current = json.loads(row[1]).get("version", 0) if row else super()._stored_version()
+            if expected_version is not None and expected_version != current:
+                raise ConflictError(self.session_id, expected_version, current)
+            metadata["version"] = current + 1
+            length = row[2] if row else 0
+            if len(history) < length:
+                conn.execute("DELETE FROM history WHERE session_id = ? AND idx >= ?", (self.session_id, len(history)))
+                length = len(history)
+            if length and not self._stored_entry_matches(conn, length - 1, history[length - 1]):
+                # История отмотана и дописана заново: префикс разошёлся, переписываем все строки
+                length = 0
+            self._write(conn, metadata, history[length:], length, exists=row is not None)
+        notify.publish(self.session_id, metadata)
+
+    def commit(self, entries: list, metadata: dict, expected_version: int | None = None):
+        with self.store.transaction() as conn:
+            row = self._row(conn)
+            current = json.loads(row[1]).get("version", 0) if row else super()._stored_version()
+            if expected_version is not None and expected_version != current:
+                raise ConflictError(self.session_id, expected_version, current)
+            metadata["version"] = current + 1
+            if row is None:
+                history = super().load()["history"] + list(entries)
+                self._write(conn, metadata, history, 0, exists=False)
+            else:
+                self._write(conn, metadata, list(entries), row[2], exists=True)
+        notify.publish(self.session_id, metadata)
+
+    def append(self, entry: IceEntry, status: str | None = None):
+        with self.store.transaction() as conn:
+            row = self._row(conn)
+            if row is None:
+                doc = super().load()
+                doc["history"].append(entry)
+                metadata = doc["metadata"]
+                if status:
+                    metadata["status"] = status
+                metadata["version"] += 1
+                self._write(conn, metadata, doc["history"], 0, exists=False)
+            else:
+                metadata = json.loads(row[1])
+                metadata["status"] = status or row[0]
+                metadata["version"] = metadata.get("version", 0) + 1
+                self._write(conn, metadata, [entry], row[2], exists=True)
+        notify.publish(self.session_id, metadata)
+
+    def update_status(self, status: str):
+        with self.store.transaction() as conn:
+            row = self._row(conn)
+            if row is None:
+                doc = super().load()
+                metadata = doc["metadata"]
+                metadata["status"] = status
+                metadata["version"] += 1
+                self._write(conn, metadata, doc["history"], 0, exists=False)
+            else:
+                metadata = json.loads(row[1])
+                metadata["status"] = status
+                metadata["version"] = metadata.get("version", 0) + 1
+                self._write(conn, metadata, [], row[2], exists=True)
+        notify.publish(self.session_id, metadata)
+
+    def _stored_entry_matches(self, conn, idx: int, entry) -> bool:
+        row = conn.execute(
+            "SELECT entry FROM history WHERE session_id = ? AND idx = ?", (self.session_id, idx)
+        ).fetchone()
+        return row is not None and same_entry(json.loads(row[0]), entry)
+
+    def _write(self, conn, metadata: dict, new_entries: list, start: int, exists: bool):
+        rows = [(self.session_id, start + i, _dumps(entry)) for i, entry in enumerate(new_entries)]
+        conn.executemany("INSERT OR REPLACE INTO history (session_id, idx, entry) VALUES (?, ?, ?)", rows)
+        metadata_json = _dumps(metadata)
+        if telemetry.is_enabled():
+            encoded = sum(len(row[2].encode("utf-8")) for row in rows) + len(metadata_json.encode("utf-8"))
+            telemetry.count("storage.bytes_written", encoded)
+        params = (
+            metadata.get("status", "need_brain"),
+            metadata_json,
+            start + len(new_entries),
+            time.time(),
+            self.session_id,
+        )
+        if exists:
+            conn.execute(
+                "UPDATE sessions SET status = ?, metadata = ?, length = ?, updated_at = ? WHERE session_id = ?", params
+            )
+        else:
+            conn.execute(
+                "INSERT INTO sessions (status, metadata, length, updated_at, session_id) VALUES (?, ?, ?, ?, ?)", params
+            )
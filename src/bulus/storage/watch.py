@@ -0,0 +1,127 @@
+import contextlib
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+
+from bulus.storage import BINARY_SUFFIX, open_repo, repository
+from bulus.storage.notify import Change
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+except OSError:
+    _libc = None
+if _libc is not None and not hasattr(_libc, "inotify_init1"):  # не Linux: остаются SocketChannel и AsyncioChannel
+    _libc = None
+
+# inotify(7)
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+
+def inotify_available() -> bool:
+    return _libc is not None and sys.platform.startswith("linux")
+
+
+class InotifyWatcher:
+    """
+    Уведомления от ядра (Linux inotify) о записях файловых бэкендов —
+    в том числе из процессов, которые ничего не публикуют.
+
+    Все бэкенды кроме sqlite коммитят запись через os.replace, поэтому
+    достаточно IN_MOVED_TO: <id>.json, <id>.bulus — в каталоге сессий,
+    meta.json — внутри <id>.log/ (за каждой папкой лога своя подписка).
+    Статус и версия читаются из metadata сессии. Записи sqlite не видны:
+    для неё нужен SocketChannel.
+    """
+
+    def __init__(self, directory: str | None = None):
+        if not inotify_available():
+            raise OSError("inotify is not available on this platform")
+        self.directory = str(directory or repository.SESSIONS_DIR)
+        self._suffixes = {".json": "json", BINARY_SUFFIX: "binary"}
+        self._fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._log_dirs = {}  # wd -> session_id
+        self._pending: list = []
+        self._add_watch(self.directory, IN_MOVED_TO | IN_CREATE)
+        for name in os.listdir(self.directory):
+            if name.endswith(".log") and ".tmp-" not in name and ".old-" not in name:
+                self._watch_log(name[: -len(".log")])
+
+    def _add_watch(self, path: str, mask: int) -> int:
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def _watch_log(self, session_id: str):
+        with contextlib.suppress(OSError):  # папку могли успеть подменить/удалить
+            self._log_dirs[self._add_watch(os.path.join(self.directory, f"{session_id}.log"), IN_MOVED_TO)] = session_id
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def _changed(self, session_id: str, backend: str) -> Change | None:
+        try:
+            metadata = open_repo(session_id, backend).load_metadata()
+        except Exception:  # файл подменили или удалили между событием и чтением
+            return None
+        return Change(session_id, metadata.get("status"), metadata.get("version", 0))
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size : offset + _EVENT.size + length].rstrip(b"\0").decode()
+            offset += _EVENT.size + length
+            if wd in self._log_dirs:
+                if mask & IN_IGNORED:  # папку лога удалили
+                    del self._log_dirs[wd]
+                elif name == "meta.json":
+                    self._pending.append((self._log_dirs[wd], "log"))
+                continue
+            if ".tmp-" in name or ".old-" in name:
+                continue
+            stem, ext = os.path.splitext(name)
+            if mask & IN_ISDIR and ext == ".log":
+                # Новая папка лога (создана или восстановлена из .old-копии): подписываемся заново
+                self._watch_log(stem)
+                self._pending.append((stem, "log"))
+            elif mask & IN_MOVED_TO and ext in self._suffixes:
+                self._pending.append((stem, self._suffixes[ext]))
+
+    def get(self, timeout: float | None = None) -> Change | None:
+        """Следующее уведомление; None, если за timeout ничего не пришло."""
+        while True:
+            while self._pending:
+                change = self._changed(*self._pending.pop(0))
+                if change is not None:
+                    return change
+            ready, _, _ = select.select([self._fd], [], [], timeout)
+            if not ready:
+                return None
+            self._read_events()
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,30 @@
+from bulus.telemetry.sinks import HistogramSink, JsonlSink, OtlpExporter, Sink
+from bulus.telemetry.tracer import (
+    NOOP_SPAN,
+    Span,
+    collect_step,
+    count,
+    disable,
+    enable,
+    enabled,
+    is_enabled,
+    merge_timings,
+    span,
+)
+
+__all__ = [
+    "NOOP_SPAN",
+    "HistogramSink",
+    "JsonlSink",
+    "OtlpExporter",
+    "Sink",
+    "Span",
+    "collect_step",
+    "count",
+    "disable",
+    "enable",
+    "enabled",
+    "is_enabled",
+    "merge_timings",
+    "span",
+]
@@ -0,0 +1,345 @@
+import json
+import math
+import os
+import queue
+import threading
+import time
+import urllib.request
+from typing import Callable, Dict, List
+
+
+class Sink:
+    """Приёмник телеметрии: получает закрытые спаны и приращения счётчиков."""
+
+    def on_span(self, span):
+        pass
+
+    def on_count(self, name: str, value: float, attrs: dict):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """Телеметрию выключили: дописать буферы и освободить ресурсы sink'а."""
+        self.flush()
+
+
+class HistogramSink(Sink):
+    """
+    In-memory гистограммы длительностей по имени спана и суммы счётчиков.
+    Бакеты экспоненциальные (шаг 2**(1/4), ~19%), от 1 мкс: память не растёт
+    с числом замеров, перцентили — с точностью до бакета.
+    """
+
+    BASE = 1e-6
+    FACTOR = 2**0.25
+    BUCKETS = 128  # до ~1.1e3 с; всё длиннее — в последний бакет
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans: Dict[str, dict] = {}
+        self._counters: Dict[str, float] = {}
+
+    def _bucket(self, seconds: float) -> int:
+        if seconds <= self.BASE:
+            return 0
+        return min(int(math.log(seconds / self.BASE, self.FACTOR)) + 1, self.BUCKETS - 1)
+
+    def on_span(self, span):
+        bucket = self._bucket(span.duration)
+        with self._lock:
+            stats = self._spans.get(span.name)
+            if stats is None:
+                stats = self._spans[span.name] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "min": span.duration,
+                    "max": span.duration,
+                    "buckets": [0] * self.BUCKETS,
+                }
+            stats["count"] += 1
+            stats["total"] += span.duration
+            stats["min"] = min(stats["min"], span.duration)
+            stats["max"] = max(stats["max"], span.duration)
+            stats["buckets"][bucket] += 1
+
+    def on_count(self, name: str, value: float, attrs: dict):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _percentile(self, stats: dict, q: float) -> float:
+        rank = q * stats["count"]
+        seen = 0
+        for i, n in enumerate(stats["buckets"]):
+            seen += n
+            if seen >= rank and n:
+                upper = self.BASE * self.FACTOR**i
+                return min(max(upper, stats["min"]), stats["max"])
+        return stats["max"]
+
+    def snapshot(self) -> dict:
+        """{"spans": {name: {count, total_ms, mean_ms, min_ms, max_ms, p50_ms, p95_ms, p99_ms}}, "counters": {...}}"""
+        with self._lock:
+            spans = {}
+            for name, stats in sorted(self._spans.items()):
+                spans[name] = {
+                    "count": stats["count"],
+                    "total_ms": stats["total"] * 1000,
+                    "mean_ms": stats["total"] / stats["count"] * 1000,
+                    "min_ms": stats["min"] * 1000,
+                    "max_ms": stats["max"] * 1000,
+                    **{f"p{int(q * 100)}_ms": self._percentile(stats, q) * 1000 for q in (0.5, 0.95, 0.99)},
+                }
+            return {"spans": spans, "counters": dict(sorted(self._counters.items()))}
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def format(self) -> str:
+        snap = self.snapshot()
+        header = ("span", "count", "mean ms", "p50 ms", "p95 ms", "p99 ms", "total ms")
+        lines = ["{:24s} {:>7s} {:>9s} {:>9s} {:>9s} {:>9s} {:>10s}".format(*header)]
+        for name, s in snap["spans"].items():
+            lines.append(
+                f"{name:24s} {s['count']:7d} {s['mean_ms']:9.3f} {s['p50_ms']:9.3f} "
+                f"{s['p95_ms']:9.3f} {s['p99_ms']:9.3f} {s['total_ms']:10.1f}"
+            )
+        for name, value in snap["counters"].items():
+            lines.append(f"{name:24s} {value:>7g}")
+        return "\n".join(lines)
+
+
+def span_record(span) -> dict:
+    """Спан как JSON-совместимый dict (общий формат JsonlSink и тестов)."""
+    return {
+        "type": "span",
+        "name": span.name,
+        "trace_id": f"{span.trace_id:032x}",
+        "span_id": f"{span.span_id:016x}",
+        "parent_id": f"{span.parent_id:016x}" if span.parent_id is not None else None,
+        "start": span.start,
+        "duration_ms": span.duration * 1000,
+        "attrs": span.attrs,
+    }
+
+
+class JsonlSink(Sink):
+    """
+    Пишет спаны и счётчики строками JSON в файл (append). Буферизует
+    `buffer_size` записей, чтобы не делать write на каждый спан.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 256):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def _add(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) < self.buffer_size:
+                return
+            lines, self._buffer = self._buffer, []
+        self._write(lines)
+
+    def _write(self, lines: List[str]):
+        if lines:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def on_span(self, span):
+        self._add(span_record(span))
+
+    def on_count(self, name: str, value: float, attrs: dict):
+        self._add({"type": "count", "name": name, "value": value, "ts": time.time(), "attrs": attrs})
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        self._write(lines)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attrs: dict) -> list:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attrs.items()]
+
+
+class OtlpExporter(Sink):
+    """
+    Экспорт в формате OpenTelemetry (OTLP/JSON) без зависимости от SDK.
+
+    Спаны копятся пачками по `batch_size` и уходят как ExportTraceServiceRequest;
+    счётчики — накопительными суммами (ExportMetricsServiceRequest) на flush().
+    Куда отправлять: `endpoint` (OTLP/HTTP коллектор, POST {endpoint}/v1/traces
+    и /v1/metrics) или произвольный `export(kind, payload)`, kind — "traces"/"metrics".
+
+    Отправка идёт в фоновом потоке через очередь на `queue_size` пачек: шаг
+    движка не ждёт коллектор. Очередь полна или отправка упала — пачка
+    отбрасывается, счётчик в `dropped`. flush() ждёт, пока очередь разойдётся;
+    close() вдобавок останавливает поток.
+    """
+
+    def __init__(
+        self,
+        endpoint: str | None = None,
+        export: Callable[[str, dict], None] | None = None,
+        service_name: str = "bulus",
+        batch_size: int = 512,
+        timeout: float = 5.0,
+        headers: dict | None = None,
+        queue_size: int = 64,
+    ):
+        if endpoint is None and export is None:
+            raise ValueError("OtlpExporter needs an endpoint or an export callable")
+        self.endpoint = endpoint.rstrip("/") if endpoint else None
+        self.export = export or self._post
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._spans: list = []
+        self._counters: Dict[str, float] = {}
+        self._started_ns = time.time_ns()
+        # (kind, payload, size); None — остановить поток
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._worker: threading.Thread | None = None
+
+    def _post(self, kind: str, payload: dict):
+        request = urllib.request.Request(
+            f"{self.endpoint}/v1/{kind}",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json", **self.headers},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def _resource(self) -> dict:
+        return {"attributes": _otlp_attributes({"service.name": self.service_name})}
+
+    def on_span(self, span):
+        start_ns = int(span.start * 1e9)
+        record = {
+            "traceId": f"{span.trace_id:032x}",
+            "spanId": f"{span.span_id:016x}",
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(span.duration * 1e9)),
+            "attributes": _otlp_attributes(span.attrs),
+        }
+        if span.parent_id is not None:
+            record["parentSpanId"] = f"{span.parent_id:016x}"
+        if "error" in span.attrs:
+            record["status"] = {"code": 2, "message": str(span.attrs["error"])}  # STATUS_CODE_ERROR
+        with self._lock:
+            self._spans.append(record)
+            if len(self._spans) < self.batch_size:
+                return
+            batch, self._spans = self._spans, []
+        self._send_spans(batch)
+
+    def on_count(self, name: str, value: float, attrs: dict):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._export_loop, name="bulus-otlp", daemon=True)
+                self._worker.start()
+
+    def _export_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                kind, payload, size = item
+                try:
+                    self.export(kind, payload)
+                except Exception:
+                    with self._lock:
+                        self.dropped += size
+            finally:
+                self._queue.task_done()
+
+    def _send(self, kind: str, payload: dict, size: int):
+        """Ставит пачку в очередь фонового потока; полная очередь — пачка отбрасывается."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((kind, payload, size))
+        except queue.Full:
+            with self._lock:
+                self.dropped += size
+
+    def _send_spans(self, batch: list):
+        payload = {
+            "resourceSpans": [
+                {"resource": self._resource(), "scopeSpans": [{"scope": {"name": "bulus"}, "spans": batch}]}
+            ]
+        }
+        self._send("traces", payload, len(batch))
+
+    def _send_metrics(self, counters: dict):
+        now = str(time.time_ns())
+        metrics = [
+            {
+                "name": name,
+                "sum": {
+                    "aggregationTemporality": 2,  # CUMULATIVE
+                    "isMonotonic": True,
+                    "dataPoints": [
+                        {
+                            "startTimeUnixNano": str(self._started_ns),
+                            "timeUnixNano": now,
+                            **({"asInt": str(value)} if isinstance(value, int) else {"asDouble": value}),
+                        }
+                    ],
+                },
+            }
+            for name, value in sorted(counters.items())
+        ]
+        payload = {
+            "resourceMetrics": [
+                {"resource": self._resource(), "scopeMetrics": [{"scope": {"name": "bulus"}, "metrics": metrics}]}
+            ]
+        }
+        self._send("metrics", payload, len(metrics))
+
+    def flush(self):
+        with self._lock:
+            batch, self._spans = self._spans, []
+            counters = dict(self._counters)
+        if batch:
+            self._send_spans(batch)
+        if counters:
+            self._send_metrics(counters)
+        self._ensure_worker()  # поток мог остановиться, не разобрав очередь (гонка с close)
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            worker = self._worker
+        if worker is not None and worker.is_alive():
+            self._queue.put(None)
+            worker.join()
@@ -0,0 +1,162 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Глобальный выключатель: при False span() отдаёт общий no-op, а count()
+# сразу возвращается — инструментированный код платит одну проверку флага
+_enabled = False
+_record_timings = False
+_sinks: tuple = ()
+
+# Текущий спан (родитель для вложенных) и сборщик таймингов шага движка.
+# ContextVar, а не threading.local: async-мозг и задачи asyncio.wait_for
+# наследуют контекст, а потоки пула начинают с чистого
+_current: ContextVar = ContextVar("bulus_span", default=None)
+_collector: ContextVar = ContextVar("bulus_step_timings", default=None)
+
+
+class Span:
+    """
+    Замер одного участка: имя, атрибуты, длительность и связь с родителем.
+    Время начала — wall clock (для экспортёров), длительность — perf_counter.
+    """
+
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start", "duration", "_t0", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.duration = 0.0
+
+    def set(self, **attrs):
+        """Дописывает атрибуты (например, число токенов, известное только после вызова)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is None:
+            self.trace_id = random.getrandbits(128)
+            self.parent_id = None
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        self.span_id = random.getrandbits(64)
+        self._token = _current.set(self)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._t0
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        timings = _collector.get()
+        if timings is not None:
+            spans = timings["spans"]
+            spans[self.name] = spans.get(self.name, 0.0) + self.duration * 1000
+        for sink in _sinks:
+            sink.on_span(self)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """Контекстный менеджер замера участка; при выключенной телеметрии — NOOP_SPAN."""
+    if not _enabled:
+        return NOOP_SPAN
+    return Span(name, attrs)
+
+
+def count(name: str, value: float = 1, **attrs):
+    """Счётчик (токены, попадания в кэш, записанные байты); при выключенной телеметрии — no-op."""
+    if not _enabled:
+        return
+    timings = _collector.get()
+    if timings is not None:
+        counts = timings["counts"]
+        counts[name] = counts.get(name, 0) + value
+    for sink in _sinks:
+        sink.on_count(name, value, attrs)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable(*sinks, record_timings: bool = False):
+    """
+    Включает телеметрию с набором sink'ов (см. bulus.telemetry.sinks).
+    record_timings=True — движок дописывает тайминги шагов в журнал рядом
+    с сессией (SideLog "timings"), их показывает вьюер.
+    """
+    global _enabled, _record_timings, _sinks
+    _sinks = tuple(sinks)
+    _record_timings = record_timings
+    _enabled = True
+
+
+def disable():
+    """Выключает телеметрию и закрывает sink'и (буферы сбрасываются, см. Sink.close)."""
+    global _enabled, _record_timings, _sinks
+    sinks, _sinks = _sinks, ()
+    _enabled = _record_timings = False
+    for sink in sinks:
+        sink.close()
+
+
+@contextmanager
+def enabled(*sinks, record_timings: bool = False):
+    """Телеметрия на время блока: `with telemetry.enabled(hist): ...`."""
+    enable(*sinks, record_timings=record_timings)
+    try:
+        yield
+    finally:
+        disable()
+
+
+@contextmanager
+def collect_step():
+    """
+    Собирает спаны и счётчики одного шага движка в dict
+    {"spans": {name: ms}, "counts": {name: value}} (одноимённые суммируются).
+    Без record_timings отдаёт None и ничего не собирает.
+    """
+    if not (_enabled and _record_timings):
+        yield None
+        return
+    timings = {"spans": {}, "counts": {}}
+    token = _collector.set(timings)
+    try:
+        yield timings
+    finally:
+        _collector.reset(token)
+
+
+def merge_timings(*parts: dict | None) -> dict:
+    """Складывает тайминги нескольких шагов (мозг + раннер одного хода)."""
+    merged = {"spans": {}, "counts": {}}
+    for part in parts:
+        if not part:
+            continue
+        for kind in ("spans", "counts"):
+            target = merged[kind]
+            for name, value in part.get(kind, {}).items():
+                target[name] = target.get(name, 0) + value
+    return merged
@@ -0,0 +1,55 @@
+import json
+
+from bulus.core import schemas
+from bulus.core.schemas import Action
+from bulus.engine.loop import pending_to_action, record_pending_action
+from bulus.storage import repository
+from bulus.storage.repository import BulusRepo
+
+
+def test_from_payload_matches_parsed_action():
+    payload = {"state": "ask_age", "memory": {"name": "Ann"}}
+    parsed = Action(tool_name="update", payload_str=json.dumps(payload, ensure_ascii=False), thought="t")
+    built = Action.from_payload("update", payload, "t")
+
+    assert built == parsed
+    assert built.payload == parsed.payload == payload
+
+
+def test_from_payload_runs_the_same_checks_without_mutating_input():
+    payload = {"state": "nowhere", "memory": {"a": 1}}
+    action = Action.from_payload("update", payload, "t")
+    assert "state" not in action.payload and "Invalid state" in action.payload["error"]
+    assert payload == {"state": "nowhere", "memory": {"a": 1}}
+
+    bad_batch = Action.from_payload("batch", {"actions": [{"tool_name": "batch"}]}, "t")
+    assert "error" in bad_batch.payload
+
+
+def test_pending_action_with_stored_payload_str_skips_json(monkeypatch):
+    pending = {"tool_name": "send_message", "payload": {"text": "hi"}, "payload_str": '{"text": "hi"}', "thought": "t"}
+
+    def forbidden(*args, **kwargs):
+        raise AssertionError("JSON round trip on the runner path")
+
+    monkeypatch.setattr(schemas.json, "loads", forbidden)
+    monkeypatch.setattr(schemas.json, "dumps", forbidden)
+    action = pending_to_action(pending)
+    assert action.payload is pending["payload"]
+    assert action.payload_str == '{"text": "hi"}'
+
+
+def test_pending_action_keeps_only_payload_str(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    repo = BulusRepo("p1")
+    doc = repo.load()
+    record_pending_action(repo, doc, Action(tool_name="send_message", payload_str='{"text": "hi"}', thought="t"))
+
+    pending = repo.load_metadata()["pending_action"]
+    assert pending == {"tool_name": "send_message", "payload_str": '{"text": "hi"}', "thought": "t"}
+    assert pending_to_action(pending).payload == {"text": "hi"}
+
+
+def test_pending_action_without_payload_str_still_works():
+    action = pending_to_action({"tool_name": "update", "payload": {"memory": {"x": 1}}, "thought": "t"})
+    assert json.loads(action.payload_str) == {"memory": {"x": 1}}
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import threading
+from functools import partial
+
+from bulus.brain.context import SUMMARY_TOOL, ContextWindow
+from bulus.brain.worker import BrainLimiter, astateless_brain
+from bulus.core.schemas import Action
+from bulus.core.states import AgentState
+from bulus.engine.async_loop import AsyncSessionEngine
+from bulus.storage import repository
+from bulus.storage.repository import BulusRepo
+from tests.utils import make_async_fake_client
+
+
+def make_action(tool_name: str, payload: dict, thought: str) -> Action:
+    return Action(tool_name=tool_name, payload_str=json.dumps(payload, ensure_ascii=False), thought=thought)
+
+
+ICE = [(1715000000, "user_said", "Меня зовут Семен", AgentState.ASK_NAME.value, {}, None)]
+
+
+def test_astateless_brain_returns_parsed_action():
+    fake = make_async_fake_client([make_action("update", {"memory": {"name": "Семен"}}, "Got name")])
+    action = asyncio.run(astateless_brain(ICE, client_override=fake))
+    assert action.tool_name == "update"
+    assert action.payload["memory"] == {"name": "Семен"}
+
+
+def test_limiter_bounds_concurrency():
+    actions = [make_action("send_message", {"text": str(i)}, "hi") for i in range(10)]
+    fake = make_async_fake_client(actions, delay=0.01)
+    limiter = BrainLimiter(max_concurrency=3)
+
+    async def main():
+        return await asyncio.gather(*(astateless_brain(ICE, client_override=fake, limiter=limiter) for _ in range(10)))
+
+    results = asyncio.run(main())
+    assert all(a.tool_name == "send_message" for a in results)
+    assert fake.max_in_flight == 3
+
+
+def test_timeout_returns_error_action():
+    fake = make_async_fake_client([make_action("send_message", {"text": "late"}, "slow")], delay=0.5)
+    action = asyncio.run(astateless_brain(ICE, client_override=fake, timeout=0.01))
+    assert action.tool_name == "error"
+    assert "Timeout" in action.thought
+
+
+def test_async_engine_drives_sessions_in_parallel(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    session_ids = [f"a{i}" for i in range(5)]
+    for sid in session_ids:
+        BulusRepo(sid).save({"metadata": {"session_id": sid, "status": "need_brain"}, "history": []})
+
+    actions = [make_action("update", {"state": "ask_name"}, "ask") for _ in session_ids]
+    fake = make_async_fake_client(actions, delay=0.01)
+
+    async def brain(history):
+        return await astateless_brain(history, client_override=fake)
+
+    engine = AsyncSessionEngine(brain=brain, repo_factory=BulusRepo, limiter=BrainLimiter(max_concurrency=5))
+    docs = asyncio.run(engine.run(session_ids))
+
+    assert fake.max_in_flight == 5
+    for sid in session_ids:
+        assert docs[sid]["metadata"]["status"] == "still"
+        assert docs[sid]["history"][-1][3] == AgentState.ASK_NAME.value
+
+
+def test_same_limiter_in_engine_and_brain_does_not_deadlock(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    session_ids = [f"l{i}" for i in range(4)]
+    for sid in session_ids:
+        BulusRepo(sid).save({"metadata": {"session_id": sid, "status": "need_brain"}, "history": []})
+
+    limiter = BrainLimiter(max_concurrency=2, timeout=5)
+    actions = [make_action("update", {"state": "ask_name"}, "ask") for _ in session_ids]
+    fake = make_async_fake_client(actions, delay=0.01)
+
+    async def brain(history):
+        return await astateless_brain(history, client_override=fake, limiter=limiter)
+
+    engine = AsyncSessionEngine(brain=brain, repo_factory=BulusRepo, limiter=limiter)
+    docs = asyncio.run(asyncio.wait_for(engine.run(session_ids), 10))
+
+    assert fake.max_in_flight == 2
+    assert all(doc["history"][-1][3] == AgentState.ASK_NAME.value for doc in docs.values())
+
+
+def test_async_engine_folds_history_with_context_window(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    ice = [(i, "user_said", f"message {i}", AgentState.ASK_NAME.value, {}, None) for i in range(200)]
+    BulusRepo("long").save({"metadata": {"session_id": "long", "status": "need_brain"}, "history": ice})
+    fake = make_async_fake_client([make_action("update", {"state": "ask_name"}, "ask")])
+    context = ContextWindow(token_budget=100)
+
+    engine = AsyncSessionEngine(
+        brain=partial(astateless_brain, client_override=fake), repo_factory=BulusRepo, context=context
+    )
+    asyncio.run(engine.run(["long"]))
+
+    history = BulusRepo("long").load()["history"]
+    assert history[200][1] == SUMMARY_TOOL and history[201][1] == "update"
+    assert engine.brain.keywords["prompt_builder"] is context
+
+
+def test_async_engine_keeps_storage_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    threads = []
+
+    class RecordingRepo(BulusRepo):
+        def load_metadata(self):
+            threads.append(threading.current_thread())
+            return super().load_metadata()
+
+        def commit(self, *args, **kwargs):
+            threads.append(threading.current_thread())
+            return super().commit(*args, **kwargs)
+
+    RecordingRepo("off").save({"metadata": {"session_id": "off", "status": "need_brain"}, "history": []})
+    fake = make_async_fake_client([make_action("update", {"state": "ask_name"}, "ask")])
+    engine = AsyncSessionEngine(brain=partial(astateless_brain, client_override=fake), repo_factory=RecordingRepo)
+    doc = asyncio.run(engine.run(["off"]))["off"]
+
+    assert doc["metadata"]["status"] == "still"
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,91 @@
+import json
+import threading
+import time
+
+import pytest
+
+from bulus.core.schemas import Action
+from bulus.runner.registry import SideEffect, ToolRegistry
+from bulus.runner.tools import apply_update
+from bulus.runner.worker import imperative_runner, run_actions
+
+ICE = [(1715000000, "user_said", "hi", "hello", {"name": "Alice"}, None)]
+
+
+def make_batch(*items) -> Action:
+    actions = [{"tool_name": name, "payload": payload} for name, payload in items]
+    return Action(tool_name="batch", payload_str=json.dumps({"actions": actions}), thought="fan out")
+
+
+@pytest.fixture
+def slow_registry():
+    reg = ToolRegistry()
+    barrier = threading.Barrier(3, timeout=2)
+
+    @reg.tool("lookup", schema="Lookup. Args: {'key': str}", effect=SideEffect.IDEMPOTENT)
+    def lookup(state, storage, payload, thought):
+        barrier.wait()  # deadlocks (times out) unless all three lookups run at the same time
+        time.sleep(0.01 * (3 - int(payload["key"])))  # finish in reverse order
+        return state, {**storage, f"result_{payload['key']}": payload["key"]}
+
+    @reg.tool("update", effect=SideEffect.PURE)
+    def update(state, storage, payload, thought):
+        return apply_update(state, storage, payload)
+
+    return reg
+
+
+def test_independent_tools_run_concurrently_in_deterministic_order(slow_registry):
+    batch = make_batch(("lookup", {"key": "1"}), ("lookup", {"key": "2"}), ("lookup", {"key": "3"}))
+    entries = run_actions(ICE, batch, tool_registry=slow_registry)
+
+    assert [e[2]["key"] for e in entries] == ["1", "2", "3"]
+    assert entries[0][4] == {"name": "Alice", "result_1": "1"}
+    assert entries[-1][4] == {"name": "Alice", "result_1": "1", "result_2": "2", "result_3": "3"}
+    assert all(e[5] == "fan out" for e in entries)
+
+
+def test_pure_tools_are_barriers(slow_registry):
+    batch = make_batch(
+        ("update", {"state": "ask_age", "memory": {"age": 30}}),
+        ("lookup", {"key": "1"}),
+        ("lookup", {"key": "2"}),
+        ("lookup", {"key": "3"}),
+        ("update", {"memory": {"age": None}}),
+    )
+    entries = run_actions(ICE, batch, tool_registry=slow_registry)
+
+    assert [e[1] for e in entries] == ["update", "lookup", "lookup", "lookup", "update"]
+    assert entries[1][3] == "ask_age" and entries[1][4]["age"] == 30
+    assert "age" not in entries[-1][4] and entries[-1][4]["result_3"] == "3"
+
+
+def test_single_action_and_invalid_batch():
+    single = Action(tool_name="update", payload_str='{"state": "ask_age"}', thought="t")
+    assert [e[3] for e in run_actions(ICE, single)] == ["ask_age"]
+
+    broken = Action(tool_name="batch", payload_str='{"actions": "nope"}', thought="t")
+    entries = run_actions(ICE, broken)
+    assert len(entries) == 1 and "error" in entries[0][2]
+
+
+def test_imperative_runner_accepts_batches():
+    entry = imperative_runner(ICE, make_batch(("update", {"state": "ask_age"}), ("update", {"memory": {"age": 30}})))
+    assert entry[1] == "update" and entry[3] == "ask_age" and entry[4] == {"name": "Alice", "age": 30}
+
+
+def test_external_tools_run_sequentially_in_batch_order():
+    reg = ToolRegistry()
+    sent = []
+
+    @reg.tool("send_message", effect=SideEffect.EXTERNAL)
+    def send_message(state, storage, payload, thought):
+        time.sleep(0.01 * (3 - int(payload["text"])))  # the first message is the slowest to send
+        sent.append(payload["text"])
+        return state, storage
+
+    batch = make_batch(*[("send_message", {"text": str(i)}) for i in range(3)])
+    entries = run_actions(ICE, batch, tool_registry=reg)
+
+    assert sent == ["0", "1", "2"]
+    assert [e[2]["text"] for e in entries] == ["0", "1", "2"]
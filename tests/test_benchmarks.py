@@ -0,0 +1,68 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BENCH_DIR = Path(__file__).resolve().parents[1] / "benchmarks"
+
+
+@pytest.fixture
+def bench(monkeypatch):
+    monkeypatch.syspath_prepend(str(BENCH_DIR))
+    import run
+
+    return run
+
+
+def test_threshold_checks(bench):
+    results = [
+        {"key": "a[n=10]", "value": 10.0, "unit": "us"},
+        {"key": "a[n=1000]", "value": 50.0, "unit": "us"},
+        {"key": "t", "value": 100.0, "unit": "turns/s"},
+    ]
+    thresholds = {
+        "max": {"a[n=10]": 20},
+        "min": {"t": 200},
+        "ratio": [{"num": "a[n=1000]", "den": "a[n=10]", "max": 4}, {"num": "b[n=1]", "den": "a[n=10]", "max": 1}],
+    }
+    statuses = [c["status"] for c in bench.check_thresholds(results, thresholds)]
+    assert statuses == ["ok", "fail", "fail", "skipped"]
+
+    baseline = [{"key": "a[n=10]", "value": 5.0}, {"key": "t", "value": 110.0}]
+    checks = bench.compare_baseline(results, baseline, tolerance=0.5)
+    assert [c["status"] for c in checks] == ["fail", "ok"]
+
+
+def test_action_suite_keys_are_slugs(bench, monkeypatch):
+    monkeypatch.setattr(
+        bench.bench_action,
+        "run",
+        lambda n: [
+            {"case": "single, old record", "after_us": 1.0, "speedup": 2.0},
+            {"case": "batch x3", "after_us": 1.0, "speedup": 2.0},
+        ],
+    )
+    keys = [r["key"] for r in bench._action_suite(quick=True)]
+    assert keys == [
+        "action.pending_to_action[case=single_old_record]",
+        "action.speedup[case=single_old_record]",
+        "action.pending_to_action[case=batch_x3]",
+        "action.speedup[case=batch_x3]",
+    ]
+
+
+def test_quick_run_writes_results(tmp_path):
+    output = tmp_path / "results.json"
+    proc = subprocess.run(
+        [sys.executable, str(BENCH_DIR / "run.py"), "--quick", "--suite", "update", "--output", str(output)],
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    report = json.loads(output.read_text(encoding="utf-8"))
+    keys = {r["key"] for r in report["results"]}
+    assert "runner.apply_update[case=state_only,keys=100000]" in keys
+    assert any(c["status"] == "ok" for c in report["checks"])
@@ -0,0 +1,60 @@
+import json
+import time
+
+from bulus.brain import cache as cache_module
+from bulus.brain import worker as brain_worker
+from bulus.brain.cache import BrainCache
+from bulus.core.schemas import Action
+from bulus.core.states import AgentState
+from tests.utils import make_fake_client
+
+ICE = [
+    (1715000000, "send_message", {"text": "Как тебя зовут?"}, AgentState.ASK_NAME.value, {}, "Start"),
+    (1715000001, "user_said", "Меня зовут Семен", AgentState.ASK_NAME.value, {}, None),
+]
+
+
+def make_action(tool_name: str, payload: dict, thought: str) -> Action:
+    return Action(tool_name=tool_name, payload_str=json.dumps(payload, ensure_ascii=False), thought=thought)
+
+
+def test_identical_prompt_hits_cache(tmp_path):
+    cache = BrainCache(directory=tmp_path)
+    fake = make_fake_client([make_action("update", {"state": "ask_age", "memory": {"name": "Семен"}}, "Got name")])
+
+    first = brain_worker.stateless_brain(ICE, client_override=fake, cache=cache)
+    # The fake queue is empty now: a second LLM call would raise and return an error Action
+    second = brain_worker.stateless_brain(list(ICE), client_override=fake, cache=cache)
+
+    assert second.tool_name == "update"
+    assert second.payload == first.payload
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_disk_store_survives_new_instance_and_works_without_client(tmp_path, monkeypatch):
+    fake = make_fake_client([make_action("send_message", {"text": "Привет"}, "Greet")])
+    brain_worker.stateless_brain(ICE, client_override=fake, cache=BrainCache(directory=tmp_path))
+
+    monkeypatch.setattr(brain_worker, "client", None)
+    cache = BrainCache(directory=tmp_path)
+    action = brain_worker.stateless_brain(ICE, cache=cache)
+    assert action.tool_name == "send_message"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_lru_eviction_ttl_and_errors_not_cached(tmp_path, monkeypatch):
+    cache = BrainCache(max_entries=2, directory=None)
+    for i in range(3):
+        cache.put(f"k{i}", make_action("send_message", {"text": str(i)}, "t"))
+    assert cache.get("k0") is None
+    assert cache.get("k2").payload == {"text": "2"}
+
+    cache.put("err", Action(tool_name="error", payload_str="{}", thought="LLM Error"))
+    assert cache.get("err") is None
+
+    ttl_cache = BrainCache(ttl=10, directory=tmp_path)
+    ttl_cache.put("old", make_action("send_message", {"text": "old"}, "t"))
+    later = time.time() + 60
+    monkeypatch.setattr(cache_module.time, "time", lambda: later)
+    assert ttl_cache.get("old") is None
+    assert ttl_cache.prune() == 1
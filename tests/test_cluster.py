@@ -0,0 +1,214 @@
+import json
+import os
+from collections import Counter
+
+import pytest
+
+from bulus import cli
+from bulus.brain.context import SUMMARY_TOOL, ContextWindow
+from bulus.cli import main
+from bulus.core.schemas import Action
+from bulus.core.states import AgentState
+from bulus.engine.cluster import HashRing, ShardedEngine
+from bulus.engine.loop import user_step
+from bulus.storage import repository
+from bulus.storage.notify import Change, SocketSubscription
+from bulus.storage.repository import BulusRepo
+
+ASK = (AgentState.ASK_NAME.value, AgentState.ASK_AGE.value, AgentState.ASK_OCCUPATION.value)
+TURNS = 3
+
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def fake_brain(history):
+    """Уровень модуля: воркеры получают мозг через pickle. Запоминает pid процесса-воркера."""
+    storage = history[-1][4] if history else {}
+    turn = sum(key.startswith("pid_") for key in storage)
+    payload = {"state": ASK[(turn + 1) % 3], "memory": {f"pid_{turn}": os.getpid()}}
+    return Action(tool_name="update", payload_str=json.dumps(payload), thought=f"turn {turn}")
+
+
+def windowed_brain(history, prompt_builder=None):
+    """Мозг с окном контекста: падает, если движок не передал ему ContextWindow."""
+    assert isinstance(prompt_builder, ContextWindow)
+    assert prompt_builder.select_lines(history)[0].startswith("[SUMMARY]: ")
+    return fake_brain(history)
+
+
+def crashing_brain(history):
+    """Первый вызов убивает процесс-воркер (как OOM), следующие работают как fake_brain."""
+    marker = os.path.join(repository.SESSIONS_DIR, "crashed")
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return fake_brain(history)
+
+
+def raising_brain(history):
+    raise RuntimeError("brain bug")
+
+
+def dying_brain(history):
+    os._exit(1)
+
+
+def brain_pids(session_id: str) -> list:
+    storage = BulusRepo(session_id).load()["history"][-1][4]
+    return [pid for key, pid in storage.items() if key.startswith("pid_")]
+
+
+def create_sessions(n: int) -> list:
+    session_ids = [f"s{i}" for i in range(n)]
+    for sid in session_ids:
+        BulusRepo(sid).save({"metadata": {"session_id": sid, "status": "need_brain"}, "history": []})
+    return session_ids
+
+
+def test_hash_ring_is_stable_balanced_and_consistent():
+    keys = [f"session-{i}" for i in range(4000)]
+    ring = HashRing(4)
+    assert [ring.shard_for(k) for k in keys] == [HashRing(4).shard_for(k) for k in keys]
+
+    load = Counter(ring.shard_for(k) for k in keys)
+    assert set(load) == {0, 1, 2, 3}
+    assert min(load.values()) > 4000 / 4 * 0.6
+
+    # Пятый шард забирает примерно пятую часть сессий, остальные остаются на месте
+    grown = HashRing(5)
+    moved = [k for k in keys if grown.shard_for(k) != ring.shard_for(k)]
+    assert all(grown.shard_for(k) == 4 for k in moved)
+    assert 0.1 < len(moved) / len(keys) < 0.3
+
+
+def test_sessions_stick_to_their_brain_shard(sessions_dir):
+    session_ids = create_sessions(16)
+
+    def user(session_id, doc):
+        if len(brain_pids(session_id)) < TURNS:
+            engine.post_user_message(session_id, "next answer")
+
+    engine = ShardedEngine(brain=fake_brain, backend="json", brain_workers=2, runner_workers=2, on_waiting=user)
+    with engine:
+        engine.submit(session_ids)
+        assert engine.wait_idle(timeout=60)
+
+    assert engine.errors == []
+    assert engine.steps == {"brain": 16 * TURNS, "runner": 16 * TURNS}
+
+    pids_by_shard = {}
+    for sid in session_ids:
+        pids = brain_pids(sid)
+        assert len(pids) == TURNS and len(set(pids)) == 1
+        pids_by_shard.setdefault(engine.shard_for(sid, "need_brain"), set()).update(pids)
+        assert BulusRepo(sid).load_metadata()["status"] == "still"
+    # Каждый шард — один процесс, и у шардов разные процессы
+    assert set(pids_by_shard) == {0, 1}
+    assert all(len(pids) == 1 for pids in pids_by_shard.values())
+    assert pids_by_shard[0] != pids_by_shard[1]
+    assert os.getpid() not in pids_by_shard[0] | pids_by_shard[1]
+
+
+def test_change_notifications_wake_sessions_once(sessions_dir):
+    session_ids = create_sessions(4)
+    with ShardedEngine(brain=fake_brain, backend="json", brain_workers=2) as engine:
+        engine.submit(session_ids)
+        assert engine.wait_idle(timeout=60)
+        assert engine.steps == {"brain": 4, "runner": 4}
+
+        # Эхо уже обработанной записи ничего не будит
+        metadata = BulusRepo("s0").load_metadata()
+        engine.on_change(Change("s0", "need_brain", metadata["version"]))
+        assert engine.wait_idle(timeout=60)
+        assert engine.steps == {"brain": 4, "runner": 4}
+
+        # Реплику записал другой процесс — о ней сообщает уведомление
+        user_step(BulusRepo("s0"), None, "next answer")
+        engine.on_change(Change("s0", "need_brain", metadata["version"] + 1))
+        assert engine.wait_idle(timeout=60)
+    assert engine.steps == {"brain": 5, "runner": 5}
+    assert len(brain_pids("s0")) == 2
+
+
+def test_dead_worker_is_restarted_and_its_steps_requeued(sessions_dir):
+    session_ids = create_sessions(3)
+    with ShardedEngine(brain=crashing_brain, backend="json", brain_workers=1) as engine:
+        engine.submit(session_ids)
+        assert engine.wait_idle(timeout=60)
+    assert engine.errors == []
+    assert engine.steps == {"brain": 3, "runner": 3}
+    assert all(BulusRepo(sid).load_metadata()["status"] == "still" for sid in session_ids)
+
+
+def test_session_that_keeps_killing_workers_fails_instead_of_hanging(sessions_dir):
+    create_sessions(1)
+    with ShardedEngine(brain=dying_brain, backend="json", brain_workers=1) as engine:
+        engine.submit("s0")
+        assert engine.wait_idle(timeout=60)
+    assert [(sid, "died" in error) for sid, error in engine.errors] == [("s0", True)]
+    assert BulusRepo("s0").load_metadata()["status"] == "need_brain"
+
+
+def test_serve_until_idle(sessions_dir, capsys):
+    session_ids = create_sessions(6)
+    code = main(
+        [
+            "serve",
+            "--sessions-dir",
+            str(sessions_dir),
+            "--backend",
+            "json",
+            "--brain",
+            "tests.test_cluster:fake_brain",
+            "--brain-workers",
+            "2",
+            "--until-idle",
+        ]
+    )
+    assert code == 0
+    assert "6 brain steps, 6 runner steps" in capsys.readouterr().out
+    for sid in session_ids:
+        assert BulusRepo(sid).load_metadata()["status"] == "still"
+        assert len(brain_pids(sid)) == 1
+
+
+def test_serve_until_idle_stops_on_failing_and_corrupt_sessions(sessions_dir, capsys):
+    create_sessions(2)
+    (sessions_dir / "broken.json").write_text("{not json", encoding="utf-8")
+    argv = ["serve", "--sessions-dir", str(sessions_dir), "--backend", "json", "--brain-workers", "1"]
+
+    assert main(argv + ["--brain", "tests.test_cluster:raising_brain", "--until-idle"]) == 1
+    # Each session fails once and is not resubmitted by the next pass
+    assert "3 errors" in capsys.readouterr().out
+    assert all(BulusRepo(sid).load_metadata()["status"] == "need_brain" for sid in ("s0", "s1"))
+
+
+def test_serve_with_context_budget_folds_long_sessions(sessions_dir, capsys):
+    ice = [(i, "user_said", f"message {i}", ASK[0], {}, None) for i in range(200)]
+    BulusRepo("long").save({"metadata": {"session_id": "long", "status": "need_brain"}, "history": ice})
+    argv = ["serve", "--sessions-dir", str(sessions_dir), "--backend", "json", "--brain-workers", "1"]
+    argv += ["--brain", "tests.test_cluster:windowed_brain", "--context-budget", "100", "--until-idle"]
+
+    assert main(argv) == 0, capsys.readouterr().out
+    history = BulusRepo("long").load()["history"]
+    assert history[200][1] == SUMMARY_TOOL and history[200][2]["at"] == 200
+
+
+@pytest.mark.parametrize("published, rescan", [("", 1.0), ("socket", 30.0)])
+def test_serve_socket_mode_publishes_and_rescans(sessions_dir, capsys, monkeypatch, published, rescan):
+    monkeypatch.setattr(cli, "NOTIFY_CHANNEL", published)
+    monkeypatch.setenv("BULUS_NOTIFY", published)
+    served = []
+    monkeypatch.setattr(cli, "serve_forever", lambda engine, watcher, every: served.append((watcher, every)))
+    argv = ["serve", "--sessions-dir", str(sessions_dir), "--backend", "sqlite", "--brain-workers", "1"]
+
+    assert main(argv + ["--notify", "auto"]) == 0
+    watcher, every = served[0]
+    # Писатели без BULUS_NOTIFY=socket ничего не публикуют: перескан частый, а не раз в 30 секунд
+    assert isinstance(watcher, SocketSubscription) and every == rescan
+    assert os.environ["BULUS_NOTIFY"] == "socket"
+    assert f"Change notifications: socket, full rescan every {rescan:g}s" in capsys.readouterr().out
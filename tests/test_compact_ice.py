@@ -0,0 +1,91 @@
+import copy
+import json
+
+import pytest
+
+from bulus.core.compact import CompactIce, apply_delta, storage_delta
+from bulus.runner.tools import apply_update
+from bulus.storage import repository
+from bulus.storage.repository import BulusRepo
+
+
+def build_history(turns: int):
+    state, storage = "ask_name", {}
+    history = []
+    for i in range(turns):
+        history.append((i, "user_said", f"msg {i}", state, storage, None))
+        state, storage = apply_update(state, storage, {"memory": {f"k{i % 7}": i, "gone": None}})
+        history.append((i + 0.5, "update", {"memory": {f"k{i % 7}": i}}, state, storage, "t"))
+        history.append((i + 0.7, "send_message", {"text": "ok"}, state, storage, "t"))
+    return history
+
+
+def test_delta_roundtrip():
+    prev = {"a": 1, "b": 2}
+    cur = {"a": 1, "c": 3}
+    delta = storage_delta(prev, cur)
+    assert delta == {"set": {"c": 3}, "unset": ["b"]}
+    assert apply_delta(prev, delta) == cur
+    assert storage_delta(cur, dict(cur)) is None
+
+
+def test_compact_ice_keeps_tuple_shape():
+    history = build_history(50)
+    ice = CompactIce(history, keyframe_every=4)
+
+    assert len(ice) == len(history)
+    assert list(ice) == history
+    assert ice[-1] == history[-1]
+    assert ice[-15:] == history[-15:]
+    assert ice.storage_at(10) == history[10][4]
+    # One delta per memory change (plus the initial snapshot), not one per entry
+    assert len(ice._deltas) == 51
+
+
+def test_unchanged_entries_share_snapshot():
+    ice = CompactIce(build_history(3))
+    assert ice[1][4] is ice[2][4]
+    assert ice[2][4] is ice[3][4]
+
+
+def test_in_place_mutation_between_appends_is_not_lost():
+    storage = {"a": 1}
+    ice = CompactIce()
+    ice.append((0, "update", {}, "s", storage, None))
+    storage["a"] = 2
+    ice.append((1, "update", {}, "s", storage, None))
+
+    assert ice[0][4] == {"a": 1} and ice[1][4] == {"a": 2}
+    # Shared snapshots are read-only; copies and patches are plain dicts
+    with pytest.raises(TypeError):
+        ice[1][4]["a"] = 3
+    assert apply_update("s", ice[1][4], {"memory": {"a": 4}})[1] == {"a": 4}
+    assert type(copy.deepcopy(ice[1][4])) is dict and json.dumps(ice[1][4]) == '{"a": 2}'
+
+
+def test_rows_roundtrip_through_json():
+    history = build_history(20)
+    rows = json.loads(json.dumps(CompactIce(history).to_rows()))
+    restored = CompactIce.from_rows(rows, keyframe_every=3)
+    assert [list(e[:4]) + [e[4]] for e in restored] == [list(e[:4]) + [e[4]] for e in history]
+
+
+def test_apply_update_shares_storage_without_memory_patch():
+    storage = {"name": "Alice"}
+    state, same = apply_update("ask_name", storage, {"state": "ask_age"})
+    assert state == "ask_age" and same is storage
+
+
+def test_repo_compact_mode(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    history = build_history(10)
+    repo = BulusRepo("compact", compact=True)
+    repo.save({"metadata": {"session_id": "compact", "status": "still"}, "history": history})
+
+    raw = json.loads((tmp_path / "compact.json").read_text(encoding="utf-8"))
+    assert "history" not in raw and len(raw["ice_delta"]) == len(history)
+
+    doc = repo.load()
+    assert isinstance(doc["history"], CompactIce)
+    assert doc["history"][-1][4] == history[-1][4]
+    assert BulusRepo("compact").load()["history"][5][4] == history[5][4]
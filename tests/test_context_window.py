@@ -0,0 +1,115 @@
+import functools
+import json
+
+from bulus.brain import worker as brain_worker
+from bulus.brain.context import SUMMARY_TOOL, ContextWindow
+from bulus.brain.prompts import estimate_tokens
+from bulus.core.schemas import Action
+from bulus.engine.loop import brain_step, load_recent
+from bulus.storage import repository
+from bulus.storage.repository import BulusRepo
+from tests.utils import make_fake_client
+
+
+def long_session(turns: int):
+    ice = [(0, "update", {"state": "ask_name"}, "ask_name", {}, "start")]
+    for i in range(turns):
+        ice.append((i, "user_said", f"user message number {i}", "ask_name", {}, None))
+        ice.append((i + 0.5, "send_message", {"text": f"agent reply number {i}"}, "ask_name", {}, "t"))
+    return ice
+
+
+def test_budget_is_respected_and_transition_pinned():
+    ice = long_session(300)
+    window = ContextWindow(token_budget=200)
+    lines = window.select_lines(ice)
+
+    assert lines[0] == "[SYSTEM]: State->ask_name"
+    assert lines[-1] == "[AGENT]: agent reply number 299"
+    assert sum(estimate_tokens(line) for line in lines) <= 200
+
+
+def test_huge_user_message_does_not_blow_the_budget():
+    ice = long_session(10)
+    ice.append((99, "send_message", {"text": "before"}, "ask_name", {}, "t"))
+    ice.append((100, "user_said", "x" * 20000, "ask_name", {}, None))
+    lines = ContextWindow(token_budget=100).select_lines(ice)
+    assert sum(estimate_tokens(line) for line in lines) <= 100
+    # The pinned transition and the head and tail of the oversized message survive
+    assert lines[0] == "[SYSTEM]: State->ask_name"
+    assert lines[-1].startswith("[USER]: xxx") and "chars elided]" in lines[-1] and lines[-1].endswith("xxx")
+
+
+def test_oversized_summary_and_pinned_lines_are_capped():
+    ice = long_session(30)
+    ice.insert(3, (1.7, "update", {"state": "ask_name", "error": "e" * 5000}, "ask_name", {}, "t"))
+    ice.append((10, SUMMARY_TOOL, {"text": "s" * 5000, "covers": [0, 3]}, "ask_name", {}, None))
+    ice.append((11, "user_said", "hi", "ask_name", {}, None))
+    lines = ContextWindow(token_budget=200).select_lines(ice)
+
+    assert lines[0].startswith("[SUMMARY]: ") and "chars elided]" in lines[0]
+    assert lines[1].startswith("[SYSTEM]: State->ask_name") and "chars elided]" in lines[1]
+    assert sum(estimate_tokens(line) for line in lines) <= 200
+    assert lines[-1] == "[USER]: hi"
+
+
+def test_summary_entry_collapses_old_span():
+    ice = long_session(100)
+    window = ContextWindow(token_budget=150, min_summary_span=20)
+
+    summary = window.maybe_summarize(ice)
+    assert summary is not None and summary[1] == SUMMARY_TOOL
+    text = summary[2]["text"]
+    assert text.startswith("U: ") or text.startswith("A: ")
+    assert f"number {summary[2]['covers'][1] // 2 - 1}" in text
+    assert len(text) <= 1200
+    ice.append(summary)
+
+    lines = window.select_lines(ice)
+    assert lines[0].startswith("[SUMMARY]: ")
+    # Immediately after summarizing there is nothing new to collapse
+    assert window.maybe_summarize(ice) is None
+
+
+def test_brain_step_persists_summary_for_deterministic_replay(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    repo = BulusRepo("long")
+    repo.save({"metadata": {"session_id": "long", "status": "need_brain"}, "history": long_session(60)})
+
+    window = ContextWindow(token_budget=150, min_summary_span=20)
+    fake = make_fake_client([Action(tool_name="send_message", payload_str=json.dumps({"text": "ok"}), thought="t")])
+    brain = functools.partial(brain_worker.stateless_brain, client_override=fake, prompt_builder=window)
+
+    doc = repo.load()
+    brain_step(repo, doc, brain=brain, context=window)
+
+    saved = repo.load()
+    assert saved["history"][-1][1] == SUMMARY_TOOL
+    assert saved["metadata"]["status"] == "need_runner"
+
+
+def test_tail_loaded_steps_summarize_like_the_full_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    repo = BulusRepo("tail")
+    repo.save({"metadata": {"session_id": "tail", "status": "need_brain"}, "history": long_session(60)})
+    window = ContextWindow(token_budget=150, min_summary_span=20)
+    brain = functools.partial(brain_worker.stateless_brain, prompt_builder=window)
+
+    for turn in range(2):
+        full = repo.load()["history"]
+        doc = load_recent(repo, context=window)
+        # The first step has no summary to start from and reads everything, later ones only a tail
+        assert (len(doc["history"]) == len(full)) == (turn == 0)
+        assert window.select_lines(doc["history"]) == window.select_lines(full)
+        expected = window.maybe_summarize(full)
+
+        action = Action(tool_name="send_message", payload_str=json.dumps({"text": "ok"}), thought="t")
+        fake = make_fake_client([action])
+        brain_step(repo, doc, brain=functools.partial(brain, client_override=fake), context=window)
+        summary = repo.load()["history"][-1]
+        assert summary[1] == SUMMARY_TOOL and summary[2]["covers"] == expected[2]["covers"]
+        assert summary[2]["at"] == len(full) and summary[2]["text"] == expected[2]["text"]
+
+        for i in range(60):
+            repo.append((1000 + i, "user_said", f"later message {i}", "ask_name", {}, None))
+        repo.update_status("need_brain")
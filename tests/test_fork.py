@@ -0,0 +1,84 @@
+import json
+import threading
+
+from bulus.core.schemas import Action
+from bulus.core.states import AgentState
+from bulus.engine.fork import ERROR, MAX_DEPTH, WAITING, ForkExplorer, Variant
+from bulus.runner.registry import SideEffect
+from bulus.runner.tools import registry
+
+PREFIX = [
+    (1, "send_message", {"text": "Hi! What's your name?"}, AgentState.ASK_NAME.value, {}, "greet"),
+    (2, "user_said", "I am Bob", AgentState.ASK_NAME.value, {}, None),
+    (3, "update", {"state": "ask_age", "memory": {"name": "Bob"}}, AgentState.ASK_AGE.value, {"name": "Bob"}, "save"),
+    (4, "user_said", "I am 30", AgentState.ASK_AGE.value, {"name": "Bob"}, None),
+]
+
+
+def echo_brain(history):
+    """Кладёт последнюю реплику юзера в память и идёт к следующему вопросу."""
+    text = history[-1][2]
+    if text == "boom":
+        return Action(tool_name="error", payload_str="{}", thought="LLM Error: boom")
+    payload = {"state": AgentState.ASK_OCCUPATION.value, "memory": {"age": text}}
+    return Action(tool_name="update", payload_str=json.dumps(payload), thought="save age")
+
+
+def test_branches_share_prefix_and_diverge():
+    variants = [Variant.user_said("I am 30"), Variant.user_said("I am 99", label="old"), Variant.user_said("boom")]
+    tree = ForkExplorer(brain=echo_brain, max_workers=3).explore(PREFIX, 3, variants)
+
+    assert [b.label for b in tree.branches] == ["I am 30", "old", "boom"]
+    assert tree["old"].ledger[-1][4] == {"name": "Bob", "age": "I am 99"}
+    assert tree["I am 30"].stop_reason == WAITING
+    assert tree["boom"].stop_reason == ERROR and tree["boom"].error == "LLM Error: boom"
+
+    # Префикс общий: ветки — форки одного root, сам root не меняется
+    assert all(b.ledger._parent is tree.root for b in tree.branches)
+    assert len(tree.root) == len(PREFIX)
+    assert tree.branches[0].ledger[2][2] == PREFIX[2][2]
+
+    data = json.loads(json.dumps(tree.to_dict()))
+    assert len(data["prefix"]) == 3
+    assert [e[1] for e in data["branches"][1]["entries"]] == ["user_said", "update"]
+    assert data["branches"][1]["final_state"] == AgentState.ASK_OCCUPATION.value
+
+
+def test_branches_run_in_parallel():
+    barrier = threading.Barrier(4, timeout=5)
+
+    def waiting_brain(history):
+        barrier.wait()  # упадёт по таймауту, если ветки идут последовательно
+        return echo_brain(history)
+
+    variants = [Variant.user_said(f"I am {age}") for age in (20, 30, 40, 50)]
+    tree = ForkExplorer(brain=waiting_brain, max_workers=4).explore(PREFIX, 3, variants)
+    assert all(b.stop_reason == WAITING for b in tree.branches)
+
+
+def test_tool_output_variant_and_max_depth():
+    def chatty_brain(history):
+        return Action(tool_name="send_message", payload_str='{"text": "hmm"}', thought="stall")
+
+    variant = Variant.tool_output("test_ping", {"status": "down"}, state=AgentState.CALL_PING.value)
+    tree = ForkExplorer(brain=chatty_brain, max_depth=3).explore(PREFIX, -1, [variant])
+
+    branch = tree.branches[0]
+    assert branch.stop_reason == MAX_DEPTH
+    assert branch.steps == 3
+    entries = branch.new_entries()
+    assert entries[0][1:4] == ("test_ping", {"status": "down"}, AgentState.CALL_PING.value)
+    assert [e[1] for e in entries[1:]] == ["send_message"] * 3
+
+
+def test_dry_run_registry_skips_external_effects(capsys):
+    sandbox = registry.dry_run()
+    assert set(spec.name for spec in sandbox) == set(spec.name for spec in registry)
+
+    state, storage = sandbox.get("send_message").handler("hello", {}, {"text": "hi"}, "t")
+    assert (state, storage) == ("hello", {})
+    assert capsys.readouterr().out == ""
+
+    update = sandbox.get("update")
+    assert update.effect is SideEffect.PURE
+    assert update.handler("hello", {}, {"state": "ask_age"}, "t") == ("ask_age", {})
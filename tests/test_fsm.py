@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from bulus.brain import prompts
+from bulus.core.fsm import FSM, StateSpec
+from bulus.core.schemas import Action
+from bulus.core.states import AGENT_FSM, WAITING_STATES, AgentState
+from bulus.runner.registry import SideEffect, ToolRegistry
+from bulus.runner.tools import apply_update
+from bulus.runner.worker import imperative_runner, run_actions
+
+
+def make_action(tool_name: str, payload: dict) -> Action:
+    return Action(tool_name=tool_name, payload_str=json.dumps(payload), thought="t")
+
+
+def test_spec_is_compiled_into_frozen_tables():
+    assert AGENT_FSM.states == frozenset(s.value for s in AgentState)
+    assert sorted(WAITING_STATES) == ["ask_age", "ask_name", "ask_occupation"]
+    assert sorted(AGENT_FSM.terminal) == ["call_ping"]
+    assert isinstance(AGENT_FSM.transitions["hello"], frozenset)
+    assert AGENT_FSM.next_states("ask_age") == ("ask_name", "ask_age", "ask_occupation", "call_ping")
+    assert AGENT_FSM.next_states("call_ping") == ("call_ping",)
+    # Незнакомый стейт (старые сессии) — можно в любой
+    assert AGENT_FSM.next_states("legacy") == AGENT_FSM.order
+
+
+@pytest.mark.parametrize(
+    "specs, message",
+    [
+        ([StateSpec("a"), StateSpec("a")], "Duplicate"),
+        ([StateSpec("a", transitions=("b",))], "undeclared"),
+        ([StateSpec("a", transitions=("a",), terminal=True)], "Terminal"),
+        ([StateSpec("b")], "Initial"),
+    ],
+)
+def test_invalid_spec_is_rejected(specs, message):
+    with pytest.raises(ValueError, match=message):
+        FSM(specs, initial="a")
+
+
+def test_check_transition():
+    full = {"name": "A", "age": 1, "occupation": "x"}
+    assert AGENT_FSM.check_transition("ask_name", "ask_age", {}) is None
+    assert AGENT_FSM.check_transition("call_ping", "call_ping", {}) is None
+    assert "Invalid state" in AGENT_FSM.check_transition("ask_name", "nowhere", {})
+    assert "Illegal transition" in AGENT_FSM.check_transition("call_ping", "ask_name", full)
+    assert "requires memory keys: ['occupation']" in AGENT_FSM.check_transition(
+        "ask_age", "call_ping", {"name": 1, "age": 2}
+    )
+    assert AGENT_FSM.check_transition("ask_occupation", "call_ping", full) is None
+
+
+def test_runner_rejects_illegal_transition_but_keeps_memory():
+    ice = [(1, "user_said", "I'm Ann", "ask_name", {}, None)]
+    entry = imperative_runner(ice, make_action("update", {"state": "call_ping", "memory": {"name": "Ann"}}))
+
+    assert entry[3] == "ask_name"
+    assert entry[4] == {"name": "Ann"}
+    assert "state" not in entry[2] and "requires memory keys" in entry[2]["error"]
+    assert "Rejected" in prompts.render_entry(entry[1], entry[2])
+
+    # apply_update сам по себе FSM не проверяет — это делает раннер
+    assert apply_update("call_ping", {}, {"state": "ask_name"})[0] == "ask_name"
+
+
+def test_concurrent_tools_are_guarded_too():
+    tools = ToolRegistry()
+
+    @tools.tool("jump", effect=SideEffect.EXTERNAL)
+    def jump(state, storage, payload, thought):
+        return payload["to"], storage
+
+    batch = make_action("batch", {"actions": [{"tool_name": "jump", "payload": {"to": "hello"}}] * 2})
+    entries = run_actions([(1, "user_said", "hi", "call_ping", {}, None)], batch, tools)
+    assert [e[3] for e in entries] == ["call_ping", "call_ping"]
+    assert all("Illegal transition" in e[2]["error"] for e in entries)
+
+
+def test_prompt_lists_only_legal_next_states():
+    terminal = prompts.get_system_prompt("call_ping", {})
+    assert 'Valid States: ["call_ping"]' in terminal and "ask_name" not in terminal
+
+    asking = prompts.get_system_prompt("ask_name", {})
+    assert '"hello"' not in asking
+    assert 'State Requirements (memory keys): {"call_ping": ["age", "name", "occupation"]}' in asking
+    assert AGENT_FSM.prompt_states("ask_name") is AGENT_FSM.prompt_states("ask_name")
@@ -0,0 +1,55 @@
+from bulus.core.ledger import Ledger
+from bulus.runner.tools import apply_update
+
+
+def build_entries(turns: int, start: int = 0):
+    state, storage = "ask_name", {}
+    entries = []
+    for i in range(start, start + turns):
+        state, storage = apply_update(state, storage, {"memory": {"turn": i}})
+        entries.append((float(i), "update", {"memory": {"turn": i}}, state, storage, f"turn {i}"))
+    return entries
+
+
+def test_ledger_behaves_like_ice_list():
+    entries = build_entries(100)
+    ledger = Ledger(entries, checkpoint_every=8)
+
+    assert len(ledger) == 100
+    assert ledger[-1] == entries[-1]
+    assert ledger[-15:] == entries[-15:]
+    assert ledger.at(42) == entries[42]
+    assert ledger.state_at(42) == ("ask_name", {"turn": 42})
+
+
+def test_fork_shares_prefix_and_is_copy_on_write():
+    root = Ledger(build_entries(10))
+    branch = root.fork(5)
+
+    assert len(branch) == 5
+    assert branch._tail._rows == []  # the shared prefix is not copied
+
+    alt = (99.0, "user_said", "alternative", "ask_name", {"turn": 4}, None)
+    branch.append(alt)
+    assert branch[5] == alt
+    assert len(root) == 10 and root[5][1] == "update"
+
+    root.append((100.0, "user_said", "late", "ask_name", {"turn": 9}, None))
+    assert len(branch) == 6
+
+
+def test_nested_forks_and_replay():
+    root = Ledger(build_entries(10))
+    a = root.fork(8)
+    a.extend(build_entries(4, start=100))
+    b = a.fork(10)
+    b.append((7.0, "user_said", "b", "ask_name", {}, None))
+
+    assert b.depth == 2
+    assert [e[0] for e in b.replay_from(6)] == [6.0, 7.0, 100.0, 101.0, 7.0]
+    assert list(b) == list(root)[:8] + list(a)[8:10] + [b[-1]]
+
+    # Forking inside the parent prefix jumps to the parent instead of growing the chain
+    c = b.fork(3)
+    assert c.depth == 1
+    assert list(c) == list(root)[:3]
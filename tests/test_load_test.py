@@ -0,0 +1,41 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "load_test.py"
+
+
+def test_load_test_smoke(tmp_path):
+    proc = subprocess.run(
+        [
+            sys.executable,
+            str(SCRIPT),
+            "--sessions",
+            "8",
+            "--rate",
+            "500",
+            "--turns",
+            "2",
+            "--think",
+            "const:0.001",
+            "--brain-latency",
+            "uniform:0,0.002",
+            "--backend",
+            "log",
+            "--sessions-dir",
+            str(tmp_path / "sessions"),
+            "--json",
+        ],
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr
+    report = json.loads(proc.stdout)
+    assert report["sessions"]["completed"] == 8
+    assert report["turns"] >= 16
+    assert set(report["turn_latency_ms"]) >= {"p50", "p95", "p99"}
+    assert report["storage"]["bytes_written"] > 0
+    assert "storage.append" in report["spans_ms"]
+    assert report["errors"] == []
@@ -0,0 +1,164 @@
+import asyncio
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from bulus.core.schemas import Action
+from bulus.core.states import AgentState
+from bulus.engine.async_loop import AsyncSessionEngine
+from bulus.storage import BACKENDS, notify, open_repo, repository
+from bulus.storage.notify import AsyncioChannel, Change, SocketChannel
+from bulus.storage.repository import BulusRepo
+from bulus.storage.watch import InotifyWatcher, inotify_available
+
+ENTRY = (1715000000.0, "user_said", "hi", AgentState.ASK_NAME.value, {}, None)
+
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    return tmp_path
+
+
+class Recorder:
+    def __init__(self):
+        self.changes = []
+
+    def publish(self, change):
+        self.changes.append(change)
+
+
+@pytest.fixture
+def channel():
+    def add(ch):
+        notify.add_channel(ch)
+        added.append(ch)
+        return ch
+
+    added = []
+    yield add
+    for ch in added:
+        notify.remove_channel(ch)
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_every_write_is_published(sessions_dir, channel, backend):
+    recorder = channel(Recorder())
+    repo = open_repo("s1", backend)
+    repo.save({"metadata": {"session_id": "s1", "status": "need_brain"}, "history": []})
+    repo.append(ENTRY, status="need_brain")
+    metadata = repo.load_metadata()
+    metadata["status"] = "need_runner"
+    repo.commit([], metadata, expected_version=metadata["version"])
+    repo.update_status("still")
+
+    assert recorder.changes == [
+        Change("s1", "need_brain", 1),
+        Change("s1", "need_brain", 2),
+        Change("s1", "need_runner", 3),
+        Change("s1", "still", 4),
+    ]
+
+
+@pytest.mark.parametrize("backend", ["json", "log", "binary"])
+def test_publish_happens_after_the_session_lock_is_released(sessions_dir, channel, backend):
+    locked = []
+
+    class LockProbe:
+        def publish(self, change):
+            with open(sessions_dir / f"{change.session_id}.json.lock", "a") as f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    locked.append(True)
+                else:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                    locked.append(False)
+
+    channel(LockProbe())
+    repo = open_repo("s1", backend)
+    repo.save({"metadata": {"session_id": "s1", "status": "need_brain"}, "history": []})
+    repo.append(ENTRY, status="need_brain")
+    metadata = repo.load_metadata()
+    repo.commit([ENTRY], metadata, expected_version=metadata["version"])
+    repo.update_status("still")
+    # Подписчик, который сразу читает сессию, не ждёт flock писателя
+    assert locked == [False] * 4
+
+
+def test_socket_channel_delivers_across_sockets(sessions_dir, channel):
+    publisher = channel(SocketChannel())
+    with publisher.subscribe() as first, SocketChannel().subscribe() as second:
+        started = time.perf_counter()
+        BulusRepo("s1").update_status("need_brain")
+        assert first.get(timeout=1) == Change("s1", "need_brain", 1)
+        assert time.perf_counter() - started < 0.5
+        assert second.get(timeout=1) == Change("s1", "need_brain", 1)
+        assert first.get(timeout=0.01) is None
+    # Подписки закрыты — их сокеты убраны
+    assert os.listdir(publisher.path()) == []
+
+
+def test_socket_channel_removes_dead_subscribers(sessions_dir):
+    channel = SocketChannel()
+    os.makedirs(channel.path())
+    dead = os.path.join(channel.path(), "dead.sock")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(dead)
+    sock.close()  # файл сокета остался, слушателя нет
+
+    channel.publish(Change("s1", "need_brain", 1))
+    assert not os.path.exists(dead)
+
+
+@pytest.mark.skipif(not inotify_available(), reason="inotify is Linux-only")
+@pytest.mark.parametrize("backend", ["json", "log", "binary"])
+def test_inotify_sees_writes_without_publishers(sessions_dir, backend):
+    repo = open_repo("s1", backend)
+    repo.save({"metadata": {"session_id": "s1", "status": "still"}, "history": [ENTRY]})
+    with InotifyWatcher() as watcher:
+        repo.append(ENTRY, status="need_brain")
+        assert watcher.get(timeout=1) == Change("s1", "need_brain", 2)
+        # Полная перезапись (лог подменяет папку целиком) тоже видна
+        repo.save({"metadata": {"session_id": "s1", "status": "need_runner"}, "history": []})
+        change = watcher.get(timeout=1)
+        while change is not None and change.version < 3:
+            change = watcher.get(timeout=1)
+        assert change == Change("s1", "need_runner", 3)
+        repo.update_status("still")
+        assert watcher.get(timeout=1) == Change("s1", "still", 4)
+
+
+def test_async_engine_drives_sessions_on_notifications(sessions_dir, channel):
+    pubsub = channel(AsyncioChannel())
+    waiting = []
+
+    async def brain(history):
+        payload = {"state": AgentState.ASK_AGE.value, "memory": {"turns": len(history)}}
+        return Action(tool_name="update", payload_str=json.dumps(payload), thought="next")
+
+    engine = AsyncSessionEngine(brain=brain, repo_factory=BulusRepo, on_waiting=lambda sid, doc: waiting.append(sid))
+    for sid in ("s1", "s2"):
+        BulusRepo(sid).save({"metadata": {"session_id": sid, "status": "still"}, "history": [ENTRY]})
+
+    async def main():
+        with pubsub.subscribe() as subscription:
+            watcher = asyncio.create_task(engine.watch(subscription))
+            # Реплику пишет другой поток: движок узнаёт о ней только из уведомления
+            writer = threading.Thread(target=lambda: BulusRepo("s2").append(ENTRY, status="need_brain"))
+            writer.start()
+            while not waiting:
+                await asyncio.sleep(0.001)
+            await asyncio.sleep(0.05)  # эхо собственных записей drive() не должно будить повторно
+            watcher.cancel()
+            writer.join()
+
+    asyncio.run(main())
+    assert waiting == ["s2"]
+    assert BulusRepo("s2").load_metadata()["status"] == "still"
+    assert len(BulusRepo("s1").load()["history"]) == 1
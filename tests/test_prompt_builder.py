@@ -0,0 +1,64 @@
+import json
+
+from bulus.brain import prompts
+from bulus.brain.prompts import PromptBuilder, estimate_tokens
+from bulus.brain.worker import build_messages
+
+
+def make_ice(n: int):
+    ice = []
+    for i in range(n):
+        ice.append((i, "user_said", f"user {i}", "ask_name", {}, None))
+        ice.append((i + 0.5, "send_message", {"text": f"agent {i}"}, "ask_name", {}, "t"))
+    return ice
+
+
+def test_window_by_entries_matches_last_15():
+    ice = make_ice(20)
+    lines = PromptBuilder(window_entries=15).select_lines(ice)
+    assert len(lines) == 15
+    assert lines[-1] == "[AGENT]: agent 19"
+    assert lines[0] == "[AGENT]: agent 12"
+
+
+def test_window_by_token_budget():
+    ice = make_ice(20)
+    ice.append((99, "user_said", "x" * 400, "ask_name", {}, None))
+    builder = PromptBuilder(window_entries=None, token_budget=120)
+    lines = builder.select_lines(ice)
+    assert lines[-1].startswith("[USER]: xxx")
+    assert sum(estimate_tokens(line) for line in lines) <= 120
+    # The newest entry is always kept even if it alone exceeds the budget
+    assert PromptBuilder(window_entries=None, token_budget=10).select_lines(ice) == [f"[USER]: {'x' * 400}"]
+
+
+def test_rendered_lines_are_cached_per_entry(monkeypatch):
+    calls = []
+    original = prompts.render_entry
+
+    def counting_render(tool, payload):
+        calls.append(tool)
+        return original(tool, payload)
+
+    monkeypatch.setattr(prompts, "render_entry", counting_render)
+    ice = make_ice(10)
+    builder = PromptBuilder()
+    builder.render_ice(ice)
+    first = len(calls)
+    ice.append((100, "user_said", "new", "ask_name", {}, None))
+    builder.render_ice(ice)
+    assert len(calls) == first + 1
+
+    # A history re-read from storage has new payload objects but the same entries
+    builder.render_ice(json.loads(json.dumps(ice)))
+    assert len(calls) == first + 1
+
+    ice[-1] = (100, "user_said", "edited", "ask_name", {}, None)
+    assert builder.render_ice(ice).endswith("[USER]: edited")
+
+
+def test_static_prompt_parts_computed_once():
+    prompts.static_prompt_parts.cache_clear()
+    build_messages(make_ice(1))
+    build_messages(make_ice(2))
+    assert prompts.static_prompt_parts.cache_info().misses == 1
@@ -0,0 +1,173 @@
+import json
+
+import pytest
+
+from bulus.cli import main
+from bulus.core.schemas import Action
+from bulus.core.states import AgentState
+from bulus.engine.loop import record_pending_action, runner_step
+from bulus.engine.replay import (
+    MATCH,
+    PAYLOAD,
+    TOOL,
+    ReplayCheckpoint,
+    ReplayEngine,
+    compare_actions,
+    recorded_decisions,
+)
+from bulus.runner.worker import run_actions
+from bulus.storage import discover_sessions, repository
+from bulus.storage.repository import BulusRepo
+from bulus.storage.sidelog import DECISIONS, SideLog
+
+STEPS = [
+    ("name", AgentState.ASK_AGE.value),
+    ("age", AgentState.ASK_OCCUPATION.value),
+    ("occupation", AgentState.CALL_PING.value),
+]
+
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def fake_brain(history):
+    storage = history[-1][4] if history else {}
+    for key, next_state in STEPS:
+        if key not in storage:
+            payload = {"state": next_state, "memory": {key: f"{key}-value"}}
+            return Action(tool_name="update", payload_str=json.dumps(payload), thought=f"save {key}")
+    return Action(tool_name="test_ping", payload_str='{"payload": "ping"}', thought="ping")
+
+
+def drifted_brain(history):
+    action = fake_brain(history)
+    if action.tool_name == "update" and "age" in action.payload["memory"]:
+        return Action(tool_name="send_message", payload_str='{"text": "How old?"}', thought="ask again")
+    return action
+
+
+def record_session(session_id: str, steps: int = 4):
+    history = []
+    for i in range(steps):
+        state, storage = (history[-1][3], history[-1][4]) if history else ("hello", {})
+        history.append((i, "user_said", f"msg {i}", state, storage, None))
+        history.extend(run_actions(history, fake_brain(history)))
+    BulusRepo(session_id).save({"metadata": {"session_id": session_id, "status": "still"}, "history": history})
+
+
+def test_recorded_decisions_groups_batches():
+    batch = {"actions": [{"tool_name": "send_message", "payload": {"text": "a"}}, {"tool_name": "test_ping"}]}
+    history = [(0, "user_said", "hi", "hello", {}, None)]
+    history.extend(run_actions(history, Action(tool_name="batch", payload_str=json.dumps(batch), thought="both")))
+    history.append((9, "user_said", "ok", "hello", {}, None))
+
+    decisions = list(recorded_decisions(history))
+    assert [(i, a.tool_name) for i, a in decisions] == [(1, "batch")]
+    assert [a.tool_name for a in decisions[0][1].sub_actions()] == ["send_message", "test_ping"]
+
+
+def test_recorded_decisions_follow_runner_metadata(sessions_dir):
+    repo = BulusRepo("meta")
+    repo.save(
+        {
+            "metadata": {"session_id": "meta", "status": "need_brain"},
+            "history": [(0, "user_said", "hi", "hello", {}, None)],
+        }
+    )
+    actions = [
+        Action(tool_name="send_message", payload_str='{"text": "a"}', thought="same"),
+        Action(tool_name="send_message", payload_str='{"text": "b"}', thought="same"),
+        Action(tool_name="update", payload_str='{"state": "call_ping"}', thought="same"),
+    ]
+    for action in actions:
+        record_pending_action(repo, repo.load(), action)
+        assert set(repo.load_metadata()["pending_action"]) == {"tool_name", "payload_str", "thought"}
+        runner_step(repo, repo.load())
+
+    doc = repo.load()
+    # Decisions live in a side log, metadata stays small
+    assert "decisions" not in doc["metadata"]
+    # The illegal transition is rewritten by the runner, the decision is not
+    assert "error" in doc["history"][-1][2]
+    decisions = list(recorded_decisions(doc["history"], SideLog("meta", DECISIONS).load()))
+    assert [(i, a.tool_name, a.payload) for i, a in decisions] == [
+        (1, "send_message", {"text": "a"}),
+        (2, "send_message", {"text": "b"}),
+        (3, "update", {"state": "call_ping"}),
+    ]
+    # Without metadata the shared thought merges them into one batch
+    assert [a.tool_name for _, a in recorded_decisions(doc["history"])] == ["batch"]
+
+    report = ReplayEngine(brain=lambda history: actions[len(history) - 1]).run([("meta", "json")])
+    assert report.decisions == 3 and report.divergences == 0
+
+
+def test_compare_actions():
+    update = Action(tool_name="update", payload_str='{"state": "ask_age"}', thought="a")
+    assert compare_actions(update, Action(tool_name="update", payload_str='{"state": "ask_age"}', thought="b")) == MATCH
+    assert compare_actions(update, Action(tool_name="update", payload_str='{"state": "hello"}', thought="a")) == PAYLOAD
+    assert compare_actions(update, Action(tool_name="test_ping", payload_str="{}", thought="a")) == TOOL
+
+
+def test_replay_reports_divergences(sessions_dir):
+    for i in range(5):
+        record_session(f"r{i}")
+
+    report = ReplayEngine(brain=fake_brain, max_workers=4).run()
+    assert report.sessions == 5
+    assert report.decisions == 20
+    assert report.divergences == 0
+
+    report = ReplayEngine(brain=drifted_brain, max_workers=4).run()
+    data = report.to_dict()
+    assert data["divergences"][TOOL] == 5
+    assert data["tool_transitions"] == {"update -> send_message": 5}
+    assert data["samples"][0]["recorded"][1]["memory"] == {"age": "age-value"}
+
+
+def test_checkpoint_resumes_without_recalling_brain(sessions_dir, tmp_path_factory):
+    for i in range(3):
+        record_session(f"c{i}")
+    checkpoint = ReplayCheckpoint(str(tmp_path_factory.mktemp("replay") / "checkpoint.jsonl"))
+
+    seen = []
+    ReplayEngine(brain=fake_brain, checkpoint=checkpoint, on_session=lambda sid, _: seen.append(sid)).run(
+        list(discover_sessions().items())[:2]
+    )
+    assert sorted(seen) == ["c0", "c1"]
+
+    calls = []
+
+    def counting_brain(history):
+        calls.append(len(history))
+        return fake_brain(history)
+
+    report = ReplayEngine(brain=counting_brain, checkpoint=checkpoint).run()
+    assert report.sessions == 3
+    assert report.decisions == 12
+    assert len(calls) == 4  # переиграна только c2
+
+
+def test_cli_replay_writes_report(sessions_dir, tmp_path):
+    record_session("cli")
+    report_path = tmp_path / "report.json"
+
+    code = main(
+        [
+            "replay",
+            "--sessions-dir",
+            str(sessions_dir),
+            "--brain",
+            "tests.test_replay:drifted_brain",
+            "--report",
+            str(report_path),
+            "--fail-on-divergence",
+        ]
+    )
+    assert code == 1
+    data = json.loads(report_path.read_text(encoding="utf-8"))
+    assert data["decisions"] == 4
+    assert data["matched"] == 3
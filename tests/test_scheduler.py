@@ -0,0 +1,150 @@
+import json
+import threading
+
+import pytest
+
+from bulus.brain.context import SUMMARY_TOOL, ContextWindow
+from bulus.brain.prompts import estimate_tokens
+from bulus.core.schemas import Action
+from bulus.core.states import AgentState
+from bulus.engine.scheduler import SessionScheduler
+from bulus.storage import repository
+from bulus.storage.repository import BulusRepo
+
+STEPS = [
+    ("name", AgentState.ASK_AGE.value),
+    ("age", AgentState.ASK_OCCUPATION.value),
+    ("occupation", AgentState.CALL_PING.value),
+]
+
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def fake_brain(history):
+    storage = history[-1][4] if history else {}
+    for key, next_state in STEPS:
+        if key not in storage:
+            payload = {"state": next_state, "memory": {key: f"{key}-value"}}
+            return Action(tool_name="update", payload_str=json.dumps(payload), thought=f"save {key}")
+    return Action(tool_name="test_ping", payload_str='{"payload": "ping"}', thought="ping")
+
+
+def test_drives_many_sessions_until_they_wait_for_user(sessions_dir):
+    session_ids = [f"s{i}" for i in range(20)]
+    for sid in session_ids:
+        BulusRepo(sid).save({"metadata": {"session_id": sid, "status": "need_brain"}, "history": []})
+
+    waiting = []
+    with SessionScheduler(brain=fake_brain, repo_factory=BulusRepo, max_brain_concurrency=3) as scheduler:
+        scheduler.on_waiting = lambda sid, doc: waiting.append(sid)
+        scheduler.submit(session_ids)
+        assert scheduler.wait_idle(timeout=10)
+
+        assert sorted(waiting) == sorted(session_ids)
+        for sid in session_ids:
+            doc = BulusRepo(sid).load()
+            assert doc["metadata"]["status"] == "still"
+            assert doc["history"][-1][3] == AgentState.ASK_AGE.value
+
+        scheduler.post_user_message("s0", "I am 30")
+        assert scheduler.wait_idle(timeout=10)
+        assert BulusRepo("s0").load()["history"][-1][3] == AgentState.ASK_OCCUPATION.value
+    assert scheduler.errors == []
+
+
+def test_brain_concurrency_is_bounded(sessions_dir):
+    lock = threading.Lock()
+    active = {"now": 0, "max": 0}
+
+    def slow_brain(history):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        threading.Event().wait(0.01)
+        with lock:
+            active["now"] -= 1
+        return fake_brain(history)
+
+    session_ids = [f"c{i}" for i in range(12)]
+    for sid in session_ids:
+        BulusRepo(sid).save({"metadata": {"session_id": sid, "status": "need_brain"}, "history": []})
+
+    with SessionScheduler(brain=slow_brain, repo_factory=BulusRepo, max_brain_concurrency=2) as scheduler:
+        scheduler.submit(session_ids)
+        assert scheduler.wait_idle(timeout=10)
+
+    assert active["max"] <= 2
+
+
+def test_user_message_during_brain_step_is_not_lost(sessions_dir):
+    BulusRepo("c1").save({"metadata": {"session_id": "c1", "status": "need_brain"}, "history": []})
+    thinking = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_brain(history):
+        calls.append(len(history))
+        if len(calls) == 1:
+            thinking.set()
+            release.wait(5)
+        return fake_brain(history)
+
+    with SessionScheduler(brain=slow_brain, repo_factory=BulusRepo) as scheduler:
+        scheduler.submit("c1")
+        assert thinking.wait(5)
+        BulusRepo("c1").append((0, "user_said", "hi", "hello", {}, None), status="need_brain")
+        release.set()
+        assert scheduler.wait_idle(timeout=10)
+
+    history = BulusRepo("c1").load()["history"]
+    assert history[0][1] == "user_said"
+    # Первое решение отброшено по ConflictError, мозг подумал заново уже с репликой
+    assert calls[:2] == [0, 1]
+    assert scheduler.errors == []
+
+
+def test_user_reply_from_on_waiting_is_not_lost(sessions_dir):
+    # Реплика приходит, пока шаг сессии ещё не завершён: пробуждение не должно теряться
+    replies = {AgentState.ASK_AGE.value: "I am 30"}
+    session_ids = [f"w{i}" for i in range(8)]
+    for sid in session_ids:
+        BulusRepo(sid).save({"metadata": {"session_id": sid, "status": "need_brain"}, "history": []})
+
+    with SessionScheduler(brain=fake_brain, repo_factory=BulusRepo) as scheduler:
+
+        def reply(sid, doc):
+            text = replies.get(doc["history"][-1][3])
+            if text:
+                scheduler.post_user_message(sid, text)
+
+        scheduler.on_waiting = reply
+        scheduler.submit(session_ids)
+        assert scheduler.wait_idle(timeout=10)
+    assert scheduler.errors == []
+    for sid in session_ids:
+        last = BulusRepo(sid).load()["history"][-1]
+        assert last[3] == AgentState.ASK_OCCUPATION.value and "age" in last[4]
+
+
+def test_context_window_folds_history_and_renders_the_prompt(sessions_dir):
+    ice = [(i, "user_said", f"message {i}", AgentState.ASK_NAME.value, {}, None) for i in range(200)]
+    BulusRepo("long").save({"metadata": {"session_id": "long", "status": "need_brain"}, "history": ice})
+    prompts = []
+
+    def brain(history, prompt_builder=None):
+        prompts.append(prompt_builder.select_lines(history))
+        return fake_brain(history)
+
+    with SessionScheduler(brain=brain, repo_factory=BulusRepo, context=ContextWindow(token_budget=100)) as scheduler:
+        scheduler.submit("long")
+        assert scheduler.wait_idle(timeout=10)
+    assert scheduler.errors == []
+
+    history = BulusRepo("long").load()["history"]
+    assert history[200][1] == SUMMARY_TOOL and history[200][2]["at"] == 200
+    assert prompts[0][0].startswith("[SUMMARY]: ") and prompts[0][-1] == "[USER]: message 199"
+    assert sum(estimate_tokens(line) for line in prompts[0]) <= 100
@@ -0,0 +1,104 @@
+import os
+import threading
+
+import pytest
+
+from bulus.storage import discover_sessions, open_repo, repository
+from bulus.storage.group_commit import GroupCommitter
+from bulus.storage.repository import BulusRepo, ConflictError, CorruptSessionError
+
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def make_entry(i: int):
+    return [1715000000 + i, "user_said", f"message {i}", "ask_name", {"n": i}, None]
+
+
+def test_save_bumps_version_and_leaves_no_tmp_files(sessions_dir):
+    repo = BulusRepo("s1")
+    doc = repo.load()
+    assert doc["metadata"]["version"] == 0
+
+    repo.save(doc)
+    repo.append(make_entry(0))
+    repo.update_status("still")
+
+    assert doc["metadata"]["version"] == 1
+    assert repo.load()["metadata"]["version"] == 3
+    assert not [name for name in os.listdir(sessions_dir) if ".tmp-" in name]
+
+
+def test_lock_files_are_not_sessions(sessions_dir):
+    for backend in ("json", "log", "binary"):
+        open_repo(f"{backend}_s", backend=backend).append(make_entry(0))
+
+    assert sorted(name for name in os.listdir(sessions_dir) if name.endswith(".lock")) == [
+        "binary_s.json.lock",
+        "json_s.json.lock",
+        "log_s.json.lock",
+    ]
+    assert discover_sessions() == {"binary_s": "binary", "json_s": "json", "log_s": "log"}
+
+
+def test_corrupt_file_is_not_replaced_with_empty_session(sessions_dir):
+    repo = BulusRepo("s2")
+    repo.append(make_entry(0))
+    with open(repo.file_path, "w", encoding="utf-8") as f:
+        f.write('{"metadata": {"sess')
+
+    with pytest.raises(CorruptSessionError):
+        repo.load()
+
+
+@pytest.mark.parametrize("backend", ["json", "log", "sqlite"])
+def test_expected_version_conflict(sessions_dir, backend):
+    writer_a = open_repo("s3", backend=backend)
+    writer_b = open_repo("s3", backend=backend)
+    writer_a.append(make_entry(0))
+
+    doc_a = writer_a.load()
+    doc_b = writer_b.load()
+    doc_a["history"].append(make_entry(1))
+    writer_a.save(doc_a, expected_version=doc_a["metadata"]["version"])
+
+    doc_b["metadata"]["status"] = "still"
+    with pytest.raises(ConflictError) as exc:
+        writer_b.save(doc_b, expected_version=doc_b["metadata"]["version"])
+    assert exc.value.actual == doc_a["metadata"]["version"]
+
+    doc = writer_b.load()
+    assert [e[2] for e in doc["history"]] == ["message 0", "message 1"]
+    assert doc["metadata"]["status"] == "need_brain"
+
+
+def test_concurrent_appends_are_not_lost(sessions_dir):
+    threads = [threading.Thread(target=lambda i=i: BulusRepo("s4").append(make_entry(i))) for i in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    doc = BulusRepo("s4").load()
+    assert sorted(e[4]["n"] for e in doc["history"]) == list(range(16))
+    assert doc["metadata"]["version"] == 16
+
+
+def test_group_commit_coalesces_fsyncs(sessions_dir):
+    with GroupCommitter(max_batch=1000, max_delay=10) as committer:
+        repos = [BulusRepo(f"g{i}", committer=committer) for i in range(3)]
+        for _ in range(5):
+            for repo in repos:
+                repo.append(make_entry(0))
+        # Файлы видны сразу, fsync ещё не сделан
+        assert len(repos[0].load()["history"]) == 5
+        assert committer.stats()["pending"] == 3
+        committer.flush()
+
+    stats = committer.stats()
+    assert stats["saves"] == 15
+    assert stats["fsyncs"] == 3
+    assert stats["pending"] == 0
@@ -0,0 +1,121 @@
+import json
+import os
+
+import pytest
+
+from bulus.storage import binary_format, open_repo, repository
+from bulus.storage.binary_format import BinaryIce
+from bulus.storage.binary_repository import BinaryBulusRepo
+from bulus.storage.repository import BulusRepo, CorruptSessionError
+
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def make_entry(i: int, storage=None):
+    storage = storage if storage is not None else {"n": i // 3}
+    return (1715000000.5 + i, "user_said", {"text": f"message {i}"}, "ask_name", storage, f"thought {i}")
+
+
+def test_roundtrip_and_storage_is_written_only_on_change(sessions_dir):
+    repo = BinaryBulusRepo("b1")
+    doc = repo.load()
+    doc["history"] = [make_entry(i) for i in range(9)]
+    repo.save(doc)
+
+    loaded = repo.load()
+    assert loaded["history"] == doc["history"]
+    assert loaded["metadata"]["version"] == 1
+
+    ice = repo.ice()
+    storage_offsets = {ice.storage_offset(i) for i in range(len(ice))}
+    assert len(storage_offsets) == 3
+    # Записи с общим снапшотом получают один и тот же dict
+    assert ice[0][4] is ice[2][4]
+
+
+def test_tail_and_random_access_decode_only_requested_entries(sessions_dir, monkeypatch):
+    repo = BinaryBulusRepo("b2")
+    for i in range(50):
+        repo.append(make_entry(i), status="need_brain")
+
+    decoded = []
+    decode, decode_range = BinaryIce._decode, BinaryIce._decode_range
+    monkeypatch.setattr(BinaryIce, "_decode", lambda self, n: decoded.append(n) or decode(self, n))
+    monkeypatch.setattr(
+        BinaryIce, "_decode_range", lambda self, a, b: decoded.extend(range(a, b)) or decode_range(self, a, b)
+    )
+
+    assert [e[2]["text"] for e in repo.load_tail(3)] == ["message 47", "message 48", "message 49"]
+    assert repo.entry(-1)[4] == {"n": 16}
+    assert repo.entry(10)[0] == make_entry(10)[0]
+    assert sorted(decoded) == [10, 47, 48, 49, 49]
+
+
+def test_append_copies_existing_records_verbatim(sessions_dir):
+    repo = BinaryBulusRepo("b3")
+    repo.append(make_entry(0))
+    with open(repo.bin_path, "rb") as f:
+        before = f.read()
+    records_end = BinaryIce(before).records_end
+
+    repo.append(make_entry(1), status="still")
+    with open(repo.bin_path, "rb") as f:
+        after = f.read()
+
+    assert after[:records_end] == before[:records_end]
+    doc = repo.load()
+    assert len(doc["history"]) == 2
+    assert doc["metadata"]["status"] == "still"
+    assert doc["metadata"]["version"] == 2
+
+
+def test_rewind_rewrites_file(sessions_dir):
+    repo = open_repo("b4", backend="binary")
+    for i in range(5):
+        repo.append(make_entry(i))
+    doc = repo.load()
+    doc["history"] = doc["history"][:2]
+    repo.save(doc, expected_version=doc["metadata"]["version"])
+    assert [e[2]["text"] for e in repo.load()["history"]] == ["message 0", "message 1"]
+
+
+def test_migrates_from_json_and_exports_back(sessions_dir):
+    BulusRepo("b5").save({"metadata": {"session_id": "b5", "status": "still"}, "history": [list(make_entry(0))]})
+    repo = BinaryBulusRepo("b5")
+    repo.append(make_entry(1))
+    assert os.path.exists(repo.bin_path)
+    os.remove(repo.file_path)
+
+    path = repo.export_json()
+    with open(path, encoding="utf-8") as f:
+        exported = json.load(f)
+    assert [e[2]["text"] for e in exported["history"]] == ["message 0", "message 1"]
+    assert exported["metadata"]["status"] == "still"
+    assert BulusRepo("b5").load()["history"][1][4] == {"n": 0}
+
+
+def test_truncated_file_is_reported(sessions_dir):
+    repo = BinaryBulusRepo("b6")
+    repo.append(make_entry(0))
+    with open(repo.bin_path, "r+b") as f:
+        f.truncate(os.path.getsize(repo.bin_path) - 3)
+
+    with pytest.raises(CorruptSessionError):
+        repo.load()
+    with pytest.raises(binary_format.BinaryFormatError):
+        BinaryIce(b"not a session")
+
+
+def test_save_after_rewind_and_regrowth_does_not_reuse_old_records(sessions_dir):
+    repo = open_repo("b7", backend="binary")
+    for i in range(3):
+        repo.append(make_entry(i))
+
+    doc = repo.load()
+    doc["history"] = doc["history"][:1] + [make_entry(10 + i) for i in range(3)]
+    repo.save(doc, expected_version=doc["metadata"]["version"])
+    assert [e[2]["text"] for e in repo.load()["history"]] == ["message 0", "message 10", "message 11", "message 12"]
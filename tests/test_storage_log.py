@@ -0,0 +1,165 @@
+import json
+import os
+
+import pytest
+
+from bulus.storage import log_repository, open_repo, repository
+from bulus.storage.log_repository import LogBulusRepo
+
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def make_entry(i: int):
+    return [1715000000 + i, "user_said", f"message {i}", "ask_name", {"n": i}, None]
+
+
+def test_append_writes_only_new_lines(sessions_dir):
+    repo = LogBulusRepo("s1")
+    for i in range(5):
+        repo.append(make_entry(i), status="need_brain")
+
+    doc = repo.load()
+    assert [e[2] for e in doc["history"]] == [f"message {i}" for i in range(5)]
+    assert doc["metadata"]["status"] == "need_brain"
+
+    with open(repo._segment_path(repo._read_meta(), "000000.jsonl"), encoding="utf-8") as f:
+        assert len(f.readlines()) == 5
+
+
+def test_segment_rotation(sessions_dir):
+    repo = LogBulusRepo("s2", segment_max_bytes=200)
+    for i in range(20):
+        repo.append(make_entry(i))
+
+    meta = repo._read_meta()
+    assert len(meta["segments"]) > 1
+    assert [e[4]["n"] for e in repo.load()["history"]] == list(range(20))
+
+
+def test_uncommitted_tail_is_ignored_and_truncated(sessions_dir):
+    repo = LogBulusRepo("s3")
+    repo.append(make_entry(0))
+    segment = repo._segment_path(repo._read_meta(), "000000.jsonl")
+    with open(segment, "ab") as f:
+        f.write(b'[1, "user_said", "torn wri')
+
+    assert len(repo.load()["history"]) == 1
+    repo.append(make_entry(1))
+    assert [e[2] for e in repo.load()["history"]] == ["message 0", "message 1"]
+
+
+def test_save_appends_and_rewrites_on_rewind(sessions_dir):
+    repo = LogBulusRepo("s4")
+    doc = repo.load()
+    doc["history"] = [make_entry(i) for i in range(3)]
+    repo.save(doc)
+
+    doc = repo.load()
+    doc["history"].append(make_entry(3))
+    doc["metadata"]["status"] = "still"
+    repo.save(doc)
+    assert len(repo.load()["history"]) == 4
+    assert repo.load()["metadata"]["status"] == "still"
+
+    doc["history"] = doc["history"][:2]
+    repo.save(doc)
+    assert [e[2] for e in repo.load()["history"]] == ["message 0", "message 1"]
+
+
+def test_reads_and_migrates_json_and_legacy_jsonl(sessions_dir):
+    (sessions_dir / "old.json").write_text(
+        json.dumps({"metadata": {"session_id": "old", "status": "still"}, "history": [make_entry(0)]}),
+        encoding="utf-8",
+    )
+    (sessions_dir / "legacy.jsonl").write_text(
+        "\n".join(json.dumps(make_entry(i)) for i in range(2)) + "\n", encoding="utf-8"
+    )
+
+    old = LogBulusRepo("old")
+    assert old.load()["metadata"]["status"] == "still"
+    old.append(make_entry(1))
+    assert len(old.load()["history"]) == 2
+    assert os.path.exists(os.path.join(old.log_dir, log_repository.META_FILE))
+
+    legacy = LogBulusRepo("legacy")
+    assert len(legacy.load()["history"]) == 2
+    legacy.update_status("need_runner")
+    assert legacy.load()["metadata"]["status"] == "need_runner"
+    assert len(legacy.load()["history"]) == 2
+
+
+def test_open_repo_selects_backend(sessions_dir):
+    assert isinstance(open_repo("x", backend="log"), LogBulusRepo)
+    assert type(open_repo("x", backend="json")) is repository.BulusRepo
+    with pytest.raises(ValueError):
+        open_repo("x", backend="nope")
+
+
+def test_load_tail_spans_segments(sessions_dir):
+    repo = LogBulusRepo("s9", segment_max_bytes=200)
+    for i in range(30):
+        repo.append(make_entry(i))
+
+    assert len(repo._read_meta()["segments"]) > 3
+    assert [e[4]["n"] for e in repo.load_tail(7)] == list(range(23, 30))
+    assert [e[4]["n"] for e in repo.load_tail(30)] == list(range(30))
+
+
+def test_save_after_rewind_and_regrowth_does_not_splice_histories(sessions_dir):
+    repo = LogBulusRepo("s6")
+    for i in range(3):
+        repo.append(make_entry(i))
+
+    doc = repo.load()
+    doc["history"] = doc["history"][:1] + [make_entry(10 + i) for i in range(3)]
+    repo.save(doc, expected_version=doc["metadata"]["version"])
+    assert [e[2] for e in repo.load()["history"]] == ["message 0", "message 10", "message 11", "message 12"]
+
+
+def test_compaction_switches_generations_through_meta(sessions_dir, monkeypatch):
+    repo = LogBulusRepo("s7")
+    for i in range(3):
+        repo.append(make_entry(i))
+    doc = repo.load()
+    doc["history"] = doc["history"][:1]
+
+    def crash(*args, **kwargs):
+        raise OSError("disk went away")
+
+    # A crash before meta.json is switched leaves the old generation in place
+    with monkeypatch.context() as m, pytest.raises(OSError):
+        m.setattr(repo, "_write_meta", crash)
+        repo.save(doc)
+    assert [e[2] for e in repo.load()["history"]] == ["message 0", "message 1", "message 2"]
+
+    repo.save(doc)
+    assert [e[2] for e in repo.load()["history"]] == ["message 0"]
+    generation = repo._read_meta()["generation"]
+    assert sorted(os.listdir(repo.log_dir)) == [f"gen-{generation}", log_repository.META_FILE]
+
+
+def test_recovers_an_interrupted_directory_swap(sessions_dir):
+    # An old-format log (segments in the log dir itself) survived only as the .old- copy:
+    # the previous compaction crashed between its two renames
+    old_dir = sessions_dir / "s8.log.old-123"
+    old_dir.mkdir()
+    (old_dir / "000000.jsonl").write_text("".join(json.dumps(make_entry(i)) + "\n" for i in range(2)))
+    size = (old_dir / "000000.jsonl").stat().st_size
+    meta = {"metadata": {"version": 2}, "length": 2, "segments": ["000000.jsonl"], "active_bytes": size}
+    (old_dir / log_repository.META_FILE).write_text(json.dumps(meta))
+    (sessions_dir / "s8.log.tmp-123").mkdir()
+
+    repo = LogBulusRepo("s8")
+    assert [e[2] for e in repo.load()["history"]] == ["message 0", "message 1"]
+    assert sorted(os.listdir(sessions_dir)) == ["s8.json.lock", "s8.log"]
+
+    repo.append(make_entry(2))
+    doc = repo.load()
+    doc["history"] = doc["history"][1:]
+    repo.save(doc)
+    assert [e[2] for e in repo.load()["history"]] == ["message 1", "message 2"]
+    assert "000000.jsonl" not in os.listdir(repo.log_dir)
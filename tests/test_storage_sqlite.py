@@ -0,0 +1,111 @@
+import json
+import threading
+
+import pytest
+
+from bulus.storage import open_repo, repository
+from bulus.storage.sqlite_repository import SqliteBulusRepo, SqliteStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    store = SqliteStore(str(tmp_path / "test.sqlite3"))
+    yield store
+    store.close()
+
+
+def make_entry(i: int):
+    return [1715000000 + i, "user_said", f"message {i}", "ask_name", {"n": i}, None]
+
+
+def test_roundtrip_append_and_rewind(store):
+    repo = store.repo("s1")
+    assert repo.load()["history"] == []
+
+    for i in range(3):
+        repo.append(make_entry(i), status="need_brain")
+    doc = repo.load()
+    assert [e[2] for e in doc["history"]] == ["message 0", "message 1", "message 2"]
+
+    doc["history"].append(make_entry(3))
+    doc["metadata"]["pending_action"] = {"tool_name": "send_message", "payload": {}, "thought": ""}
+    doc["metadata"]["status"] = "need_runner"
+    repo.save(doc)
+    doc = repo.load()
+    assert len(doc["history"]) == 4
+    assert doc["metadata"]["status"] == "need_runner"
+    assert doc["metadata"]["pending_action"]["tool_name"] == "send_message"
+
+    doc["history"] = doc["history"][:1]
+    repo.save(doc)
+    assert len(repo.load()["history"]) == 1
+    repo.update_status("still")
+    assert repo.load()["metadata"]["status"] == "still"
+
+
+def test_claim_next_is_exclusive_across_threads(store):
+    for i in range(50):
+        store.repo(f"s{i}").save({"metadata": {"status": "need_brain"}, "history": []})
+
+    claimed = []
+    lock = threading.Lock()
+
+    def worker():
+        while (sid := store.claim_next("need_brain", "brain_working")) is not None:
+            with lock:
+                claimed.append(sid)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(claimed) == sorted(f"s{i}" for i in range(50))
+    assert store.count_by_status() == {"brain_working": 50}
+    assert store.repo("s7").load()["metadata"]["status"] == "brain_working"
+
+
+def test_status_index_queries_and_json_migration(store, tmp_path):
+    (tmp_path / "legacy.json").write_text(
+        json.dumps({"metadata": {"session_id": "legacy", "status": "still"}, "history": [make_entry(0)]}),
+        encoding="utf-8",
+    )
+    repo = SqliteBulusRepo("legacy", store=store)
+    assert repo.load()["metadata"]["status"] == "still"
+    repo.append(make_entry(1), status="need_brain")
+
+    assert store.session_ids(status="need_brain") == ["legacy"]
+    assert len(repo.load()["history"]) == 2
+
+
+def test_open_repo_sqlite_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    repo = open_repo("x", backend="sqlite")
+    repo.append(make_entry(0), status="still")
+    assert isinstance(repo, SqliteBulusRepo)
+    assert open_repo("x", backend="sqlite").load()["metadata"]["status"] == "still"
+
+
+def test_save_after_rewind_and_regrowth_rewrites_history(store):
+    repo = store.repo("s5")
+    for i in range(3):
+        repo.append(make_entry(i))
+
+    doc = repo.load()
+    doc["history"] = doc["history"][:1] + [make_entry(10 + i) for i in range(3)]
+    repo.save(doc, expected_version=doc["metadata"]["version"])
+    assert [e[2] for e in repo.load()["history"]] == ["message 0", "message 10", "message 11", "message 12"]
+
+
+def test_save_of_shorter_divergent_history_rewrites_kept_rows(store):
+    repo = store.repo("s6")
+    for i in range(3):
+        repo.append(make_entry(i))
+
+    doc = repo.load()
+    doc["history"] = [doc["history"][0], make_entry(10)]
+    repo.save(doc, expected_version=doc["metadata"]["version"])
+    assert [e[2] for e in repo.load()["history"]] == ["message 0", "message 10"]
+    assert repo.load_tail(1)[0][2] == "message 10"
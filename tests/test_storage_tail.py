@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from bulus.core.schemas import Action
+from bulus.engine.loop import load_recent, record_pending_action, runner_step
+from bulus.storage import open_repo, repository
+from bulus.storage.repository import BulusRepo, ConflictError
+
+BACKENDS = ["json", "log", "sqlite", "binary"]
+
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def make_entry(i: int):
+    return [1715000000 + i, "user_said", f"message {i}", "ask_name", {"n": i}, None]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_tail_metadata_and_head_state(sessions_dir, backend):
+    repo = open_repo("t1", backend=backend)
+    assert repo.load_tail(5) == []
+    assert repo.load_head_state() == ("hello", {})
+    assert repo.load_metadata()["status"] == "need_brain"
+
+    for i in range(40):
+        repo.append(make_entry(i), status="still")
+
+    assert [e[2] for e in repo.load_tail(3)] == ["message 37", "message 38", "message 39"]
+    assert len(repo.load_tail(100)) == 40
+    assert list(repo.load_head_state()) == ["ask_name", {"n": 39}]
+    metadata = repo.load_metadata()
+    assert metadata["status"] == "still"
+    assert metadata["version"] == 40
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_commit_appends_without_full_history(sessions_dir, backend):
+    repo = open_repo("t2", backend=backend)
+    for i in range(10):
+        repo.append(make_entry(i))
+
+    doc = load_recent(repo, n=2)
+    version = doc["metadata"]["version"]
+    doc["metadata"]["status"] = "still"
+    repo.commit([make_entry(10)], doc["metadata"], expected_version=version)
+    assert doc["metadata"]["version"] == version + 1
+
+    full = open_repo("t2", backend=backend).load()
+    assert [e[4]["n"] for e in full["history"]] == list(range(11))
+    assert full["metadata"]["status"] == "still"
+
+    with pytest.raises(ConflictError):
+        repo.commit([make_entry(11)], doc["metadata"], expected_version=version)
+    assert len(repo.load()["history"]) == 11
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_engine_steps_on_tail_doc_keep_history(sessions_dir, backend):
+    repo = open_repo("t3", backend=backend)
+    for i in range(50):
+        repo.append(make_entry(i))
+
+    doc = load_recent(repo)
+    payload = {"state": "ask_age", "memory": {"name": "Ann"}}
+    record_pending_action(repo, doc, Action(tool_name="update", payload_str=json.dumps(payload), thought="t"))
+    runner_step(repo, load_recent(repo))
+
+    full = repo.load()
+    assert len(full["history"]) == 51
+    assert full["history"][-1][3] == "ask_age"
+    assert full["history"][-1][4] == {"n": 49, "name": "Ann"}
+    assert full["metadata"]["status"] == "still"
+
+
+def test_json_reads_are_cached_until_file_changes(sessions_dir, monkeypatch):
+    repo = BulusRepo("t4")
+    for i in range(3):
+        repo.append(make_entry(i))
+
+    reader = BulusRepo("t4")
+    parses = []
+    original = json.load
+    monkeypatch.setattr(repository.json, "load", lambda f: parses.append(1) or original(f))
+
+    reader.load_metadata()
+    reader.load_tail(2)
+    reader.load()
+    assert len(parses) == 1
+
+    repo.append(make_entry(3))
+    assert reader.load_tail(1)[0][2] == "message 3"
+    assert len(parses) == 2
+
+    # Запись через сам reader кэшируется сразу (write-through)
+    reader.append(make_entry(4))
+    assert reader.load_head_state() == ("ask_name", {"n": 4})
+    assert len(parses) == 2
+
+
+def test_loaded_doc_mutation_does_not_leak_into_cache(sessions_dir):
+    repo = BulusRepo("t5")
+    repo.append(make_entry(0))
+
+    doc = repo.load()
+    doc["history"].append(make_entry(1))
+    doc["metadata"]["status"] = "still"
+
+    assert len(repo.load()["history"]) == 1
+    assert repo.load_metadata()["status"] == "need_brain"
+
+
+def test_tail_entries_are_shared_read_only_and_engine_steps_leave_them_intact(sessions_dir):
+    repo = BulusRepo("t6")
+    for i in range(3):
+        repo.append(make_entry(i))
+
+    tail = repo.load_tail(3)
+    assert repo.load_tail(3)[-1] is tail[-1]  # no per-call copies on the hot path
+    tail.append(make_entry(9))  # the list itself belongs to the caller
+    assert len(repo.load_tail(5)) == 3
+
+    payload = {"state": "ask_age", "memory": {"n": 100, "name": "Ann"}}
+    record_pending_action(
+        repo, load_recent(repo), Action(tool_name="update", payload_str=json.dumps(payload), thought="t")
+    )
+    runner_step(repo, load_recent(repo))
+
+    assert tail[:3] == [make_entry(i) for i in range(3)]
+    assert repo.load_tail(1)[0][4] == {"n": 100, "name": "Ann"}
@@ -0,0 +1,174 @@
+import json
+import threading
+from functools import partial
+
+import pytest
+
+from bulus import telemetry
+from bulus.brain.worker import stateless_brain
+from bulus.core.schemas import Action
+from bulus.engine.loop import brain_step, load_recent, runner_step, user_step
+from bulus.storage import open_repo, repository
+from bulus.storage.sidelog import TIMINGS, SideLog
+from tests.utils import make_fake_client
+from viewer.paging import TracePager
+from viewer.render import render_trace_html
+
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def telemetry_off():
+    yield
+    telemetry.disable()
+
+
+def fake_client_with_usage(actions):
+    client = make_fake_client(actions)
+    completions = client.beta.chat.completions
+    parse = completions.parse
+
+    def parse_with_usage(**kwargs):
+        response = parse(**kwargs)
+        response.usage = type("Usage", (), {"prompt_tokens": 120, "completion_tokens": 30})()
+        return response
+
+    completions.parse = parse_with_usage
+    return client
+
+
+def test_disabled_telemetry_is_a_noop():
+    hist = telemetry.HistogramSink()
+    assert telemetry.span("brain.llm", model="m") is telemetry.NOOP_SPAN
+    telemetry.count("llm.tokens_in", 10)
+    with telemetry.collect_step() as timings:
+        assert timings is None
+    assert hist.snapshot() == {"spans": {}, "counters": {}}
+
+
+def test_spans_nest_and_feed_histogram_and_otlp():
+    hist = telemetry.HistogramSink()
+    batches = []
+    otlp = telemetry.OtlpExporter(export=lambda kind, payload: batches.append((kind, payload)))
+
+    with telemetry.enabled(hist, otlp):
+        for _ in range(3):
+            with telemetry.span("engine.brain_step") as outer, telemetry.span("brain.llm", model="m") as inner:
+                telemetry.count("llm.tokens_in", 5)
+        assert inner.trace_id == outer.trace_id and inner.parent_id == outer.span_id
+        with pytest.raises(KeyError), telemetry.span("runner.tool"):
+            raise KeyError("boom")
+
+    snap = hist.snapshot()
+    assert snap["spans"]["brain.llm"]["count"] == 3
+    stats = snap["spans"]["engine.brain_step"]
+    assert stats["min_ms"] <= stats["p50_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+    assert snap["counters"] == {"llm.tokens_in": 15}
+    assert "brain.llm" in hist.format()
+
+    # disable() сбросил буфер экспортёра: одна пачка спанов и накопительные счётчики
+    kinds = dict(batches)
+    spans = kinds["traces"]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(spans) == 7
+    children = [s for s in spans if s["name"] == "brain.llm"]
+    assert all(len(s["parentSpanId"]) == 16 for s in children)
+    assert {"key": "model", "value": {"stringValue": "m"}} in children[0]["attributes"]
+    assert next(s for s in spans if s["name"] == "runner.tool")["status"]["code"] == 2
+    metric = kinds["metrics"]["resourceMetrics"][0]["scopeMetrics"][0]["metrics"][0]
+    assert metric["name"] == "llm.tokens_in" and metric["sum"]["dataPoints"][0]["asInt"] == "15"
+
+
+def test_otlp_export_errors_are_dropped():
+    def broken(kind, payload):
+        raise ConnectionError("collector down")
+
+    otlp = telemetry.OtlpExporter(export=broken, batch_size=2)
+    with telemetry.enabled(otlp):
+        for _ in range(3):
+            with telemetry.span("storage.load"):
+                pass
+    assert otlp.dropped == 3
+
+
+def test_otlp_exports_in_background_and_drops_when_the_queue_is_full():
+    started, release = threading.Event(), threading.Event()
+    exported = []
+
+    def slow(kind, payload):
+        started.set()
+        assert release.wait(5)
+        exported.append(kind)
+
+    otlp = telemetry.OtlpExporter(export=slow, batch_size=1, queue_size=1)
+    with telemetry.enabled(otlp):
+        with telemetry.span("storage.load"):
+            pass
+        assert started.wait(5)  # the first batch is stuck in export, the engine is not
+        for _ in range(2):
+            with telemetry.span("storage.load"):
+                pass
+        assert otlp.dropped == 1
+        release.set()
+
+    assert exported == ["traces", "traces"]
+    assert not otlp._worker.is_alive()
+
+
+def test_jsonl_sink(tmp_path):
+    path = tmp_path / "trace" / "spans.jsonl"
+    with telemetry.enabled(telemetry.JsonlSink(str(path), buffer_size=2)):
+        with telemetry.span("storage.commit", session="s1"):
+            telemetry.count("storage.bytes_written", 42)
+        with telemetry.span("storage.load"):
+            pass
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [r["type"] for r in records] == ["count", "span", "span"]
+    assert records[1]["attrs"] == {"session": "s1"} and records[1]["duration_ms"] >= 0
+
+
+@pytest.mark.parametrize("backend", ["json", "log", "sqlite", "binary"])
+def test_turn_timings_are_recorded_next_to_the_session(sessions_dir, backend):
+    repo = open_repo("t1", backend=backend)
+    action = Action.from_payload("update", {"state": "ask_age", "memory": {"name": "Ann"}}, "save name")
+    brain = partial(stateless_brain, client_override=fake_client_with_usage([action]))
+
+    hist = telemetry.HistogramSink()
+    with telemetry.enabled(hist, record_timings=True):
+        user_step(repo, None, "I'm Ann")
+        brain_step(repo, load_recent(repo), brain=brain)
+        entry = runner_step(repo, load_recent(repo))
+
+    metadata = repo.load_metadata()
+    assert "timings" not in metadata
+    [[ts, timings]] = SideLog("t1", TIMINGS).load()
+    assert ts == entry[0]
+    assert {"brain.prompt", "brain.llm", "action.validate", "runner.dispatch", "runner.tool"} <= set(timings["spans"])
+    assert timings["counts"]["llm.tokens_in"] == 120 and timings["counts"]["llm.tokens_out"] == 30
+    assert "timings" not in (metadata.get("pending_action") or {})
+
+    snap = hist.snapshot()
+    assert {"storage.load", "storage.commit", "storage.append"} <= set(snap["spans"])
+    assert snap["counters"]["storage.bytes_written"] > 0
+
+    # Вьюер получает тайминги вместе с записями
+    assert TracePager.from_session("t1", backend=backend).meta()["timings"] == [[ts, timings]]
+
+
+def test_timings_are_optional(sessions_dir):
+    repo = open_repo("t2")
+    user_step(repo, None, "hi")
+    action = Action.from_payload("send_message", {"text": "hello"}, "greet")
+    with telemetry.enabled(telemetry.HistogramSink()):
+        brain_step(repo, load_recent(repo), brain=lambda history: action)
+        runner_step(repo, load_recent(repo))
+    metadata = repo.load_metadata()
+    assert metadata["status"] == "need_brain" and "timings" not in metadata
+    assert SideLog("t2", TIMINGS).load() == []
+
+    html = render_trace_html([(5.0, "user_said", "hi", "hello", {}, None)], [[5.0, {"spans": {}, "counts": {}}]])
+    assert "var iceTimings = [[5.0" in html
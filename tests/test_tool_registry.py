@@ -0,0 +1,56 @@
+import json
+
+from bulus.brain import prompts
+from bulus.core.schemas import Action
+from bulus.runner.registry import SideEffect, ToolRegistry
+from bulus.runner.tools import registry
+from bulus.runner.worker import imperative_runner
+
+ICE = [(1715000000, "user_said", "hi", "hello", {"name": "Alice"}, None)]
+
+
+def make_action(tool_name: str, payload: dict) -> Action:
+    return Action(tool_name=tool_name, payload_str=json.dumps(payload), thought="t")
+
+
+def test_builtin_tools_are_registered_with_effects():
+    assert registry.get("update").effect is SideEffect.PURE
+    assert registry.get("send_message").effect is SideEffect.EXTERNAL
+    assert list(registry.schema()) == ["send_message", "update", "test_ping", "batch"]  # "error" is not listed
+
+
+def test_runner_dispatches_through_registry():
+    entry = imperative_runner(ICE, make_action("update", {"state": "ask_age", "memory": {"age": 30}}))
+    assert entry[3] == "ask_age"
+    assert entry[4] == {"name": "Alice", "age": 30}
+
+    unknown = imperative_runner(ICE, make_action("no_such_tool", {}))
+    assert unknown[3] == "hello" and unknown[4] == {"name": "Alice"}
+
+
+def test_custom_registry_drives_runner_and_prompt(monkeypatch):
+    custom = ToolRegistry()
+
+    @custom.tool("lookup_order", schema="Find an order. Args: {'id': str}", effect=SideEffect.IDEMPOTENT)
+    def lookup_order(state, storage, payload, thought):
+        return state, {**storage, "order": payload["id"]}
+
+    entry = imperative_runner(ICE, make_action("lookup_order", {"id": "42"}), tool_registry=custom)
+    assert entry[4]["order"] == "42"
+
+    monkeypatch.setattr(prompts, "registry", custom)
+    assert "lookup_order" in prompts.get_system_prompt("hello", {})
+
+
+def test_registration_invalidates_prompt_cache():
+    before = prompts.get_system_prompt("hello", {})
+
+    @registry.tool("temp_tool", schema="Temporary. Args: {}")
+    def temp_tool(state, storage, payload, thought):
+        return state, storage
+
+    try:
+        assert "temp_tool" in prompts.get_system_prompt("hello", {})
+    finally:
+        registry.unregister("temp_tool")
+    assert prompts.get_system_prompt("hello", {}) == before
@@ -0,0 +1,173 @@
+import gzip
+import json
+import os
+import urllib.error
+import urllib.request
+
+import pytest
+
+from bulus.core.compact import CompactIce
+from bulus.storage import open_repo, repository
+from bulus.storage.binary_repository import BinaryBulusRepo
+from viewer.export import data_file, export_site
+from viewer.paging import TracePager, decode_page, encode_page
+from viewer.render import render_stream_html, render_trace_html
+from viewer.server import TraceServer
+
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository, "SESSIONS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def make_history(n: int):
+    history, storage = [], {}
+    for i in range(n):
+        if i % 5 == 0:
+            storage = {**storage, "step": i, "big": "x" * 100}
+        if i % 17 == 0:
+            storage = {k: v for k, v in storage.items() if k != "step"}
+        history.append((1715000000.0 + i, "user_said", {"text": f"m{i}"}, "ask_name", storage, None))
+    return history
+
+
+def test_page_roundtrip_ships_storage_deltas():
+    history = make_history(40)
+    page = encode_page(history[10:30], 10)
+
+    assert decode_page(page) == history[10:30]
+    assert page["storage"] == history[10][4]
+    # Неизменившийся storage не пересылается
+    assert sum(row[4] is None for row in page["rows"]) >= 15
+    assert decode_page(json.loads(json.dumps(page))) == history[10:30]
+
+
+def test_pager_pages_cover_lazy_sequences():
+    history = make_history(1000)
+    pager = TracePager(CompactIce(history), page_size=128)
+
+    assert pager.meta() == {"title": None, "length": 1000, "page_size": 128, "pages": 8}
+    decoded = [entry for n in range(pager.page_count) for entry in decode_page(pager.page(n))]
+    assert [list(e) for e in decoded] == [list(e) for e in history]
+    assert pager.page_json(3) is pager.page_json(3)
+    with pytest.raises(IndexError):
+        pager.page(8)
+
+
+def test_pager_from_compact_json_session(sessions_dir):
+    history = make_history(300)
+    repository.BulusRepo("compact", compact=True).save({"metadata": {}, "history": history})
+
+    pager = TracePager.from_path(str(sessions_dir / "compact.json"), page_size=128)
+    assert pager.meta()["length"] == 300
+    assert decode_page(pager.page(2)) == history[256:]
+
+
+def test_pager_from_binary_session_decodes_only_requested_page(sessions_dir, monkeypatch):
+    repo = BinaryBulusRepo("big")
+    doc = repo.load()
+    doc["history"] = make_history(2000)
+    repo.save(doc)
+
+    pager = TracePager.from_session("big", backend="binary", page_size=100)
+    ranges = []
+    original = type(pager.ice)._decode_range
+    monkeypatch.setattr(
+        type(pager.ice), "_decode_range", lambda self, a, b: ranges.append((a, b)) or original(self, a, b)
+    )
+
+    page = pager.page(7)
+    assert ranges == [(700, 800)]
+    assert pager.title == "big"
+    assert [list(e) for e in decode_page(page)] == [list(e) for e in doc["history"][700:800]]
+
+    from_path = TracePager.from_path(repo.bin_path, page_size=100)
+    assert len(from_path) == 2000 and from_path.title == "big"
+
+
+def test_server_streams_meta_pages_and_viewer_page():
+    pager = TracePager(make_history(600), page_size=200, title="s1")
+    with TraceServer() as server:
+        url = server.register(pager)
+
+        html = urllib.request.urlopen(url).read().decode("utf-8")
+        assert '"page_url": "page/{page}"' in html and '"length": 600' in html
+
+        meta = json.loads(urllib.request.urlopen(url + "meta").read())
+        assert meta["pages"] == 3
+
+        request = urllib.request.Request(url + "page/1", headers={"Accept-Encoding": "gzip"})
+        with urllib.request.urlopen(request) as response:
+            assert response.headers["Content-Encoding"] == "gzip"
+            page = json.loads(gzip.decompress(response.read()))
+        assert page["start"] == 200 and len(page["rows"]) == 200
+
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "page/3")
+        server.unregister(url)
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "meta")
+
+
+def test_rendered_pages_escape_script_end():
+    history = [(1.0, "user_said", "</script><b>hi</b>", "ask_name", {}, None)]
+    assert "</script><b>" not in render_trace_html(history)
+    html = render_stream_html({"title": "</script>", "length": 1, "page_size": 1}, "page/{page}")
+    assert "var iceSource = null" not in html and "<\\/script>" in html
+
+
+def test_export_site_is_incremental_and_prunes_removed_sessions(sessions_dir, tmp_path_factory):
+    for i, backend in enumerate(["json", "binary", "log"]):
+        repo = open_repo(f"s{i}", backend=backend)
+        doc = repo.load()
+        doc["history"] = make_history(300 + i)
+        doc["metadata"]["status"] = "done"
+        repo.save(doc)
+    weird = open_repo("a/b c", backend="sqlite")
+    weird.save({"metadata": {"status": "failed"}, "history": make_history(3)})
+
+    out = tmp_path_factory.mktemp("site")
+    summary = export_site(str(out), str(sessions_dir), page_size=128, workers=2)
+    assert summary["exported"] == 4 and summary["skipped"] == 0
+
+    index = json.loads((out / "index.json").read_text())
+    rows = {row["id"]: row for row in index["sessions"]}
+    assert rows["s1"]["length"] == 301 and rows["s1"]["status"] == "done"
+    assert rows["a/b c"]["file"] == data_file("a/b c") and "/" not in rows["a/b c"]["file"][len("data/") :]
+    assert (out / "index.js").read_text().startswith("var bulusIndex = ")
+    assert "data_param" in (out / "viewer.html").read_text()
+
+    data = json.loads(gzip.decompress((out / rows["s2"]["file"]).read_bytes()))
+    assert data["length"] == 302 and len(data["pages"]) == 3
+    entries = [entry for page in data["pages"] for entry in decode_page(page)]
+    assert [list(e) for e in entries] == [list(e) for e in open_repo("s2", backend="log").load()["history"]]
+
+    repo = open_repo("s0", backend="json")
+    repo.append((1.0, "user_said", "again", "ask_name", {}, None))
+    os.remove(open_repo("s1", backend="binary").bin_path)
+    summary = export_site(str(out), str(sessions_dir), page_size=128, workers=1)
+    assert summary == {**summary, "sessions": 3, "exported": 1, "skipped": 2, "removed": 1}
+    assert not (out / rows["s1"]["file"]).exists()
+
+
+def test_export_site_reports_broken_sessions_and_reexports_recreated_ones(sessions_dir, tmp_path_factory):
+    for sid in ("good", "broken"):
+        open_repo(sid, backend="json").save({"metadata": {"status": "done"}, "history": make_history(3)})
+    out = tmp_path_factory.mktemp("site")
+    assert export_site(str(out), str(sessions_dir), workers=1)["exported"] == 2
+
+    (sessions_dir / "broken.json").write_text("{not json", encoding="utf-8")
+    # Recreated with the same version number but different content
+    os.remove(sessions_dir / "good.json")
+    open_repo("good", backend="json").save({"metadata": {"status": "done"}, "history": make_history(4)})
+
+    summary = export_site(str(out), str(sessions_dir), workers=1)
+    assert summary == {**summary, "sessions": 2, "exported": 1, "skipped": 0, "failed": 1}
+    assert "CorruptSessionError" in summary["errors"]["broken"]
+    rows = {row["id"]: row for row in json.loads((out / "index.json").read_text())["sessions"]}
+    assert rows["good"]["length"] == 4
+    assert (out / rows["broken"]["file"]).exists()  # the previous export is kept
+
+    summary = export_site(str(out), str(sessions_dir), workers=1)
+    assert summary == {**summary, "exported": 0, "skipped": 1, "failed": 1}
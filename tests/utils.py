@@ -1,3 +1,4 @@
+import asyncio
 from typing import List
 
 from bulus.core.schemas import Action
@@ -28,3 +29,41 @@ def make_fake_client(actions_queue: List[Action]):
             self.beta = type("Beta", (), {"chat": type("Chat", (), {"completions": _FakeCompletions(queue)})()})()
 
     return _FakeClient(actions_queue)
+
+
+def make_async_fake_client(actions_queue: List[Action], delay: float = 0.0):
+    """
+    Async twin of make_fake_client for astateless_brain.
+    parse() is a coroutine that optionally sleeps `delay` seconds to emulate network latency;
+    the peak number of concurrent calls is exposed as `client.max_in_flight`.
+    """
+
+    class _FakeResponse:
+        def __init__(self, action: Action):
+            self.choices = [type("Choice", (), {"message": type("Msg", (), {"parsed": action})()})()]
+
+    class _FakeCompletions:
+        def __init__(self, owner, queue: List[Action]):
+            self._owner = owner
+            self._queue = list(queue)
+
+        async def parse(self, **kwargs):
+            if not self._queue:
+                raise AssertionError("No actions left in fake completions queue")
+            action = self._queue.pop(0)
+            self._owner.in_flight += 1
+            self._owner.max_in_flight = max(self._owner.max_in_flight, self._owner.in_flight)
+            try:
+                if delay:
+                    await asyncio.sleep(delay)
+            finally:
+                self._owner.in_flight -= 1
+            return _FakeResponse(action)
+
+    class _FakeAsyncClient:
+        def __init__(self, queue: List[Action]):
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.beta = type("Beta", (), {"chat": type("Chat", (), {"completions": _FakeCompletions(self, queue)})()})()
+
+    return _FakeAsyncClient(actions_queue)
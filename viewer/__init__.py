@@ -1,3 +1,4 @@
-from .display import show_bulus_trace
+from .display import show_bulus_stream, show_bulus_trace
+from .paging import TracePager
 
-__all__ = ["show_bulus_trace"]
+__all__ = ["TracePager", "show_bulus_stream", "show_bulus_trace"]
@@ -1,7 +1,12 @@
 import json
-from pathlib import Path
+import os
+from collections.abc import Sequence
 from typing import Any, Dict, List, Tuple
 
+from .paging import DEFAULT_PAGE_SIZE, TracePager
+from .render import DATA_MARKER, load_template, render_trace_html
+from .server import TraceServer, default_server
+
 # Try to import IPython for Jupyter display, but don't fail if not present
 try:
     from IPython.display import HTML, display
@@ -10,38 +15,28 @@ except ImportError:
     display = None
 
 
-def _load_template() -> str:
-    """Loads the HTML template from the same directory as this script."""
-    template_path = Path(__file__).parent / "template.html"
-    return template_path.read_text(encoding="utf-8")
-
-
-def show_bulus_trace(ice: List[Tuple[float, str, Dict[str, Any], str, Dict[str, Any], str | None]], height: int = 600):
+def show_bulus_trace(
+    ice: List[Tuple[float, str, Dict[str, Any], str, Dict[str, Any], str | None]],
+    height: int = 600,
+    timings: Sequence | None = None,
+):
     """
     Renders the Bulus Time Travel Viewer in a Jupyter Notebook.
 
+    The whole ledger is inlined into the notebook output; for long sessions
+    use show_bulus_stream instead.
+
     Args:
         ice: The IceHistory list from bulus.
         height: Height of the viewer in pixels.
+        timings: Optional step timings (the session's timings side log, see bulus.telemetry).
     """
     if HTML is None:
         print("Error: IPython is not installed. Cannot render HTML in this environment.")
         return
 
-    # Serialize ice to JSON safely
-    # We might need to handle non-serializable objects if they sneak into storage,
-    # but Bulus core schemas seem to enforce dicts/strings.
-    try:
-        json_ice = json.dumps(ice)
-    except TypeError:
-        # Fallback for safe serialization
-        json_ice = json.dumps(ice, default=str)
-
-    html_template = _load_template()
-
-    # Inject data into the script tag
-    injection_code = f"var iceData = {json_ice};"
-    final_html = html_template.replace("var iceData = []; // DATA_INJECTION_POINT", injection_code)
+    # Serialize ice to JSON safely and inject it into the script tag
+    final_html = render_trace_html(ice, timings)
 
     # Wrap in iframe-like container if needed, but direct HTML usually works better
     # for sizing in modern Jupyter. To avoid CSS conflicts, an iframe is safer;
@@ -60,8 +55,58 @@ def show_bulus_trace(ice: List[Tuple[float, str, Dict[str, Any], str, Dict[str,
     display(HTML(iframe_html))
 
 
+def show_bulus_stream(
+    source: Sequence | str | TracePager,
+    height: int = 600,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    backend: str | None = None,
+    server: TraceServer | None = None,
+) -> str:
+    """
+    Streaming Time Travel Viewer: entries are loaded in delta-encoded pages on demand.
+
+    The notebook output is just an iframe pointing at a local TraceServer, so
+    a 10k-entry session costs the browser one page at a time instead of every
+    storage snapshot at once.
+
+    Args:
+        source: An Ice sequence (list, Ledger, CompactIce, ...), a session id,
+            a path to a session file (.bulus / .json) or a ready TracePager.
+        height: Height of the viewer in pixels.
+        page_size: Entries per page.
+        backend: Storage backend used to open a session id (defaults to BULUS_STORAGE_BACKEND).
+        server: Server to publish the trace on (defaults to a shared one).
+
+    Returns:
+        The viewer URL (it also works in a regular browser tab).
+    """
+    if isinstance(source, TracePager):
+        pager = source
+    elif isinstance(source, (str, os.PathLike)) and os.path.isfile(source):
+        pager = TracePager.from_path(source, page_size=page_size)
+    elif isinstance(source, str):
+        pager = TracePager.from_session(source, backend=backend, page_size=page_size)
+    else:
+        pager = TracePager(source, page_size=page_size)
+
+    url = (server or default_server()).register(pager)
+    if HTML is None:
+        print(f"IPython is not installed. Open the viewer at {url}")
+        return url
+
+    display(
+        HTML(
+            f"""
+    <iframe src="{url}" width="100%" height="{height}px"
+            style="border: none; border-radius: 8px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);"></iframe>
+    """
+        )
+    )
+    return url
+
+
 if __name__ == "__main__":
-    # Test block for running this script directly
+    # Test block: python -m viewer.display
     import time
 
     # Mock data based on scripts/run_scenarios.py (Multi-turn)
@@ -142,7 +187,7 @@ if __name__ == "__main__":
     print("Writing test_output.html...")
     with open("test_output.html", "w") as f:
         # Manually inject for local test
-        tmpl = _load_template()
+        tmpl = load_template()
         code = f"var iceData = {json.dumps(ice_entries)};"
-        f.write(tmpl.replace("var iceData = []; // DATA_INJECTION_POINT", code))
+        f.write(tmpl.replace(DATA_MARKER, code))
     print("Done. Open test_output.html to view.")
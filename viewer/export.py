@@ -0,0 +1,240 @@
+"""
+Static export of a whole sessions directory for the time-travel viewer.
+
+    python -m viewer.export site/ --sessions-dir ~/.bulus/sessions --workers 8
+
+Layout of the generated site:
+
+    index.html            searchable session list (status / state / id)
+    index.js, index.json  the list itself (index.js also works from file://)
+    viewer.html           the shared viewer page: viewer.html?data=data/<file>
+    data/<file>.json.gz   one gzip file per session with delta-encoded pages
+
+Session data files are fetched by the viewer, so serve the site over HTTP
+(any static hosting, or `python -m http.server` inside the directory).
+Re-exports are incremental: sessions whose metadata version and content
+fingerprint have not changed since the previous export are skipped. A session
+that fails to export is reported and keeps its previous data file.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Sequence
+
+from bulus.storage import discover_sessions, open_repo, repository
+from bulus.storage.repository import atomic_open, atomic_write_json
+
+from .paging import DEFAULT_PAGE_SIZE, encode_page
+from .render import render_static_viewer_html
+
+DATA_DIR = "data"
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+
+
+def data_file(session_id: str) -> str:
+    """Path of a session's data file relative to the site root; unsafe ids get a hashed name."""
+    if not _SAFE_NAME.match(session_id):
+        session_id = hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:20]
+    return f"{DATA_DIR}/{session_id}.json.gz"
+
+
+def encode_session(
+    ice: Sequence, title: str, page_size: int = DEFAULT_PAGE_SIZE, metadata: dict | None = None
+) -> bytes:
+    """Gzip-compressed session data file: all pages of the session, each delta-encoded (see encode_page)."""
+    data = {
+        "title": title,
+        "length": len(ice),
+        "page_size": page_size,
+        "metadata": metadata,
+        "pages": [encode_page(ice[start : start + page_size], start) for start in range(0, len(ice), page_size)],
+    }
+    blob = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    # mtime=0: unchanged sessions produce byte-identical files
+    return gzip.compress(blob, compresslevel=6, mtime=0)
+
+
+def fingerprint(metadata: dict, tail: Sequence) -> str:
+    """
+    Content hash of a session's metadata and last Ice entry. Unlike the version
+    alone, it changes when a session is recreated or restored from a backup
+    with the same version number.
+    """
+    blob = json.dumps([metadata, list(tail)], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def export_session(
+    session_id: str, backend: str, out_dir: str, page_size: int = DEFAULT_PAGE_SIZE, previous: dict | None = None
+) -> tuple:
+    """
+    Writes the data file of one session and returns (index row, exported?).
+
+    With `previous` (the session's row from the last export) the session is
+    skipped when its metadata version, fingerprint and page size are unchanged
+    and the file is in place.
+    """
+    repo = open_repo(session_id, backend=backend)
+    file = data_file(session_id)
+    path = os.path.join(out_dir, file)
+    if previous is not None and previous.get("file") == file and previous.get("page_size") == page_size:
+        metadata = repo.load_metadata()
+        if (
+            previous.get("version") == metadata.get("version")
+            and previous.get("fingerprint") == fingerprint(metadata, repo.load_tail(1))
+            and os.path.exists(path)
+        ):
+            return previous, False
+
+    doc = repo.load()
+    history, metadata = doc["history"], doc["metadata"]
+    blob = encode_session(history, session_id, page_size, metadata)
+    with atomic_open(path, "wb", fsync=False) as f:
+        f.write(blob)
+
+    row = {
+        "id": session_id,
+        "backend": backend,
+        "status": metadata.get("status"),
+        "state": history[-1][3] if history else None,
+        "length": len(history),
+        "started": history[0][0] if history else None,
+        "updated": history[-1][0] if history else None,
+        "version": metadata.get("version"),
+        "fingerprint": fingerprint(metadata, history[-1:]),
+        "file": file,
+        "page_size": page_size,
+        "bytes": len(blob),
+    }
+    return row, True
+
+
+def _init_worker(sessions_dir: str):
+    repository.SESSIONS_DIR = sessions_dir
+
+
+def _export_job(job: tuple) -> tuple:
+    """(row, exported?, error): a broken session must not abort the whole export."""
+    try:
+        return (*export_session(*job), None)
+    except Exception as exc:
+        return job[4], False, f"{type(exc).__name__}: {exc}"
+
+
+def load_index(out_dir: str) -> Dict[str, dict]:
+    """Rows of the previous export (session_id -> row); empty if there is none."""
+    try:
+        with open(os.path.join(out_dir, "index.json"), encoding="utf-8") as f:
+            return {row["id"]: row for row in json.load(f)["sessions"]}
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return {}
+
+
+def export_site(
+    out_dir: str,
+    sessions_dir: str | None = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    workers: int | None = None,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """
+    Exports every session of `sessions_dir` (default: SESSIONS_DIR) into a static site in `out_dir`.
+
+    Sessions are encoded in parallel on a pool of `workers` processes
+    (default: CPU count). A session that fails to export keeps its previous
+    row and data file; its error goes to the summary's "errors" and the run
+    goes on. Returns a summary of the run.
+
+    Args:
+        out_dir: Target directory; created if needed.
+        sessions_dir: Sessions directory to export.
+        page_size: Entries per viewer page.
+        workers: Number of worker processes.
+        force: Re-export every session, even unchanged ones.
+    """
+    started = time.perf_counter()
+    sessions_dir = str(sessions_dir or repository.SESSIONS_DIR)
+    os.makedirs(os.path.join(out_dir, DATA_DIR), exist_ok=True)
+
+    previous = {} if force else load_index(out_dir)
+    sessions = discover_sessions(sessions_dir)
+    jobs = [(sid, backend, out_dir, page_size, previous.get(sid)) for sid, backend in sessions.items()]
+
+    workers = workers or os.cpu_count() or 1
+    # spawn: workers must not inherit open SQLite connections or locks of the parent
+    context = multiprocessing.get_context("spawn")
+    rows, exported, skipped, errors = [], 0, 0, {}
+    if jobs:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(jobs)), mp_context=context, initializer=_init_worker, initargs=(sessions_dir,)
+        ) as pool:
+            results = pool.map(_export_job, jobs, chunksize=max(1, len(jobs) // (workers * 8)))
+            for job, (row, fresh, error) in zip(jobs, results):
+                if error is not None:
+                    errors[job[0]] = error
+                if row is not None:
+                    rows.append(row)
+                exported += fresh
+                skipped += error is None and not fresh
+
+    # Data files of sessions that no longer exist
+    keep = {row["file"] for row in rows}
+    removed = 0
+    for name in os.listdir(os.path.join(out_dir, DATA_DIR)):
+        if f"{DATA_DIR}/{name}" not in keep:
+            os.remove(os.path.join(out_dir, DATA_DIR, name))
+            removed += 1
+
+    template_dir = Path(__file__).parent
+    (Path(out_dir) / "viewer.html").write_text(render_static_viewer_html(), encoding="utf-8")
+    (Path(out_dir) / "index.html").write_text((template_dir / "index.html").read_text(encoding="utf-8"), "utf-8")
+
+    index = {"generated": time.time(), "sessions": rows}
+    index_json = json.dumps(index, ensure_ascii=False, separators=(",", ":"), default=str)
+    with atomic_open(os.path.join(out_dir, "index.js"), fsync=False) as f:
+        f.write(f"var bulusIndex = {index_json};\n")
+    atomic_write_json(os.path.join(out_dir, "index.json"), index, fsync=False, default=str)
+
+    return {
+        "sessions": len(rows),
+        "exported": exported,
+        "skipped": skipped,
+        "failed": len(errors),
+        "errors": errors,
+        "removed": removed,
+        "bytes": sum(row["bytes"] for row in rows),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m viewer.export", description="Export sessions into a static site")
+    parser.add_argument("out_dir", help="Output directory")
+    parser.add_argument("--sessions-dir", help="Sessions directory (default: BULUS sessions dir)")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Entries per viewer page")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Re-export unchanged sessions too")
+    args = parser.parse_args(argv)
+
+    summary = export_site(args.out_dir, args.sessions_dir, args.page_size, args.workers, args.force)
+    for session_id, error in summary["errors"].items():
+        print(f"Failed to export {session_id}: {error}", file=sys.stderr)
+    print(
+        f"Exported {summary['exported']} of {summary['sessions']} sessions "
+        f"({summary['skipped']} unchanged, {summary['failed']} failed, {summary['removed']} removed) "
+        f"in {summary['elapsed_s']}s"
+    )
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, List
+
+from bulus.core.compact import CompactIce, apply_delta, storage_delta
+from bulus.core.schemas import IceEntry
+from bulus.storage import open_repo
+from bulus.storage.binary_format import BinaryIce
+from bulus.storage.binary_repository import BinaryBulusRepo
+from bulus.storage.repository import LOCK_SUFFIX
+from bulus.storage.sidelog import TIMINGS, SideLog
+
+DEFAULT_PAGE_SIZE = 256
+
+
+def encode_page(entries: Sequence, start: int) -> Dict[str, Any]:
+    """
+    Encodes a page of Ice entries for the streaming viewer.
+
+    The page carries the full storage of its first entry once; every row
+    then holds a storage delta ({"set", "unset"} or None) against the
+    previous row instead of a full snapshot. Pages are self-contained, so
+    seeking to any step needs exactly one page.
+    """
+    rows = []
+    base = prev = entries[0][4] if len(entries) else {}
+    for ts, tool, payload, state, storage, thought in entries:
+        rows.append([ts, tool, payload, state, storage_delta(prev, storage), thought])
+        prev = storage
+    return {"start": start, "storage": base, "rows": rows}
+
+
+def decode_page(page: Dict[str, Any]) -> List[IceEntry]:
+    """Inverse of encode_page: restores full (ts, tool, payload, state, storage, thought) entries."""
+    storage = page["storage"]
+    entries = []
+    for ts, tool, payload, state, delta, thought in page["rows"]:
+        storage = apply_delta(storage, delta)
+        entries.append((ts, tool, payload, state, storage, thought))
+    return entries
+
+
+def load_ice(path: str) -> Sequence:
+    """
+    Opens a saved session file as an Ice sequence.
+
+    `.bulus` files are mmap-ed and decoded lazily (only the pages that are
+    actually requested); `.json`/`.jsonl` session files are parsed whole.
+    Sessions saved with `compact=True` store delta rows (`ice_delta`) and
+    are opened as a CompactIce.
+    `<id>.json.lock` files next to sessions are write locks, not sessions.
+    """
+    path = Path(path)
+    if path.suffix == LOCK_SUFFIX:
+        raise ValueError(f"{path} is a session lock file, not a session")
+    if path.suffix == ".bulus":
+        return BinaryIce.open(str(path))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    # Legacy sessions are a bare list of entries
+    if not isinstance(data, dict):
+        return data
+    if "ice_delta" in data:
+        return CompactIce.from_rows(data["ice_delta"])
+    return data["history"]
+
+
+class TracePager:
+    """
+    Serves an Ice ledger page by page, delta-encoded (see encode_page).
+
+    Only the requested slice of `ice` is touched, so lazy sequences
+    (BinaryIce, CompactIce, Ledger) are never materialized as a whole.
+    Encoded pages are kept in a small LRU cache; the pager is thread-safe.
+
+    Args:
+        ice: Any sequence of Ice entries.
+        page_size: Entries per page.
+        title: Caption shown by the viewer (e.g. the session id).
+        cache_size: How many encoded pages to keep in memory.
+    """
+
+    def __init__(
+        self,
+        ice: Sequence,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        title: str | None = None,
+        cache_size: int = 32,
+        timings: Sequence | None = None,
+    ):
+        if page_size <= 0:
+            raise ValueError("page_size must be positive")
+        self.ice = ice
+        self.page_size = page_size
+        self.title = title
+        # Step timings recorded by bulus.telemetry (the "timings" SideLog), shown next to their entries
+        self.timings = list(timings or [])
+        self._pages: OrderedDict = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_session(cls, session_id: str, backend: str | None = None, **kwargs) -> "TracePager":
+        """Pager over a stored session; the binary backend is read lazily through mmap."""
+        repo = open_repo(session_id, backend=backend)
+        ice = repo.ice() if isinstance(repo, BinaryBulusRepo) else None
+        if ice is None:
+            ice = repo.load()["history"]
+        kwargs.setdefault("title", session_id)
+        # Тайминги пишутся в SideLog; metadata["timings"] — у сессий старого формата
+        kwargs.setdefault("timings", SideLog(session_id, TIMINGS).load() or repo.load_metadata().get("timings"))
+        return cls(ice, **kwargs)
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "TracePager":
+        """Pager over a session file (.bulus / .json / .jsonl)."""
+        kwargs.setdefault("title", Path(path).stem)
+        return cls(load_ice(path), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.ice)
+
+    @property
+    def page_count(self) -> int:
+        return -(-len(self) // self.page_size)
+
+    def meta(self) -> Dict[str, Any]:
+        meta = {"title": self.title, "length": len(self), "page_size": self.page_size, "pages": self.page_count}
+        if self.timings:
+            meta["timings"] = self.timings
+        return meta
+
+    def page(self, n: int) -> Dict[str, Any]:
+        """Encoded page n (IndexError if out of range)."""
+        return json.loads(self.page_json(n))
+
+    def page_json(self, n: int) -> bytes:
+        """Encoded page n as UTF-8 JSON, ready to be sent over the wire."""
+        if not 0 <= n < self.page_count:
+            raise IndexError(f"page {n} out of range")
+        with self._lock:
+            cached = self._pages.get(n)
+            if cached is not None:
+                self._pages.move_to_end(n)
+                return cached
+        start = n * self.page_size
+        page = encode_page(self.ice[start : start + self.page_size], start)
+        try:
+            blob = json.dumps(page, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        except TypeError:
+            # Same fallback as show_bulus_trace for non-serializable values in storage
+            blob = json.dumps(page, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        with self._lock:
+            self._pages[n] = blob
+            if len(self._pages) > self._cache_size:
+                self._pages.popitem(last=False)
+        return blob
@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Sequence
+
+DATA_MARKER = "var iceData = []; // DATA_INJECTION_POINT"
+SOURCE_MARKER = "var iceSource = null; // SOURCE_INJECTION_POINT"
+TIMINGS_MARKER = "var iceTimings = []; // TIMINGS_INJECTION_POINT"
+
+
+def load_template() -> str:
+    """Loads the HTML template from the same directory as this script."""
+    template_path = Path(__file__).parent / "template.html"
+    return template_path.read_text(encoding="utf-8")
+
+
+def _script_json(value: Any) -> str:
+    # "</script>" inside a string literal would close the script tag early
+    try:
+        text = json.dumps(value)
+    except TypeError:
+        # Fallback for safe serialization
+        text = json.dumps(value, default=str)
+    return text.replace("</", "<\\/")
+
+
+def render_trace_html(ice: Sequence, timings: Sequence | None = None) -> str:
+    """
+    Standalone viewer page with the whole ledger inlined.
+
+    Args:
+        ice: The ledger entries.
+        timings: Optional timings rows ([entry ts, step timings]) recorded by bulus.telemetry.
+    """
+    # list() materializes compact ledgers (bulus.core.compact.CompactIce) into plain entries.
+    html = load_template().replace(DATA_MARKER, f"var iceData = {_script_json(list(ice))};")
+    if timings:
+        html = html.replace(TIMINGS_MARKER, f"var iceTimings = {_script_json(list(timings))};")
+    return html
+
+
+def render_stream_html(meta: Dict[str, Any], page_url: str) -> str:
+    """
+    Viewer page that loads delta-encoded pages on demand (see paging.encode_page).
+
+    Args:
+        meta: TracePager.meta() — title, length and page_size of the trace.
+        page_url: URL of a page with a `{page}` placeholder for its number.
+    """
+    source = dict(meta, page_url=page_url)
+    return load_template().replace(SOURCE_MARKER, f"var iceSource = {_script_json(source)};")
+
+
+def render_static_viewer_html(data_param: str = "data") -> str:
+    """Shared viewer page of a static export: the session data file comes from the `?data=` query parameter."""
+    return load_template().replace(SOURCE_MARKER, f"var iceSource = {_script_json({'data_param': data_param})};")
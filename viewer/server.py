@@ -0,0 +1,128 @@
+import gzip
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from .paging import TracePager
+from .render import render_stream_html
+
+_ROUTE = re.compile(r"^/trace/(?P<token>[0-9a-f]+)/(?:(?P<meta>meta)|page/(?P<page>\d+))?$")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def do_GET(self):
+        match = _ROUTE.match(self.path.split("?", 1)[0])
+        pager = self.server.pagers.get(match["token"]) if match else None
+        if pager is None:
+            self.send_error(404)
+            return
+        if match["meta"]:
+            self._send(json.dumps(pager.meta()).encode("utf-8"), "application/json", cache=False)
+        elif match["page"] is not None:
+            try:
+                blob = pager.page_json(int(match["page"]))
+            except IndexError:
+                self.send_error(404)
+                return
+            self._send(blob, "application/json", cache=True)
+        else:
+            # Relative page URL: resolved by the browser against /trace/<token>/
+            html = render_stream_html(pager.meta(), "page/{page}")
+            self._send(html.encode("utf-8"), "text/html; charset=utf-8", cache=False)
+
+    def _send(self, body: bytes, content_type: str, cache: bool):
+        # Delta-encoded pages are repetitive JSON and shrink several times under gzip
+        if "gzip" in self.headers.get("Accept-Encoding", "") and len(body) > 1024:
+            body = gzip.compress(body, compresslevel=5)
+            encoding = "gzip"
+        else:
+            encoding = None
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        # A registered trace is a snapshot: its pages never change
+        self.send_header("Cache-Control", "private, max-age=3600" if cache else "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep notebook output clean
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    pagers: Dict[str, TracePager]
+
+
+class TraceServer:
+    """
+    Local HTTP server for the streaming viewer.
+
+    Each registered TracePager gets its own URL; the viewer page fetches
+    `meta` and `page/<n>` from it on demand, so the notebook output holds
+    only an iframe instead of the whole ledger. The browser must be able to
+    reach `host:port` (true for a local Jupyter).
+
+    Args:
+        host: Interface to bind (loopback by default).
+        port: TCP port; 0 picks a free one.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.pagers = {}
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "TraceServer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, name="bulus-viewer", daemon=True)
+            self._thread.start()
+        return self
+
+    def register(self, pager: TracePager) -> str:
+        """Publishes a pager and returns the viewer URL for it."""
+        token = uuid.uuid4().hex[:16]
+        self._httpd.pagers[token] = pager
+        return self.url(token)
+
+    def unregister(self, url: str):
+        token = url.rstrip("/").rsplit("/", 1)[-1]
+        self._httpd.pagers.pop(token, None)
+
+    def url(self, token: str) -> str:
+        return f"http://{self.host}:{self.port}/trace/{token}/"
+
+    def close(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_server: TraceServer | None = None
+_default_lock = threading.Lock()
+
+
+def default_server() -> TraceServer:
+    """Process-wide viewer server, started on first use."""
+    global _default_server
+    with _default_lock:
+        if _default_server is None:
+            _default_server = TraceServer().start()
+        return _default_server